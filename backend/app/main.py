@@ -1,11 +1,12 @@
 # main.py
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.security import HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
 
-from app.database import engine, Base
+from app.database import engine, Base, add_missing_columns
 from app.routers import auth, admin, employee
 from app.middleware.auth import get_current_user
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +16,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -62,6 +64,8 @@ async def shutdown_event():
     from app.services.recognition_service import recognition_service
     if recognition_service.is_running:
         recognition_service.stop_recognition()
+    from app.services.face_encoding import shutdown_encoding_executor
+    shutdown_encoding_executor()
     print("Application shutdown complete")
     
 
@@ -73,5 +77,14 @@ async def root():
 async def health_check():
     return {"status": "healthy", "message": "FRAS Backend is running"}
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Recognition stage timings and frame, face and attendance counters in the Prometheus text format"""
+    from app.services.recognition_service import recognition_service
+    return PlainTextResponse(
+        recognition_service.metrics.prometheus_text(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -32,6 +32,9 @@ class Employee(Base):
     role = Column(String(100), nullable=False)
     department = Column(String(100), nullable=False)
     image_path = Column(LargeBinary, nullable=True)
+    face_encoding = Column(LargeBinary, nullable=True)  # 128 float32 values computed at upload time
+    encoding_model = Column(String(100), nullable=True)  # encoder version that produced face_encoding
+    encoding_status = Column(String(20), nullable=True)  # computed, no_face or failed, for encoding_model
     company = Column(String(255), nullable=False)
     admin_id = Column(Integer, ForeignKey("admins.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -54,6 +57,12 @@ class AttendanceRecord(Base):
     camera_used = Column(String(255), nullable=True)
     date = Column(DateTime(timezone=True), server_default=func.now())
     company = Column(String(255), nullable=False)
+    # Client-generated key of a recognition event; a retried event is stored only once
+    idempotency_key = Column(String(64), nullable=True, unique=True, index=True)
+    # Key of the event that checked the employee out of this record; the check-in keeps its own key above
+    checkout_idempotency_key = Column(String(64), nullable=True, unique=True, index=True)
+    # Bumped by every write; recognition clients sync the records changed since their last sync by it
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), index=True)
     
     # Relationships
     employee = relationship("Employee", back_populates="attendance_records")
@@ -84,5 +93,8 @@ class CameraSettings(Base):
     arrival_time = Column(String(10), nullable=False)  # HH:MM format
     departure_time = Column(String(10), nullable=False)  # HH:MM format
     recognition_active = Column(Boolean, default=False)
+    detection_roi = Column(String(64), nullable=True)  # "x,y,width,height" as fractions of the frame; empty = whole frame
+    min_face_size = Column(Integer, nullable=True)  # faces smaller than this (pixels at full resolution) are ignored
+    face_detector = Column(String(32), nullable=True)  # hog, cnn, dlib_hog[:upsample], haar or dnn; empty = hog
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
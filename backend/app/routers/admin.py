@@ -1,8 +1,9 @@
 # routers/admin.py
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Response, WebSocket, Query
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Response, WebSocket, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, extract, desc, asc, case
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime, date, time
 import io
@@ -34,12 +35,20 @@ from app.schemas import (
     DashboardSummary, TicketResponse, TicketUpdate,
     CameraSettingsCreate, CameraSettingsUpdate, CameraSettingsResponse,
     AdminProfileUpdate, AdminPasswordUpdate, AdminResponse, AttendanceResponse,
-    AttendanceCreate, AttendanceUpdate,
+    AttendanceCreate, AttendanceUpdate, AttendanceDayInit, AttendanceEventCreate, AttendanceEventBatch,
     AttendanceRecord as AttendanceRecordSchema
 )
 from app.middleware.auth import get_current_admin
 from app.utils.auth import verify_password, get_password_hash
 from app.services.recognition_service import recognition_service
+from app.services.attendance_day import changed_since, initialize_day, sync_cursor
+from app.services.attendance_events import apply_attendance_event, apply_attendance_events, find_attendance_by_key
+from app.services.detectors import parse_detector_spec
+from app.services.roi import format_roi, parse_roi
+from app.services.face_encoding import (
+    FACE_ENCODING_MODEL, ENCODING_DIM, compute_face_encoding_async, encoding_columns, encoding_to_base64
+)
+from app.services.encoding_backfill import backfill_face_encodings
 router = APIRouter()
 
 # Helper data
@@ -675,8 +684,13 @@ async def upload_employee_image(
             detail="Image file too large. Maximum size is 5MB."
         )
     
+    # Compute the face encoding once here (in the worker pool) so recognition clients don't have to
+    face_encoding, encoding_status = await compute_face_encoding_async(image_path)
+    
     # Update employee record with image data
     employee.image_path = image_path
+    for field, value in encoding_columns(face_encoding, encoding_status).items():
+        setattr(employee, field, value)
     
     db.commit()
     
@@ -684,7 +698,8 @@ async def upload_employee_image(
         "message": "Image uploaded successfully",
         "employee_id": employee_id,
         "employee_name": employee.name,
-        "size": len(image_path)
+        "size": len(image_path),
+        "face_encoding": encoding_status
     }
 
 
@@ -748,20 +763,25 @@ async def get_employee_image(
 @router.get("/employees/images/all")
 async def get_all_employee_images(
     format: Optional[str] = "base64",  # Only base64 supported for recognition system
+    ids: Optional[List[int]] = Query(None),  # ?ids=1&ids=2 - only these employees
     current_admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
     """
     Get all employee images with their id, name, and base64 encoded image data.
-    Designed for facial recognition backend system.
+    Designed for facial recognition backend system; clients that have the server's
+    encodings ask only for the images of the employees still pending.
     """
     
-    employees = db.query(Employee).filter(
+    query = db.query(Employee).filter(
         and_(
             Employee.company == current_admin.company,
             Employee.image_path.isnot(None)  # Only employees with images
         )
-    ).all()
+    )
+    if ids is not None:
+        query = query.filter(Employee.id.in_(ids))
+    employees = query.all()
     
     if not employees:
         return {
@@ -795,6 +815,59 @@ async def get_all_employee_images(
     }
 
 
+@router.get("/employees/encodings/all")
+async def get_all_employee_encodings(
+    background_tasks: BackgroundTasks,
+    current_admin: Admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    Get precomputed face encodings for all employees with images.
+    Each encoding is 128 little-endian float32 values, base64 encoded (512 bytes per employee).
+    Employees listed in "pending" have no server-side encoding: it is still being computed in the
+    background (images uploaded before encodings were stored, or by an older model) or the image
+    could not be encoded. Clients should fall back to their images.
+    """
+    
+    employees = db.query(Employee).filter(
+        and_(
+            Employee.company == current_admin.company,
+            Employee.image_path.isnot(None)
+        )
+    ).all()
+    
+    # Encode images without a result for the current model after answering, never while a client waits
+    if any(employee.encoding_model != FACE_ENCODING_MODEL for employee in employees):
+        background_tasks.add_task(backfill_face_encodings, current_admin.company)
+    
+    employee_encodings = []
+    no_face = []
+    pending = []
+    
+    for employee in employees:
+        if employee.encoding_model != FACE_ENCODING_MODEL or employee.encoding_status == "failed":
+            pending.append(employee.id)
+        elif employee.face_encoding is None:
+            no_face.append(employee.id)
+        else:
+            employee_encodings.append({
+                "employee_id": employee.id,
+                "employee_name": employee.name,
+                "encoding": encoding_to_base64(employee.face_encoding)
+            })
+    
+    return {
+        "model": FACE_ENCODING_MODEL,
+        "dtype": "float32",
+        "byte_order": "little",
+        "dimensions": ENCODING_DIM,
+        "total_employees": len(employee_encodings),
+        "employees": employee_encodings,
+        "no_face": no_face,
+        "pending": pending
+    }
+
+
 
 @router.delete("/employees/{employee_id}/image")
 async def delete_employee_image(
@@ -818,12 +891,32 @@ async def delete_employee_image(
         )
     
     employee.image_path = None
+    employee.face_encoding = None
+    employee.encoding_model = None
+    employee.encoding_status = None
     
     db.commit()
     
     return {"message": "Employee image deleted successfully"}
 
 # Camera settings endpoints
+def normalize_detection_roi(value) -> Optional[str]:
+    """Validate an ROI from the client and return it in the stored form"""
+    try:
+        return format_roi(parse_roi(value))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+def normalize_face_detector(value) -> Optional[str]:
+    """Validate a face detector name from the client; empty means the default"""
+    if not value:
+        return None
+    try:
+        name, upsample = parse_detector_spec(value)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return name if upsample is None else f"{name}:{upsample}"
+
 @router.post("/camera-settings", response_model=CameraSettingsResponse)
 async def create_camera_settings(
     settings_data: CameraSettingsCreate,
@@ -832,6 +925,9 @@ async def create_camera_settings(
 ):
     """Create or update camera settings."""
     
+    settings_data.detection_roi = normalize_detection_roi(settings_data.detection_roi)
+    settings_data.face_detector = normalize_face_detector(settings_data.face_detector)
+    
     # Check if settings already exist for this company
     existing_settings = db.query(CameraSettings).filter(
         CameraSettings.company == current_admin.company
@@ -983,7 +1079,17 @@ async def create_attendance_record(
     current_admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Create a new attendance record (used by recognition system)."""
+    """Create a new attendance record (used by recognition system).
+    
+    Events that carry an idempotency key are stored once: sending the same
+    key again (a client retrying after a lost response) returns the record
+    created the first time.
+    """
+    
+    if attendance_data.idempotency_key:
+        existing = find_attendance_by_key(db, attendance_data.idempotency_key, current_admin.company)
+        if existing:
+            return existing
     
     # Verify employee belongs to admin's company
     employee = db.query(Employee).filter(
@@ -1005,16 +1111,79 @@ async def create_attendance_record(
         hours_worked=attendance_data.hours_worked,
         status=attendance_data.status,
         camera_used=attendance_data.camera_used,
-        company=current_admin.company
+        company=current_admin.company,
+        idempotency_key=attendance_data.idempotency_key
     )
     
     db.add(new_record)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # The same event arrived twice at once; the other request stored it
+        db.rollback()
+        existing = find_attendance_by_key(db, attendance_data.idempotency_key, current_admin.company)
+        if not existing:
+            raise
+        return existing
     db.refresh(new_record)
     
     return new_record
 
 
+@router.post("/attendance/initialize-day")
+async def initialize_attendance_day(
+    day_data: Optional[AttendanceDayInit] = None,
+    current_admin: Admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Create the missing 'absent' records of every employee for a day in one statement (used by recognition system).
+    
+    Returns the day's latest record per employee and the cursor for later delta syncs.
+    """
+    day_data = day_data or AttendanceDayInit()
+    return initialize_day(db, current_admin.company, day_data.day, day_data.camera_used)
+
+
+@router.post("/attendance/events")
+async def create_attendance_event(
+    event: AttendanceEventCreate,
+    current_admin: Admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Check an employee seen by a camera in or out in one row-locked transaction (used by recognition system).
+    
+    The server decides between check-in and check-out from the employee's
+    record of the day, so cameras writing at the same time cannot both check
+    someone in. Returns the action taken, the new state (absent, checked_in or
+    checked_out) and the record.
+    """
+    result = apply_attendance_event(
+        db, current_admin.company, event.employee_id, event.timestamp, event.camera_used,
+        event.idempotency_key, event.checkout_delay_minutes
+    )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Employee not found"
+        )
+    return result
+
+
+@router.post("/attendance/batch")
+async def create_attendance_events(
+    batch: AttendanceEventBatch,
+    current_admin: Admin = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Apply many attendance events in one request and one transaction (used by recognition system).
+    
+    Each event is decided as by POST /attendance/events; one that fails does
+    not undo the others. Returns one result per event, in order.
+    """
+    events = [event.dict() for event in batch.events]
+    return {"results": apply_attendance_events(db, current_admin.company, events)}
+
+
 # Updated camera settings endpoint to restart recognition if needed
 @router.put("/camera-settings")
 async def update_camera_settings(
@@ -1034,6 +1203,11 @@ async def update_camera_settings(
             detail="Camera settings not found"
         )
     
+    if "detection_roi" in settings_data:
+        settings_data["detection_roi"] = normalize_detection_roi(settings_data["detection_roi"])
+    if "face_detector" in settings_data:
+        settings_data["face_detector"] = normalize_face_detector(settings_data["face_detector"])
+    
     # Update settings fields
     for field, value in settings_data.items():
         if hasattr(settings, field):
@@ -1112,17 +1286,42 @@ async def get_attendance_records(
 
 @router.get("/attendance/today")
 async def get_today_attendance(
+    updated_after: Optional[datetime] = None,
+    after_id: Optional[int] = None,
     current_admin: Admin = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Get today's attendance records."""
+    """Get today's attendance records.
+    
+    With updated_after (the cursor of an earlier answer) only the records
+    created or changed since then are returned, so recognition clients can
+    sync their local table without downloading the whole day again; every
+    answer carries the cursor for the next sync. after_id, for older clients,
+    returns only the records created after that one.
+    """
     
     today = datetime.now().date()
     
-    records = db.query(AttendanceRecord).filter(
+    query = db.query(AttendanceRecord).filter(
         AttendanceRecord.company == current_admin.company,
         AttendanceRecord.date >= today
-    ).all()
+    )
+    
+    if updated_after is not None:
+        records = changed_since(query, updated_after).order_by(AttendanceRecord.id).all()
+        return {
+            "records": records,
+            "cursor": sync_cursor(records, updated_after)
+        }
+    
+    if after_id is not None:
+        records = query.filter(AttendanceRecord.id > after_id).order_by(AttendanceRecord.id).all()
+        return {
+            "records": records,
+            "last_id": records[-1].id if records else after_id
+        }
+    
+    records = query.all()
     
     # Summary statistics
     total_employees = len(records)
@@ -1131,6 +1330,8 @@ async def get_today_attendance(
     
     return {
         "records": records,
+        "last_id": max((r.id for r in records), default=0),
+        "cursor": sync_cursor(records),
         "summary": {
             "total_employees": total_employees,
             "present": present_count,
@@ -1379,7 +1580,7 @@ async def get_camera_status():
         
         # Add additional status information
         additional_info = {
-            "blink_counts": dict(recognition_service.person_blink_count),
+            "blink_counts": recognition_service.get_blink_counts(),
             "last_detections": {
                 name: time.isoformat() if time else None 
                 for name, time in recognition_service.last_detection_time.items()
@@ -1457,7 +1658,7 @@ async def camera_websocket(websocket: WebSocket):
                             "type": "frame",
                             "data": f"data:image/jpeg;base64,{frame_base64}",
                             "timestamp": frame_data.get('timestamp', recognition_service.get_current_time()).isoformat(),
-                            "blink_counts": dict(recognition_service.person_blink_count),
+                            "blink_counts": recognition_service.get_blink_counts(),
                             "frame_number": frame_data.get('frame_number', 0),
                             "fps": frame_data.get('fps', 0)
                         })
@@ -1,6 +1,6 @@
 # schemas.py
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field
+from datetime import datetime, date
 from typing import Optional, List
 from enum import Enum
 from fastapi import Form, File, UploadFile
@@ -115,6 +115,21 @@ class AttendanceCreate(BaseModel):
     hours_worked: Optional[float] = None
     status: str = "absent"
     camera_used: Optional[str] = None
+    idempotency_key: Optional[str] = Field(None, max_length=64)
+
+class AttendanceDayInit(BaseModel):
+    day: Optional[date] = None  # defaults to today in Kigali
+    camera_used: Optional[str] = None
+
+class AttendanceEventCreate(BaseModel):
+    employee_id: int
+    timestamp: Optional[datetime] = None  # when the face was seen; defaults to now
+    camera_used: Optional[str] = None
+    checkout_delay_minutes: Optional[float] = Field(None, ge=0)  # defaults to ATTENDANCE_CHECKOUT_DELAY_MINUTES
+    idempotency_key: Optional[str] = Field(None, max_length=64)
+
+class AttendanceEventBatch(BaseModel):
+    events: List[AttendanceEventCreate] = Field(..., max_length=500)
 
 class AttendanceUpdate(BaseModel):
     arrival_time: Optional[datetime] = None
@@ -181,6 +196,9 @@ class CameraSettingsCreate(BaseModel):
     blinking_threshold: float = 0.3
     arrival_time: str
     departure_time: str
+    detection_roi: Optional[str] = None
+    min_face_size: Optional[int] = None
+    face_detector: Optional[str] = None
 
 class CameraSettingsUpdate(BaseModel):
     camera_type: Optional[str] = None
@@ -188,6 +206,9 @@ class CameraSettingsUpdate(BaseModel):
     blinking_threshold: Optional[float] = None
     arrival_time: Optional[str] = None
     departure_time: Optional[str] = None
+    detection_roi: Optional[str] = None
+    min_face_size: Optional[int] = None
+    face_detector: Optional[str] = None
 
 class CameraSettingsResponse(BaseModel):
     id: int
@@ -198,6 +219,9 @@ class CameraSettingsResponse(BaseModel):
     arrival_time: str
     departure_time: str
     recognition_active: bool
+    detection_roi: Optional[str] = None
+    min_face_size: Optional[int] = None
+    face_detector: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -0,0 +1,99 @@
+# app/services/attendance_day.py
+import hashlib
+import zoneinfo
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import String, exists, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from app.models import AttendanceRecord, Employee
+
+KIGALI_TZ = zoneinfo.ZoneInfo("Africa/Kigali")
+
+# Delta syncs read this far behind the client's cursor: updated_at is the time the writing
+# transaction started, and transactions commit in any order, so a change can land just below it
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def day_lock_key(company: str, day: date) -> int:
+    """Signed 64-bit advisory lock key of one company's attendance day (stable across processes)"""
+    digest = hashlib.sha1(f"attendance-day:{company}:{day.isoformat()}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def sync_cursor(records, default: Optional[datetime] = None) -> str:
+    """Latest updated_at of the records and default (now, when there is neither); clients pass it back as updated_after"""
+    times = [record.updated_at for record in records if record.updated_at]
+    if default:
+        times.append(default)
+    return (max(times) if times else datetime.now(KIGALI_TZ)).isoformat()
+
+
+def changed_since(query, updated_after: datetime):
+    """Records of ``query`` written after the cursor, overlapping by SYNC_OVERLAP; re-sending a record is harmless"""
+    return query.filter(AttendanceRecord.updated_at > updated_after - SYNC_OVERLAP)
+
+
+def compact_record(record: AttendanceRecord) -> Dict:
+    return {
+        "id": record.id,
+        "employee_id": record.employee_id,
+        "name": record.name,
+        "status": record.status,
+        "arrival_time": record.arrival_time,
+        "departure_time": record.departure_time,
+        "hours_worked": record.hours_worked
+    }
+
+
+def initialize_day(db: Session, company: str, day: Optional[date] = None, camera_used: Optional[str] = None) -> Dict:
+    """Create an 'absent' record for every employee of the company without a record on ``day`` and commit.
+
+    One INSERT ... SELECT ... WHERE NOT EXISTS, run under a transaction-level
+    advisory lock on (company, day) so services initializing the same day at
+    the same time do not both insert. Returns the day's latest record per
+    employee and the cursor for delta syncs.
+    """
+    day = day or datetime.now(KIGALI_TZ).date()
+    next_day = day + timedelta(days=1)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Released at commit; a second initializer then finds every record and inserts nothing
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": day_lock_key(company, day)})
+
+    has_record = exists().where(
+        AttendanceRecord.employee_id == Employee.id,
+        AttendanceRecord.date >= day,
+        AttendanceRecord.date < next_day
+    )
+    missing = select(
+        Employee.id,
+        Employee.name,
+        literal("absent", String),
+        literal(camera_used, String),
+        literal(company, String),
+        literal(day, AttendanceRecord.date.type)
+    ).where(Employee.company == company, ~has_record)
+
+    result = db.execute(insert(AttendanceRecord).from_select(
+        ["employee_id", "name", "status", "camera_used", "company", "date"], missing
+    ))
+    db.commit()
+
+    records = db.query(AttendanceRecord).filter(
+        AttendanceRecord.company == company,
+        AttendanceRecord.date >= day,
+        AttendanceRecord.date < next_day
+    ).order_by(AttendanceRecord.id).all()
+
+    latest = {}
+    for record in records:
+        latest[record.employee_id] = record
+
+    return {
+        "date": day.isoformat(),
+        "created": result.rowcount,
+        "cursor": sync_cursor(records),
+        "records": [compact_record(record) for record in latest.values()]
+    }
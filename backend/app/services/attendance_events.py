@@ -0,0 +1,179 @@
+# app/services/attendance_events.py
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import AttendanceRecord, Employee
+from app.services.attendance_day import KIGALI_TZ, compact_record
+
+# Minutes after checking in before being seen again checks an employee out
+CHECKOUT_DELAY_MINUTES = float(os.getenv("ATTENDANCE_CHECKOUT_DELAY_MINUTES", "2"))
+
+# Actions that changed the record
+RECORDED_ACTIONS = ("checkin", "checkout")
+
+
+def as_kigali(value: datetime) -> datetime:
+    """Timezone-aware time in Kigali; naive times are taken to be Kigali time already"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=KIGALI_TZ)
+    return value.astimezone(KIGALI_TZ)
+
+
+def attendance_state(record: Optional[AttendanceRecord]) -> str:
+    """absent, checked_in or checked_out"""
+    if record is None or not record.arrival_time or record.status == "absent":
+        return "absent"
+    return "checked_out" if record.departure_time else "checked_in"
+
+
+def event_result(action: str, record: AttendanceRecord) -> Dict:
+    return {
+        "action": action,
+        "recorded": action in RECORDED_ACTIONS,
+        "state": attendance_state(record),
+        "record": compact_record(record)
+    }
+
+
+def decide_attendance_event(db: Session, company: str, employee_id: int, timestamp: Optional[datetime] = None,
+                            camera_used: Optional[str] = None, idempotency_key: Optional[str] = None,
+                            checkout_delay_minutes: Optional[float] = None) -> Optional[Dict]:
+    """Check in or out an employee seen at ``timestamp`` without committing; returns None if the employee is not in the company.
+
+    The decision is made from the employee's latest record of that day while
+    the employee row is locked (SELECT ... FOR UPDATE) until the transaction
+    ends, so events for one employee from several cameras or services are
+    applied one after the other and never both check in. The action is one of:
+
+    - checkin: no arrival yet - the day's record (created if missing) gets it
+    - checkout: checked in and not seen for the checkout delay - departure and hours_worked are set
+    - too_soon: checked in less than the checkout delay ago - nothing is written
+    - complete: already checked out today
+    - duplicate: an event with this idempotency key was applied before
+    """
+    now = datetime.now(KIGALI_TZ)
+    # An event cannot have happened after it arrived; guards against clients with a clock running ahead
+    timestamp = min(as_kigali(timestamp), now) if timestamp else now
+    delay = CHECKOUT_DELAY_MINUTES if checkout_delay_minutes is None else checkout_delay_minutes
+
+    employee = db.query(Employee).filter(
+        Employee.id == employee_id,
+        Employee.company == company
+    ).with_for_update().first()
+    if not employee:
+        return None
+
+    if idempotency_key:
+        existing = find_attendance_by_key(db, idempotency_key, company)
+        if existing:
+            return event_result("duplicate", existing)
+
+    day = timestamp.date()
+    record = db.query(AttendanceRecord).filter(
+        AttendanceRecord.employee_id == employee.id,
+        AttendanceRecord.date >= day,
+        AttendanceRecord.date < day + timedelta(days=1)
+    ).order_by(AttendanceRecord.id.desc()).first()
+
+    if attendance_state(record) == "absent":
+        if record is None:
+            record = AttendanceRecord(employee_id=employee.id, name=employee.name, company=company, date=timestamp)
+            db.add(record)
+        record.arrival_time = timestamp
+        record.status = "present"
+        record.idempotency_key = idempotency_key or record.idempotency_key
+        action = "checkin"
+    elif record.departure_time:
+        action = "complete"
+    else:
+        arrival_time = as_kigali(record.arrival_time)
+        if (timestamp - arrival_time).total_seconds() < delay * 60:
+            action = "too_soon"
+        else:
+            record.departure_time = timestamp
+            record.hours_worked = round((timestamp - arrival_time).total_seconds() / 3600, 2)
+            record.checkout_idempotency_key = idempotency_key
+            action = "checkout"
+
+    if action in RECORDED_ACTIONS:
+        record.camera_used = camera_used or record.camera_used
+        # Check-ins and check-outs update the day's existing record; this is what delta syncs see
+        record.updated_at = func.now()
+
+    # Assigns the id of a new record and raises IntegrityError for a key stored meanwhile
+    db.flush()
+    return event_result(action, record)
+
+
+def apply_attendance_event(db: Session, company: str, employee_id: int, timestamp: Optional[datetime] = None,
+                           camera_used: Optional[str] = None, idempotency_key: Optional[str] = None,
+                           checkout_delay_minutes: Optional[float] = None) -> Optional[Dict]:
+    """decide_attendance_event in a transaction of its own, committed before returning"""
+    try:
+        result = decide_attendance_event(db, company, employee_id, timestamp, camera_used, idempotency_key,
+                                         checkout_delay_minutes)
+        db.commit()
+    except IntegrityError:
+        # The same event arrived twice at once on a database without row locks; the other request applied it
+        db.rollback()
+        existing = find_attendance_by_key(db, idempotency_key, company)
+        if not existing:
+            raise
+        return event_result("duplicate", existing)
+    return result
+
+
+def apply_attendance_events(db: Session, company: str, events: List[Dict]) -> List[Dict]:
+    """Apply a batch of events (keyword arguments of decide_attendance_event) in one transaction and commit.
+
+    Each event runs in a savepoint, so one that fails is undone alone and the
+    rest are still applied. Events are applied in employee id order, keeping
+    the order of each employee's own events, so batches running at the same
+    time lock employee rows in the same order and cannot deadlock. Returns one
+    result per event, in the order given: ``ok`` with the action, state and
+    record, or ``status_code`` and ``error``.
+    """
+    results: List[Optional[Dict]] = [None] * len(events)
+    for index in sorted(range(len(events)), key=lambda i: events[i]["employee_id"]):
+        event = events[index]
+        savepoint = db.begin_nested()
+        try:
+            result = decide_attendance_event(db, company, **event)
+            savepoint.commit()
+        except IntegrityError:
+            savepoint.rollback()
+            existing = find_attendance_by_key(db, event.get("idempotency_key"), company)
+            if existing:
+                results[index] = dict(event_result("duplicate", existing), index=index, ok=True)
+            else:
+                results[index] = {"index": index, "ok": False, "status_code": 409, "error": "Conflicting attendance record"}
+            continue
+        except Exception as e:
+            savepoint.rollback()
+            print(f"Error applying attendance event for employee {event['employee_id']}: {e}")
+            results[index] = {"index": index, "ok": False, "status_code": 500, "error": "Could not apply the event"}
+            continue
+
+        if result is None:
+            results[index] = {"index": index, "ok": False, "status_code": 404, "error": "Employee not found"}
+        else:
+            results[index] = dict(result, index=index, ok=True)
+
+    db.commit()
+    return results
+
+
+def find_attendance_by_key(db: Session, idempotency_key: Optional[str], company: str) -> Optional[AttendanceRecord]:
+    """Record created, checked in or checked out by the event with this key"""
+    if not idempotency_key:
+        return None
+    return db.query(AttendanceRecord).filter(
+        or_(AttendanceRecord.idempotency_key == idempotency_key,
+            AttendanceRecord.checkout_idempotency_key == idempotency_key),
+        AttendanceRecord.company == company
+    ).first()
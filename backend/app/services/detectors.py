@@ -0,0 +1,275 @@
+# app/services/detectors.py - copy of fras_local/detectors.py; edit that file and run fras_local/sync_backend.py
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# (top, right, bottom, left) as returned by face_recognition.face_locations
+Box = Tuple[int, int, int, int]
+
+# OpenCV's res10 SSD face detector (Caffe), expected in the model directory
+DNN_PROTOTXT = "deploy.prototxt"
+DNN_CAFFEMODEL = "res10_300x300_ssd_iter_140000.caffemodel"
+
+
+def _clip_box(top, right, bottom, left, shape) -> Box:
+    height, width = shape[:2]
+    return max(0, int(top)), min(width, int(right)), min(height, int(bottom)), max(0, int(left))
+
+
+class FaceDetector:
+    """Finds faces on an RGB image; boxes are (top, right, bottom, left) on that image.
+
+    Instances are not shared between threads - every camera gets its own.
+    """
+
+    name = "base"
+
+    def detect(self, rgb_image: np.ndarray) -> List[Box]:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+
+class HOGDetector(FaceDetector):
+    """face_recognition's default: dlib HOG behind face_recognition.face_locations"""
+
+    name = "hog"
+    model = "hog"
+
+    def __init__(self, upsample: int = 1):
+        import face_recognition
+        self.face_locations = face_recognition.face_locations
+        self.upsample = upsample
+
+    def detect(self, rgb_image: np.ndarray) -> List[Box]:
+        return self.face_locations(rgb_image, number_of_times_to_upsample=self.upsample, model=self.model)
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.upsample}"
+
+
+class CNNDetector(HOGDetector):
+    """dlib's CNN detector through face_recognition - most accurate, far too slow without a GPU"""
+
+    name = "cnn"
+    model = "cnn"
+
+
+class DlibHOGDetector(FaceDetector):
+    """dlib's frontal face HOG detector called directly, with a configurable upsample level.
+
+    Each upsample doubles the image so smaller (more distant) faces are found,
+    at roughly four times the cost.
+    """
+
+    name = "dlib_hog"
+
+    def __init__(self, upsample: int = 0):
+        import dlib
+        self.detector = dlib.get_frontal_face_detector()
+        self.upsample = upsample
+
+    def detect(self, rgb_image: np.ndarray) -> List[Box]:
+        return [_clip_box(rect.top(), rect.right(), rect.bottom(), rect.left(), rgb_image.shape)
+                for rect in self.detector(rgb_image, self.upsample)]
+
+    def describe(self) -> str:
+        return f"{self.name}:{self.upsample}"
+
+
+class HaarDetector(FaceDetector):
+    """OpenCV Haar cascade - the cheapest detector, with more misses and false positives on angled faces"""
+
+    name = "haar"
+
+    def __init__(self, scale_factor: float = 1.1, min_neighbors: int = 5, min_size: int = 20):
+        path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"Haar cascade not found: {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb_image: np.ndarray) -> List[Box]:
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY))
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(self.min_size, self.min_size))
+        return [_clip_box(y, x + w, y + h, x, rgb_image.shape) for x, y, w, h in faces]
+
+
+class DNNDetector(FaceDetector):
+    """OpenCV DNN res10 SSD (Caffe) loaded from a local model directory.
+
+    The network always sees a 300x300 blob, so its cost barely depends on the
+    frame size.
+    """
+
+    name = "dnn"
+
+    def __init__(self, model_dir: str = ".", confidence: float = 0.5, input_size: int = 300):
+        prototxt = os.path.join(model_dir, DNN_PROTOTXT)
+        caffemodel = os.path.join(model_dir, DNN_CAFFEMODEL)
+        for path in (prototxt, caffemodel):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"DNN face detector model not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, caffemodel)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, rgb_image: np.ndarray) -> List[Box]:
+        height, width = rgb_image.shape[:2]
+        # The model was trained on BGR input with these channel means
+        blob = cv2.dnn.blobFromImage(rgb_image, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+
+        boxes = []
+        for detection in detections[detections[:, 2] >= self.confidence]:
+            left, top, right, bottom = detection[3:7] * (width, height, width, height)
+            if right > left and bottom > top:
+                boxes.append(_clip_box(top, right, bottom, left, rgb_image.shape))
+        return boxes
+
+
+DETECTORS = {
+    detector.name: detector
+    for detector in (HOGDetector, CNNDetector, DlibHOGDetector, HaarDetector, DNNDetector)
+}
+
+
+def parse_detector_spec(spec: Optional[str]) -> Tuple[str, Optional[int]]:
+    """Split "name" or "name:upsample" (HOG kinds only) into its parts; empty means "hog" """
+    name, _, upsample = (spec or "hog").strip().lower().partition(":")
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector {name!r}; choose one of {', '.join(DETECTORS)}")
+    if not upsample:
+        return name, None
+    if name not in ("hog", "cnn", "dlib_hog") or not upsample.isdigit():
+        raise ValueError(f"Invalid face detector {spec!r}; only hog, cnn and dlib_hog take an upsample level")
+    return name, int(upsample)
+
+
+def create_detector(spec: Optional[str], model_dir: str = ".") -> FaceDetector:
+    """Detector from a spec such as "hog", "haar", "dnn" or "dlib_hog:2" """
+    name, upsample = parse_detector_spec(spec)
+    if name == "dnn":
+        return DNNDetector(model_dir)
+    if upsample is not None:
+        return DETECTORS[name](upsample=upsample)
+    return DETECTORS[name]()
+
+
+def _count_matches(expected: Sequence[Box], found: Sequence[Box], min_iou: float) -> int:
+    """Greedy one-to-one matching by IoU; returns how many expected boxes were found"""
+    pairs = []
+    for i, (t1, r1, b1, l1) in enumerate(expected):
+        for j, (t2, r2, b2, l2) in enumerate(found):
+            intersection = max(0, min(r1, r2) - max(l1, l2)) * max(0, min(b1, b2) - max(t1, t2))
+            union = (r1 - l1) * (b1 - t1) + (r2 - l2) * (b2 - t2) - intersection
+            if union > 0 and intersection / union >= min_iou:
+                pairs.append((intersection / union, i, j))
+
+    used_expected, used_found = set(), set()
+    for _, i, j in sorted(pairs, reverse=True):
+        if i not in used_expected and j not in used_found:
+            used_expected.add(i)
+            used_found.add(j)
+    return len(used_expected)
+
+
+def _load_frames(folder: str, limit: int = 0) -> List[Tuple[str, np.ndarray]]:
+    frames = []
+    for filename in sorted(os.listdir(folder)):
+        if not filename.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")):
+            continue
+        image = cv2.imread(os.path.join(folder, filename))
+        if image is not None:
+            frames.append((filename, cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+        if limit and len(frames) >= limit:
+            break
+    return frames
+
+
+def benchmark(folder: str, specs: Sequence[str], reference: str = "dlib_hog:1", labels: Optional[str] = None,
+              scale: float = 0.25, model_dir: str = ".", min_iou: float = 0.3, limit: int = 0) -> Dict:
+    """Latency and recall of each detector on a folder of frames.
+
+    Detectors run on frames downscaled by ``scale``, like the recognition
+    loop. Recall is measured against boxes from ``labels`` (JSON mapping file
+    name to a list of [top, right, bottom, left] at full resolution) or, without
+    labels, against the ``reference`` detector run at full resolution.
+    """
+    import json
+
+    frames = _load_frames(folder, limit)
+    if not frames:
+        raise ValueError(f"No images found in {folder}")
+
+    if labels:
+        with open(labels) as f:
+            expected = {name: [tuple(box) for box in boxes] for name, boxes in json.load(f).items()}
+        source = labels
+    else:
+        detector = create_detector(reference, model_dir)
+        expected = {name: detector.detect(frame) for name, frame in frames}
+        source = f"{detector.describe()} at full resolution"
+    total_faces = sum(len(expected.get(name, [])) for name, _ in frames)
+    print(f"{len(frames)} frames, {total_faces} faces (ground truth: {source}), detection at {scale:g}x")
+
+    small_frames = [(name, cv2.resize(frame, (0, 0), fx=scale, fy=scale)) for name, frame in frames]
+    results = {}
+    print(f"{'detector':>12} {'mean ms':>8} {'p95 ms':>8} {'recall':>7} {'false/frame':>12}")
+    for spec in specs:
+        try:
+            detector = create_detector(spec, model_dir)
+        except Exception as e:
+            print(f"{spec:>12} unavailable: {e}")
+            continue
+
+        detector.detect(small_frames[0][1])  # warm-up
+        latencies, found_faces, false_positives = [], 0, 0
+        for name, small in small_frames:
+            started = time.perf_counter()
+            boxes = detector.detect(small)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            boxes = [tuple(int(v / scale) for v in box) for box in boxes]
+            matched = _count_matches(expected.get(name, []), boxes, min_iou)
+            found_faces += matched
+            false_positives += len(boxes) - matched
+
+        stats = {
+            "mean_ms": float(np.mean(latencies)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "recall": found_faces / total_faces if total_faces else 1.0,
+            "false_per_frame": false_positives / len(frames)
+        }
+        results[detector.describe()] = stats
+        print(f"{detector.describe():>12} {stats['mean_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+              f"{stats['recall']:>7.3f} {stats['false_per_frame']:>12.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face detector latency and recall on a folder of frames")
+    parser.add_argument("folder", help="Folder of .jpg/.png frames")
+    parser.add_argument("--detectors", nargs="+", default=["hog", "dlib_hog:0", "dlib_hog:1", "haar", "dnn"])
+    parser.add_argument("--labels", default=None,
+                        help="JSON {file name: [[top, right, bottom, left], ...]} at full resolution")
+    parser.add_argument("--reference", default="dlib_hog:1", help="Ground-truth detector when there are no labels")
+    parser.add_argument("--scale", type=float, default=0.25, help="Downscale before detection, as in the recognition loop")
+    parser.add_argument("--model-dir", default=".", help=f"Folder with {DNN_PROTOTXT} and {DNN_CAFFEMODEL}")
+    parser.add_argument("--min-iou", type=float, default=0.3, help="Overlap for a detection to count as found")
+    parser.add_argument("--limit", type=int, default=0, help="Use at most this many frames")
+    args = parser.parse_args()
+
+    benchmark(args.folder, args.detectors, args.reference, args.labels, args.scale, args.model_dir,
+              args.min_iou, args.limit)
@@ -0,0 +1,59 @@
+# app/services/encoding_backfill.py
+import threading
+import time
+
+from sqlalchemy import or_
+
+from app.database import SessionLocal
+from app.models import Employee
+from app.services.face_encoding import FACE_ENCODING_MODEL, compute_face_encodings, encoding_columns
+
+_running = set()
+_lock = threading.Lock()
+
+
+def backfill_face_encodings(company: str) -> int:
+    """Encode the company's employee images that have no result for the current model yet; returns how many.
+
+    Runs as a background task of the encodings endpoint, so no request waits
+    for the roster to be encoded; one backfill per company runs at a time.
+    Results are stored with encoding_columns, failures included.
+    """
+    with _lock:
+        if company in _running:
+            return 0
+        _running.add(company)
+
+    db = SessionLocal()
+    try:
+        employees = db.query(Employee).filter(
+            Employee.company == company,
+            Employee.image_path.isnot(None),
+            or_(Employee.encoding_model.is_(None), Employee.encoding_model != FACE_ENCODING_MODEL)
+        ).all()
+        if not employees:
+            return 0
+
+        print(f"Encoding {len(employees)} employee images for {company} in the background...")
+        started = time.time()
+        # An employee changed while encoding (e.g. a new image, encoded at upload) is left as the change made it
+        snapshots = [(employee.id, employee.updated_at) for employee in employees]
+        results = compute_face_encodings([bytes(employee.image_path) for employee in employees])
+
+        stored = 0
+        for (employee_id, updated_at), (encoding, status) in zip(snapshots, results):
+            unchanged = Employee.updated_at.is_(None) if updated_at is None else Employee.updated_at == updated_at
+            stored += db.query(Employee).filter(Employee.id == employee_id, unchanged).update(
+                encoding_columns(encoding, status), synchronize_session=False
+            )
+        db.commit()
+        print(f"Encoded {stored} employee images for {company} in {time.time() - started:.1f}s")
+        return stored
+    except Exception as e:
+        db.rollback()
+        print(f"Error backfilling face encodings for {company}: {e}")
+        return 0
+    finally:
+        db.close()
+        with _lock:
+            _running.discard(company)
@@ -0,0 +1,141 @@
+# app/services/face_encoding.py
+import asyncio
+import base64
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bump when the encoder (model file, jitters, preprocessing) changes so stored encodings get recomputed.
+# Faces are aligned with the 68-point landmarks that the recognition loops also use for blink detection.
+FACE_ENCODING_MODEL = "dlib_face_recognition_resnet_model_v1+landmarks68"
+ENCODING_DIM = 128
+# Stored and served as little-endian float32: 512 bytes per employee
+ENCODING_DTYPE = np.dtype("<f4")
+
+ENCODING_WORKERS = int(os.getenv("FACE_ENCODING_WORKERS", "0")) or None
+
+_executor = None
+
+
+def compute_face_encoding(image_bytes: bytes) -> Optional[bytes]:
+    """Decode an uploaded image and return its face encoding as float32 bytes, or None if no face is found.
+
+    Runs inside a worker process, so dlib and OpenCV are imported lazily.
+    """
+    import cv2
+    import face_recognition
+
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    encodings = face_recognition.face_encodings(rgb_image, model="large")
+    if not encodings:
+        return None
+
+    return np.asarray(encodings[0], dtype=ENCODING_DTYPE).tobytes()
+
+
+def get_encoding_executor() -> ProcessPoolExecutor:
+    """Process pool used to keep face encoding off the event loop"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=ENCODING_WORKERS)
+    return _executor
+
+
+def shutdown_encoding_executor():
+    """Stop the worker processes (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def compute_face_encodings_chunk(images: Sequence[bytes]) -> List[Tuple[Optional[bytes], Optional[str]]]:
+    """Encode several images in one worker. Returns (encoding, error) per image; a bad image only fails itself."""
+    results = []
+    for image_bytes in images:
+        try:
+            results.append((compute_face_encoding(image_bytes), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+def compute_face_encodings(images: Sequence[bytes], chunk_size: int = 0,
+                           progress: Optional[Callable[[int, int], None]] = None) -> List[Tuple[Optional[bytes], str]]:
+    """Encode many images across the worker pool in chunks (used at startup, outside the event loop).
+
+    Returns (encoding, status) per image in input order, status computed/no_face/failed.
+    """
+    total = len(images)
+    if total == 0:
+        return []
+
+    executor = get_encoding_executor()
+    if not chunk_size:
+        # A few chunks per worker keeps the pool busy without per-image IPC overhead
+        workers = ENCODING_WORKERS or os.cpu_count() or 1
+        chunk_size = max(1, min(16, math.ceil(total / (workers * 4))))
+
+    results: List[Tuple[Optional[bytes], str]] = [(None, "failed")] * total
+    futures = {
+        executor.submit(compute_face_encodings_chunk, images[start:start + chunk_size]): start
+        for start in range(0, total, chunk_size)
+    }
+
+    done = 0
+    for future in as_completed(futures):
+        start = futures[future]
+        try:
+            chunk_results = future.result()
+        except Exception as e:
+            # A crashed worker fails its whole chunk; those employees are retried on the next load
+            print(f"Face encoding chunk failed: {e}")
+            chunk_results = [(None, str(e))] * len(images[start:start + chunk_size])
+
+        for offset, (encoding, error) in enumerate(chunk_results):
+            status = "failed" if error else ("computed" if encoding is not None else "no_face")
+            results[start + offset] = (encoding, status)
+
+        done += len(chunk_results)
+        if progress:
+            progress(done, total)
+
+    return results
+
+
+async def compute_face_encoding_async(image_bytes: bytes) -> Tuple[Optional[bytes], str]:
+    """Compute an encoding in the worker pool. Returns (encoding, status) with status computed/no_face/failed."""
+    loop = asyncio.get_running_loop()
+    try:
+        encoding = await loop.run_in_executor(get_encoding_executor(), compute_face_encoding, image_bytes)
+    except Exception as e:
+        print(f"Face encoding failed: {e}")
+        return None, "failed"
+
+    return encoding, "computed" if encoding is not None else "no_face"
+
+
+def encoding_columns(encoding: Optional[bytes], status: str) -> dict:
+    """Employee column values for an encoding result.
+
+    Failures are stored with the model too, so an image that cannot be
+    encoded is not tried again until a new one is uploaded or the model changes.
+    """
+    return {"face_encoding": encoding, "encoding_model": FACE_ENCODING_MODEL, "encoding_status": status}
+
+
+def decode_face_encoding(data: bytes) -> np.ndarray:
+    """Stored float32 bytes -> float64 vector as returned by face_recognition"""
+    return np.frombuffer(data, dtype=ENCODING_DTYPE).astype(np.float64)
+
+
+def encoding_to_base64(data: bytes) -> str:
+    """Stored float32 bytes -> base64 string for JSON responses"""
+    return base64.b64encode(data).decode("utf-8")
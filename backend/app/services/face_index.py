@@ -0,0 +1,460 @@
+# app/services/face_index.py - copy of fras_local/face_index.py; edit that file and run fras_local/sync_backend.py
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ENCODING_DIM = 128
+# Rows per chunk when computing large distance matrices (keeps memory bounded during k-means)
+CHUNK_ROWS = 8192
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    """Any sequence of 128-d encodings -> contiguous (N, 128) float32"""
+    return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM))
+
+
+def _sq_norms(matrix: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+def _sq_distances(queries: np.ndarray, vectors: np.ndarray, vector_sq_norms: np.ndarray) -> np.ndarray:
+    """(M, N) squared euclidean distances using |q|^2 + |v|^2 - 2 q.v"""
+    sq_dist = _sq_norms(queries)[:, None] + vector_sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+    return np.maximum(sq_dist, 0.0, out=sq_dist)
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid for every row, computed in chunks"""
+    centroid_sq_norms = _sq_norms(centroids)
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), CHUNK_ROWS):
+        chunk = data[start:start + CHUNK_ROWS]
+        assign[start:start + CHUNK_ROWS] = np.argmin(_sq_distances(chunk, centroids, centroid_sq_norms), axis=1)
+    return assign
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd k-means; empty clusters are re-seeded from random points"""
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    k = max(1, min(k, len(data)))
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+
+        sums = np.add.reduceat(data[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+
+    return centroids
+
+
+def _top_k(sq_dist: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted k smallest distances (as euclidean) and their ids for one query"""
+    kk = min(k, len(sq_dist))
+    part = np.argpartition(sq_dist, kk - 1)[:kk] if kk < len(sq_dist) else np.arange(len(sq_dist))
+    part = part[np.argsort(sq_dist[part])]
+    return np.sqrt(sq_dist[part]), ids[part]
+
+
+class FaceIndex:
+    """Nearest-neighbour search over 128-d face encodings keyed by integer ids"""
+
+    kind = "base"
+    keep_vectors = True
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+        self.fingerprint = ""
+
+    def __len__(self):
+        return len(self.ids)
+
+    def params(self) -> Dict:
+        """Constructor arguments, stored alongside the index on save"""
+        return {}
+
+    def is_trained(self) -> bool:
+        return True
+
+    def train(self, vectors: np.ndarray):
+        """Learn partitions / codebooks (no-op for exact search)"""
+
+    def build(self, vectors, ids=None):
+        """Replace the index contents with the given encodings"""
+        vectors = _as_matrix(vectors)
+        ids = np.arange(len(vectors), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.__init__(**self.params())
+        if len(vectors):
+            self.train(vectors)
+            self.add(vectors, ids)
+
+    def add(self, vectors, ids):
+        """Add encodings under new ids"""
+        vectors = _as_matrix(vectors)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} encodings but {len(ids)} ids")
+        if np.isin(ids, self.ids).any() or len(np.unique(ids)) != len(ids):
+            raise ValueError("Encoding ids must be unique")
+        if not len(ids):
+            return
+        if not self.is_trained():
+            self.train(vectors)
+
+        self.ids = np.concatenate((self.ids, ids))
+        if self.keep_vectors:
+            self.vectors = np.concatenate((self.vectors, vectors))
+            self.sq_norms = np.concatenate((self.sq_norms, _sq_norms(vectors)))
+        self._added(vectors)
+
+    def remove(self, ids) -> int:
+        """Remove encodings by id; returns how many were removed"""
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        removed = int(len(keep) - keep.sum())
+        if removed:
+            self.ids = self.ids[keep]
+            if self.keep_vectors:
+                self.vectors = self.vectors[keep]
+                self.sq_norms = self.sq_norms[keep]
+            self._kept(keep)
+        return removed
+
+    def _added(self, vectors: np.ndarray):
+        """Hook for subclasses after rows were appended"""
+
+    def _kept(self, keep: np.ndarray):
+        """Hook for subclasses after rows were filtered"""
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """(M, k) distances and ids of the nearest encodings; missing neighbours are inf / -1"""
+        raise NotImplementedError
+
+    def _empty_result(self, count: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return np.full((count, k), np.inf, dtype=np.float32), np.full((count, k), -1, dtype=np.int64)
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the searchable data"""
+        return self.ids.nbytes + self.vectors.nbytes + self.sq_norms.nbytes
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {"ids": self.ids, "vectors": self.vectors, "sq_norms": self.sq_norms}
+
+    def _load_state(self, data):
+        self.ids = data["ids"]
+        self.vectors = data["vectors"]
+        self.sq_norms = data["sq_norms"]
+
+    def save(self, path: str):
+        """Persist the index to a .npz file"""
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                kind=np.array(self.kind),
+                params=np.array(json.dumps(self.params())),
+                fingerprint=np.array(self.fingerprint),
+                **self._state()
+            )
+
+    @staticmethod
+    def load(path: str) -> "FaceIndex":
+        """Load an index saved with save()"""
+        with np.load(path, allow_pickle=False) as data:
+            index = create_index(str(data["kind"]), **json.loads(str(data["params"])))
+            index._load_state(data)
+            index.fingerprint = str(data["fingerprint"])
+        return index
+
+
+class ExactIndex(FaceIndex):
+    """Brute-force search over one contiguous float32 matrix"""
+
+    kind = "exact"
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = _as_matrix(queries)
+        distances, ids = self._empty_result(len(queries), k)
+        if not len(self) or not len(queries):
+            return distances, ids
+
+        sq_dist = _sq_distances(queries, self.vectors, self.sq_norms)
+        kk = min(k, len(self))
+        if kk < len(self):
+            part = np.argpartition(sq_dist, kk - 1, axis=1)[:, :kk]
+        else:
+            part = np.broadcast_to(np.arange(len(self)), (len(queries), kk))
+        part_dist = np.take_along_axis(sq_dist, part, axis=1)
+        order = np.argsort(part_dist, axis=1)
+
+        distances[:, :kk] = np.sqrt(np.take_along_axis(part_dist, order, axis=1))
+        ids[:, :kk] = self.ids[np.take_along_axis(part, order, axis=1)]
+        return distances, ids
+
+
+class IVFIndex(FaceIndex):
+    """Inverted-file index: k-means partitions, only the nprobe closest partitions are scanned"""
+
+    kind = "ivf"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8):
+        super().__init__()
+        self.nlist = nlist          # 0 picks sqrt(N) partitions at train time
+        self.nprobe = nprobe
+        self.centroids = None
+        self.assign = np.zeros(0, dtype=np.int32)
+        self.lists: List[np.ndarray] = []
+
+    def params(self) -> Dict:
+        return {"nlist": self.nlist, "nprobe": self.nprobe}
+
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray):
+        nlist = self.nlist or int(round(np.sqrt(len(vectors))))
+        sample = self._training_sample(vectors, 32 * nlist)
+        self.centroids = kmeans(sample, nlist)
+
+    def _training_sample(self, vectors: np.ndarray, size: int) -> np.ndarray:
+        if len(vectors) <= size:
+            return vectors
+        rng = np.random.default_rng(0)
+        return vectors[rng.choice(len(vectors), size, replace=False)]
+
+    def _added(self, vectors: np.ndarray):
+        self.assign = np.concatenate((self.assign, _nearest(vectors, self.centroids)))
+        self._rebuild_lists()
+
+    def _kept(self, keep: np.ndarray):
+        self.assign = self.assign[keep]
+        self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        """Group row numbers by partition"""
+        count = len(self.centroids)
+        order = np.argsort(self.assign, kind="stable")
+        bounds = np.cumsum(np.bincount(self.assign, minlength=count))[:-1]
+        self.lists = np.split(order, bounds)
+
+    def _scan(self, query: np.ndarray, probes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Squared distances and row numbers for every entry in the probed partitions"""
+        rows = np.concatenate([self.lists[p] for p in probes])
+        sq_dist = float(query @ query) + self.sq_norms[rows] - 2.0 * (self.vectors[rows] @ query)
+        return np.maximum(sq_dist, 0.0), rows
+
+    def _refine(self, query: np.ndarray, sq_dist: np.ndarray, rows: np.ndarray, k: int):
+        return sq_dist, rows
+
+    def search(self, queries, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        queries = _as_matrix(queries)
+        distances, ids = self._empty_result(len(queries), k)
+        if not len(self) or not len(queries):
+            return distances, ids
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        coarse = _sq_distances(queries, self.centroids, _sq_norms(self.centroids))
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe] if nprobe < len(self.centroids) \
+            else np.broadcast_to(np.arange(nprobe), (len(queries), nprobe))
+
+        for i, query in enumerate(queries):
+            sq_dist, rows = self._scan(query, probes[i])
+            if not len(rows):
+                continue
+            sq_dist, rows = self._refine(query, sq_dist, rows, k)
+            found_dist, found_rows = _top_k(sq_dist, rows, k)
+            distances[i, :len(found_rows)] = found_dist
+            ids[i, :len(found_rows)] = self.ids[found_rows]
+
+        return distances, ids
+
+    def memory_bytes(self) -> int:
+        return super().memory_bytes() + self.assign.nbytes + (self.centroids.nbytes if self.centroids is not None else 0)
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = super()._state()
+        state.update({"centroids": self.centroids, "assign": self.assign})
+        return state
+
+    def _load_state(self, data):
+        super()._load_state(data)
+        self.centroids = data["centroids"]
+        self.assign = data["assign"]
+        self._rebuild_lists()
+
+
+class PQIndex(IVFIndex):
+    """IVF partitions with product-quantized residuals (m one-byte codes per face).
+
+    Candidates are ranked with asymmetric distance tables; the best ``rerank``
+    are then re-scored exactly. With rerank=0 raw vectors are not kept at all
+    and reported distances are approximate.
+    """
+
+    kind = "pq"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, m: int = 16, nbits: int = 8, rerank: int = 16):
+        if ENCODING_DIM % m:
+            raise ValueError(f"m must divide {ENCODING_DIM}")
+        super().__init__(nlist, nprobe)
+        self.m = m
+        self.nbits = nbits
+        self.rerank = rerank
+        self.keep_vectors = rerank > 0
+        self.codebooks = None
+        self.codes = np.zeros((0, m), dtype=np.uint8)
+        # Per-partition part of the distance tables: |b|^2 + 2 c.b for every sub-codeword b
+        self.partition_terms = None
+
+    def params(self) -> Dict:
+        return {"nlist": self.nlist, "nprobe": self.nprobe, "m": self.m, "nbits": self.nbits, "rerank": self.rerank}
+
+    def train(self, vectors: np.ndarray):
+        super().train(vectors)
+        sample = self._training_sample(vectors, 64 * (1 << self.nbits))
+        residuals = sample - self.centroids[_nearest(sample, self.centroids)]
+        sub = residuals.reshape(len(residuals), self.m, -1)
+        ksub = min(1 << self.nbits, len(residuals))
+        self.codebooks = np.stack([kmeans(sub[:, j], ksub) for j in range(self.m)])
+        self._precompute_terms()
+
+    def _precompute_terms(self):
+        """|q - c - b|^2 = |q - c|^2 + (|b|^2 + 2 c.b) - 2 q.b, the middle term only depends on the partition"""
+        centroid_subs = self.centroids.reshape(len(self.centroids), self.m, -1)
+        codeword_sq_norms = (self.codebooks ** 2).sum(axis=2)
+        self.partition_terms = codeword_sq_norms[None] + 2.0 * np.einsum("pjd,jkd->pjk", centroid_subs, self.codebooks)
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        sub = residuals.reshape(len(residuals), self.m, -1)
+        return np.stack([_nearest(np.ascontiguousarray(sub[:, j]), self.codebooks[j]) for j in range(self.m)], axis=1).astype(np.uint8)
+
+    def _added(self, vectors: np.ndarray):
+        assign = _nearest(vectors, self.centroids)
+        self.codes = np.concatenate((self.codes, self._encode(vectors - self.centroids[assign])))
+        self.assign = np.concatenate((self.assign, assign))
+        self._rebuild_lists()
+
+    def _kept(self, keep: np.ndarray):
+        self.codes = self.codes[keep]
+        super()._kept(keep)
+
+    def _scan(self, query: np.ndarray, probes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        sub_range = np.arange(self.m)
+        query_terms = 2.0 * np.einsum("jd,jkd->jk", query.reshape(self.m, -1), self.codebooks)
+        all_dist = []
+        all_rows = []
+        for p in probes:
+            rows = self.lists[p]
+            if not len(rows):
+                continue
+            offset = self.centroids[p] - query
+            table = self.partition_terms[p] - query_terms
+            all_dist.append(table[sub_range, self.codes[rows]].sum(axis=1) + float(offset @ offset))
+            all_rows.append(rows)
+        if not all_rows:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return np.concatenate(all_dist), np.concatenate(all_rows)
+
+    def _refine(self, query: np.ndarray, sq_dist: np.ndarray, rows: np.ndarray, k: int):
+        if not self.rerank:
+            return sq_dist, rows
+        count = min(max(self.rerank, k), len(rows))
+        top = np.argpartition(sq_dist, count - 1)[:count] if count < len(rows) else np.arange(len(rows))
+        rows = rows[top]
+        exact = float(query @ query) + self.sq_norms[rows] - 2.0 * (self.vectors[rows] @ query)
+        return np.maximum(exact, 0.0), rows
+
+    def memory_bytes(self) -> int:
+        return super().memory_bytes() + self.codes.nbytes + (self.codebooks.nbytes if self.codebooks is not None else 0)
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = super()._state()
+        state.update({"codebooks": self.codebooks, "codes": self.codes})
+        return state
+
+    def _load_state(self, data):
+        self.codebooks = data["codebooks"]
+        self.codes = data["codes"]
+        super()._load_state(data)
+        self._precompute_terms()
+
+
+INDEX_TYPES = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex,
+    PQIndex.kind: PQIndex
+}
+
+
+def create_index(kind: str = "exact", **params) -> FaceIndex:
+    """Create an empty index of the given kind (exact, ivf or pq)"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown face index type '{kind}', expected one of {list(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**params)
+
+
+def recall_report(size: int = 50000, num_queries: int = 200, encodings: Optional[np.ndarray] = None, k: int = 1):
+    """Print build time, query latency, memory and recall@k of each index type against exact search"""
+    rng = np.random.default_rng(0)
+    if encodings is None:
+        # Synthetic gallery with realistic spacing: ~0.9 between people, ~0.35 for a new photo of the same person
+        encodings = rng.normal(0.0, 0.055, (size, ENCODING_DIM)).astype(np.float32)
+    encodings = _as_matrix(encodings)
+    picks = rng.choice(len(encodings), min(num_queries, len(encodings)), replace=False)
+    queries = encodings[picks] + rng.normal(0.0, 0.031, (len(picks), ENCODING_DIM)).astype(np.float32)
+
+    configs = [
+        ("exact", {}),
+        ("ivf", {"nprobe": 1}),
+        ("ivf", {"nprobe": 4}),
+        ("ivf", {"nprobe": 8}),
+        ("ivf", {"nprobe": 16}),
+        ("pq", {"nprobe": 8, "rerank": 0}),
+        ("pq", {"nprobe": 8, "rerank": 16}),
+        ("pq", {"nprobe": 16, "rerank": 32})
+    ]
+
+    print(f"{len(encodings)} encodings, {len(queries)} queries, recall@{k} vs exact search")
+    print(f"{'index':<30} {'build s':>8} {'query ms':>9} {'recall':>7} {'MB':>7}")
+
+    truth = None
+    for kind, params in configs:
+        index = create_index(kind, **params)
+        started = time.perf_counter()
+        index.build(encodings)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, ids = index.search(queries, k)
+        query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        if truth is None:
+            truth = ids
+        recall = np.mean([len(set(found) & set(expected)) / k for found, expected in zip(ids, truth)])
+
+        label = kind + (" " + ",".join(f"{key}={value}" for key, value in params.items()) if params else "")
+        print(f"{label:<30} {build_s:>8.2f} {query_ms:>9.3f} {recall:>7.3f} {index.memory_bytes() / 1e6:>7.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face index recall vs latency report")
+    parser.add_argument("--size", type=int, default=50000, help="Synthetic gallery size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--encodings", help="Optional (N, 128) .npy file, e.g. .fras_cache/<company>/encodings.npy")
+    parser.add_argument("-k", type=int, default=1)
+    args = parser.parse_args()
+
+    recall_report(args.size, args.queries, np.load(args.encodings) if args.encodings else None, args.k)
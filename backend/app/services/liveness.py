@@ -0,0 +1,74 @@
+# app/services/liveness.py - copy of fras_local/liveness.py; edit that file and run fras_local/sync_backend.py
+import itertools
+from typing import Sequence
+
+import numpy as np
+
+NUM_LANDMARKS = 68
+# Six points per eye in the 68-point layout: corners at 0 and 3, lids at 1, 2 (top) and 5, 4 (bottom)
+EYES = slice(36, 48)
+
+
+def shapes_to_array(shapes: Sequence) -> np.ndarray:
+    """dlib full_object_detections -> (N, 68, 2) float32 array of landmark coordinates"""
+    count = len(shapes)
+    coords = np.fromiter(
+        itertools.chain.from_iterable((point.x, point.y) for shape in shapes for point in shape.parts()),
+        dtype=np.float32,
+        count=count * NUM_LANDMARKS * 2
+    )
+    return coords.reshape(count, NUM_LANDMARKS, 2)
+
+
+def eye_aspect_ratios(landmarks: np.ndarray) -> np.ndarray:
+    """(N, 68, 2) landmarks -> (N, 2) left and right eye aspect ratios for all faces at once"""
+    eyes = np.asarray(landmarks, dtype=np.float32)[:, EYES].reshape(-1, 2, 6, 2)
+
+    vertical = np.linalg.norm(eyes[:, :, [1, 2]] - eyes[:, :, [5, 4]], axis=-1).sum(axis=-1)
+    horizontal = np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=-1)
+
+    return vertical / (2.0 * np.maximum(horizontal, 1e-6))
+
+
+class BlinkCounter:
+    """Recent eye aspect ratios of one face in a fixed-size ring buffer, and the blinks counted from them.
+
+    A blink is an eyes-closed run of 1..max_closed_frames samples followed by
+    an open sample; longer closures are not counted.
+    """
+
+    __slots__ = ("history", "position", "blinks")
+
+    def __init__(self, size: int = 16):
+        self.history = np.zeros(size, dtype=np.float32)
+        self.position = 0   # total samples seen; the next one goes to position % size
+        self.blinks = 0
+
+    def update(self, ear: float, closed_threshold: float, max_closed_frames: int) -> int:
+        """Add one sample and return the blink count"""
+        size = len(self.history)
+
+        if ear >= closed_threshold:
+            # Length of the eyes-closed run that this open sample ends
+            run = 0
+            available = min(self.position, size)
+            while run < available and self.history[(self.position - 1 - run) % size] < closed_threshold:
+                run += 1
+
+            if 1 <= run <= max_closed_frames:
+                self.blinks += 1
+
+        self.history[self.position % size] = ear
+        self.position += 1
+        return self.blinks
+
+    def recent(self) -> np.ndarray:
+        """Buffered samples, oldest first"""
+        size = len(self.history)
+        if self.position <= size:
+            return self.history[:self.position].copy()
+        return np.roll(self.history, -(self.position % size))
+
+    def reset(self):
+        """Start counting blinks again (after attendance was recorded)"""
+        self.blinks = 0
@@ -11,19 +11,39 @@ import numpy as np
 import cv2
 import face_recognition
 import dlib
-from scipy.spatial import distance as dist
 import requests
 import base64
 import json
 from sqlalchemy.orm import Session
 from app.database import get_db, SessionLocal
 from app.models import CameraSettings, Employee, AttendanceRecord
+from app.services.face_encoding import FACE_ENCODING_MODEL, compute_face_encodings, decode_face_encoding, encoding_columns
+from app.services.attendance_day import initialize_day
+from app.services.attendance_dispatcher import AttendanceDispatcher, AttendanceEvent
+from app.services.attendance_events import apply_attendance_event
+from app.services.detectors import FaceDetector, HOGDetector, create_detector
+from app.services.face_gallery import FaceGallery
+from app.services.liveness import BlinkCounter, eye_aspect_ratios, shapes_to_array
+from app.services.metrics import Metrics
+from app.services.preprocess import LowLightEnhancer
+from app.services.roi import filter_small_boxes, offset_boxes, parse_roi, roi_bounds
+from app.services.shared_gallery import SharedGalleryPublisher
 import asyncio
 from threading import Lock
 import io
 
 
 KIGALI_TZ = zoneinfo.ZoneInfo("Africa/Kigali")
+# Nearest-neighbour index for the gallery: exact, ivf or pq (see face_index.py)
+FACE_INDEX_TYPE = os.getenv("FACE_INDEX_TYPE", "exact")
+# Directory the gallery is published to as memory-mapped files for recognition worker processes; empty disables it
+SHARED_GALLERY_DIR = os.getenv("SHARED_GALLERY_DIR", "")
+# Face detector when the camera settings do not choose one: hog, cnn, dlib_hog[:upsample], haar or dnn (see detectors.py)
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "hog")
+# Folder with the res10 SSD model files for the dnn detector
+DETECTOR_MODEL_DIR = os.getenv("DETECTOR_MODEL_DIR", ".")
+# Mean frame brightness (0-255) below which the detection frame is enhanced with CLAHE
+LOW_LIGHT_THRESHOLD = float(os.getenv("LOW_LIGHT_THRESHOLD", "80"))
 
 class RecognitionService:
     _instance = None
@@ -49,17 +69,17 @@ class RecognitionService:
         self.company = None
         
         # Facial recognition setup
-        self.detector = None
         self.predictor = None
         
         # Face data
         self.known_face_encodings = []
         self.known_face_names = []
         self.employee_data = {}
+        self.gallery = FaceGallery()
+        self.gallery_publisher = None
         
-        # Tracking variables
-        self.person_blink_count = {}
-        self.eye_closed_frames = {}
+        # Tracking variables - eye aspect ratio history and blink count per person
+        self.blink_counters = {}
         self.last_detection_time = {}
         # Store employee IDs instead of database objects
         self.attendance_employee_ids = {}
@@ -74,6 +94,14 @@ class RecognitionService:
         self.camera_source = "0"
         self.camera_type = "Webcam"
         
+        # Detection area and smallest face worth encoding, from the camera settings
+        self.detection_roi = None
+        self.min_face_size = 0
+        self.face_detector = self.create_face_detector(FACE_DETECTOR)
+        
+        # Low-light enhancement of the downscaled detection frame, only when the scene is dark
+        self.enhancer = LowLightEnhancer(dark_threshold=LOW_LIGHT_THRESHOLD)
+        
         # Preview window control
         self.show_preview = True
 
@@ -81,6 +109,12 @@ class RecognitionService:
         self.frame_lock = Lock()
         self.latest_frame = None
         self.streaming_clients = set()
+        
+        # Per-stage timings and frame, face and attendance counters for get_status() and /api/metrics
+        self.metrics = Metrics()
+        
+        # Attendance database work runs on the dispatcher thread, never in the recognition loop
+        self.dispatcher = None
     
     def get_current_time(self):
         """Get current time with KIGALI_TZ awareness - consistent across the app"""
@@ -104,7 +138,6 @@ class RecognitionService:
             self.company = company
             
             # Initialize dlib components
-            self.detector = dlib.get_frontal_face_detector()
             predictor_path = os.path.join(os.path.dirname(__file__), 'shape_predictor_68_face_landmarks.dat')
             if not os.path.exists(predictor_path):
                 # Try alternative paths
@@ -139,6 +172,13 @@ class RecognitionService:
                 self.BLINK_THRESHOLD = int(settings.blinking_threshold)
                 self.camera_source = settings.camera_source
                 self.camera_type = settings.camera_type
+                self.min_face_size = settings.min_face_size or 0
+                try:
+                    self.detection_roi = parse_roi(settings.detection_roi)
+                except ValueError as e:
+                    print(f"Ignoring invalid detection ROI: {e}")
+                    self.detection_roi = None
+                self.face_detector = self.create_face_detector(settings.face_detector or FACE_DETECTOR)
             
             # Get employees with images
             employees = db.query(Employee).filter(
@@ -151,40 +191,59 @@ class RecognitionService:
             self.known_face_names = []
             self.employee_data = {}
             
+            # Encodings stored at upload time are used as is; the rest are computed across the worker pool
+            stale = [
+                employee for employee in employees
+                if employee.image_path and employee.encoding_model != FACE_ENCODING_MODEL
+            ]
+            computed = {}
+            if stale:
+                print(f"Encoding {len(stale)} employee images in worker processes...")
+                started = time.time()
+                results = compute_face_encodings(
+                    [bytes(employee.image_path) for employee in stale],
+                    progress=self.report_enrollment_progress
+                )
+                computed = {employee.id: result for employee, result in zip(stale, results)}
+                print(f"Encoded {len(stale)} employee images in {time.time() - started:.1f}s")
+            
             for employee in employees:
                 if employee.image_path:
                     try:
-                        # Convert binary image data to numpy array
-                        image_data = np.frombuffer(employee.image_path, np.uint8)
+                        if employee.id in computed:
+                            # Persist it, failures too, so the next start (and recognition clients) can skip this step
+                            for field, value in encoding_columns(*computed[employee.id]).items():
+                                setattr(employee, field, value)
                         
-                        # Decode image using OpenCV
-                        image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
+                        if employee.encoding_status == "failed":
+                            print(f"Failed to encode image for {employee.name}")
+                            continue
                         
-                        if image is not None:
-                            # Convert BGR to RGB for face_recognition library
-                            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                            
-                            # Create face encoding
-                            encodings = face_recognition.face_encodings(rgb_image)
-                            
-                            if encodings:
-                                self.known_face_encodings.append(encodings[0])
-                                self.known_face_names.append(employee.name)
-                                self.employee_data[employee.name] = {
-                                    'id': employee.id,
-                                    'name': employee.name,
-                                    'email': employee.email,
-                                    'department': employee.department
-                                }
-                                print(f"Loaded face encoding for {employee.name}")
-                            else:
-                                print(f"No face found in image for {employee.name}")
+                        if employee.face_encoding is not None:
+                            self.known_face_encodings.append(decode_face_encoding(employee.face_encoding))
+                            self.known_face_names.append(employee.name)
+                            self.employee_data[employee.name] = {
+                                'id': employee.id,
+                                'name': employee.name,
+                                'email': employee.email,
+                                'department': employee.department
+                            }
                         else:
-                            print(f"Failed to decode image for {employee.name}")
+                            print(f"No face found in image for {employee.name}")
                             
                     except Exception as e:
                         print(f"Error processing image for {employee.name}: {e}")
+            
+            if computed:
+                try:
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    print(f"Error saving face encodings: {e}")
         
+            # Nearest-neighbour index used for batched matching in the recognition loop
+            self.gallery = FaceGallery(self.known_face_encodings, self.known_face_names, index_type=FACE_INDEX_TYPE)
+            self.publish_gallery()
             print(f"Loaded {len(self.known_face_names)} employee face encodings")
             
             # Create initial attendance records
@@ -193,47 +252,44 @@ class RecognitionService:
         except Exception as e:
             print(f"Error loading settings and employees: {e}")
 
+    def report_enrollment_progress(self, done: int, total: int):
+        """Log encoding progress every 10%"""
+        if done == total or done * 10 // total != (done - 1) * 10 // total:
+            print(f"Encoding employee images: {done}/{total}")
+    
+    def create_face_detector(self, spec: str) -> FaceDetector:
+        """Detector chosen in the camera settings, falling back to HOG when it cannot be loaded"""
+        try:
+            return create_detector(spec, DETECTOR_MODEL_DIR)
+        except Exception as e:
+            print(f"Cannot use face detector {spec!r}, using hog: {e}")
+            return HOGDetector()
+    
+    def publish_gallery(self):
+        """Publish the gallery for recognition worker processes, which pick up each new generation without a restart"""
+        if not SHARED_GALLERY_DIR:
+            return
+        
+        try:
+            if self.gallery_publisher is None:
+                self.gallery_publisher = SharedGalleryPublisher(SHARED_GALLERY_DIR)
+            self.gallery_publisher.publish_gallery(self.gallery)
+        except Exception as e:
+            print(f"Could not publish the shared gallery: {e}")
+    
     def create_initial_attendance_records(self, db: Session):
         """Create attendance records for all employees with status 'absent'"""
         try:
             current_date = datetime.now(KIGALI_TZ).date()
             print(f"Creating attendance records for date: {current_date}")
-            print(f"Employee data available: {list(self.employee_data.keys())}")
             
-            for employee_name, employee_info in self.employee_data.items():
-                try:
-                    # Check if record already exists for today
-                    existing_record = db.query(AttendanceRecord).filter(
-                        AttendanceRecord.employee_id == employee_info['id'],
-                        AttendanceRecord.date >= current_date,
-                        AttendanceRecord.date < current_date + timedelta(days=1)
-                    ).first()
-                    
-                    if not existing_record:
-                        # Create new attendance record with only basic info
-                        new_record = AttendanceRecord(
-                            employee_id=employee_info['id'],
-                            name=employee_name,
-                            camera_used=self.camera_type,
-                            company=self.company,
-                            status="absent",
-                            date=current_date
-                        )
-                        
-                        db.add(new_record)
-                        # Store employee ID instead of database object
-                        self.attendance_employee_ids[employee_name] = employee_info['id']
-                        print(f"Created new attendance record for {employee_name}")
-                    else:
-                        self.attendance_employee_ids[employee_name] = employee_info['id']
-                        print(f"Found existing attendance record for {employee_name} - Status: {existing_record.status}")
-                        
-                except Exception as e:
-                    print(f"Error creating record for {employee_name}: {e}")
-                    continue
+            # Every missing absent record of the company in one statement
+            day = initialize_day(db, self.company, current_date, self.camera_type)
+            print(f"Created {day['created']} new attendance records")
             
-            # Commit all records at once
-            db.commit()
+            # Store employee IDs instead of database objects
+            for employee_name, employee_info in self.employee_data.items():
+                self.attendance_employee_ids[employee_name] = employee_info['id']
             print(f"Successfully created/loaded attendance records for {len(self.attendance_employee_ids)} employees")
                 
         except Exception as e:
@@ -271,141 +327,37 @@ class RecognitionService:
         finally:
             db.close()
         
-        print(f"Blink counts: {self.person_blink_count}")
+        print(f"Blink counts: {self.get_blink_counts()}")
         print(f"Last detection times: {self.last_detection_time}")
         print("=== END DEBUG INFO ===")
     
-    def eye_aspect_ratio(self, eye):
-        """Calculate eye aspect ratio for blink detection"""
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        C = dist.euclidean(eye[0], eye[3])
-        ear = (A + B) / (2.0 * C)
-        return ear
+    def face_landmarks(self, image, face_locations, scale: int = 4) -> list:
+        """68-point landmarks on the full resolution image for face locations found on the downscaled frame"""
+        return [
+            self.predictor(image, dlib.rectangle(left * scale, top * scale, right * scale, bottom * scale))
+            for top, right, bottom, left in face_locations
+        ]
     
-    def detect_blink(self, shape, name):
-        """Detect blink for liveness verification"""
-        left_eye = shape[36:42]
-        right_eye = shape[42:48]
-        
-        left_ear = self.eye_aspect_ratio(left_eye)
-        right_ear = self.eye_aspect_ratio(right_eye)
-        ear = (left_ear + right_ear) / 2.0
-        
-        if name not in self.eye_closed_frames:
-            self.eye_closed_frames[name] = 0
-        
-        if ear < 0.25:  # Eyes closed
-            self.eye_closed_frames[name] += 1
-        else:  # Eyes open
-            if 1 <= self.eye_closed_frames[name] <= self.BLINK_DURATION_THRESHOLD:
-                self.person_blink_count[name] = self.person_blink_count.get(name, 0) + 1
-            self.eye_closed_frames[name] = 0
+    def encode_faces(self, image, landmarks) -> list:
+        """Face encodings from precomputed landmarks - same result as face_recognition.face_encodings(model="large")"""
+        with self.metrics.time("encode"):
+            return [
+                np.array(face_recognition.api.face_encoder.compute_face_descriptor(image, shape, 1))
+                for shape in landmarks
+            ]
+    
+    def detect_blink(self, name, ear: float) -> bool:
+        """Detect blink for liveness verification from this frame's eye aspect ratio"""
+        counter = self.blink_counters.get(name)
+        if counter is None:
+            counter = self.blink_counters[name] = BlinkCounter()
         
-        return self.person_blink_count.get(name, 0) >= self.BLINK_THRESHOLD
+        blinks = counter.update(ear, 0.25, self.BLINK_DURATION_THRESHOLD)
+        return blinks >= self.BLINK_THRESHOLD
     
-    def update_attendance_record(self, employee_name: str, action: str):
-        """Update attendance record in database using a new session"""
-        db = self.get_db_session()
-        try:
-            print(f"Attempting to update attendance: {employee_name} - {action}")
-            
-            employee_id = self.attendance_employee_ids.get(employee_name)
-            if not employee_id:
-                print(f"No employee ID found for {employee_name}")
-                return False
-            
-            # Get fresh record from database
-            current_date = datetime.now(KIGALI_TZ).date()
-            record = db.query(AttendanceRecord).filter(
-                AttendanceRecord.employee_id == employee_id,
-                AttendanceRecord.date >= current_date,
-                AttendanceRecord.date < current_date + timedelta(days=1)
-            ).first()
-            
-            if not record:
-                print(f"No attendance record found for {employee_name}")
-                return False
-            
-            # Use timezone-aware current time
-            current_time = self.get_current_time()
-            print(f"Current time: {current_time}")
-            print(f"Record current state - Arrival: {record.arrival_time}, Departure: {record.departure_time}, Status: {record.status}")
-            
-            if action == "checkin" and not record.arrival_time:
-                # Update check-in time and status
-                record.arrival_time = current_time
-                record.status = "present"
-                self.last_detection_time[employee_name] = current_time
-                
-                try:
-                    db.commit()
-                    print(f"✓ {employee_name} checked in at {current_time.strftime('%H:%M:%S')}")
-                    return True
-                except Exception as e:
-                    print(f"Error committing check-in for {employee_name}: {e}")
-                    db.rollback()
-                    return False
-                    
-            elif action == "checkout" and record.arrival_time and not record.departure_time:
-                # Check if enough time has passed since last detection
-                last_time = self.last_detection_time.get(employee_name)
-                print(f"Last detection time for {employee_name}: {last_time}")
-                
-                if last_time:
-                    # Ensure both times are timezone-aware for comparison
-                    last_time_aware = self.make_timezone_aware(last_time)
-                    time_diff = (current_time - last_time_aware).total_seconds()
-                    
-                    if time_diff < self.CHECKOUT_DELAY_MINUTES * 60:
-                        print(f"Too soon for checkout. Only {int(time_diff)} seconds passed")
-                        return False
-                
-                # Calculate hours worked with timezone-aware times
-                arrival_time_aware = self.make_timezone_aware(record.arrival_time)
-                hours_worked = (current_time - arrival_time_aware).total_seconds() / 3600
-                
-                record.departure_time = current_time
-                record.hours_worked = round(hours_worked, 2)
-                
-                try:
-                    db.commit()
-                    print(f"✓ {employee_name} checked out at {current_time.strftime('%H:%M:%S')} - Hours: {record.hours_worked}")
-                    return True
-                except Exception as e:
-                    print(f"Error committing check-out for {employee_name}: {e}")
-                    db.rollback()
-                    return False
-            
-            else:
-                if action == "checkin":
-                    print(f"Check-in ignored - {employee_name} already has arrival time: {record.arrival_time}")
-                elif action == "checkout":
-                    if not record.arrival_time:
-                        print(f"Check-out ignored - {employee_name} hasn't checked in yet")
-                    elif record.departure_time:
-                        print(f"Check-out ignored - {employee_name} already checked out at: {record.departure_time}")
-                
-                return False
-                    
-        except Exception as e:
-            print(f"Error updating attendance for {employee_name}: {e}")
-            db.rollback()
-            import traceback
-            traceback.print_exc()
-            return False
-        finally:
-            db.close()
-
-    def enhance_low_light(self, frame):
-        """Enhance frame for low-light conditions"""
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-        cl = clahe.apply(l)
-        enhanced_lab = cv2.merge((cl,a,b))
-        enhanced_bgr = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
-        return enhanced_bgr
+    def get_blink_counts(self) -> dict:
+        """Blinks counted so far per person"""
+        return {name: counter.blinks for name, counter in self.blink_counters.items()}
     
     def draw_detection_info(self, frame, face_locations, face_names, confidences, blink_counts):
         """Draw detection information on frame"""
@@ -502,109 +454,150 @@ class RecognitionService:
             self.video_capture.set(cv2.CAP_PROP_FPS, 30)
             self.video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             
+            self.dispatcher = AttendanceDispatcher(self.handle_attendance_event, metrics=self.metrics)
+            self.dispatcher.start()
+            
             print("Recognition started - Backend handling camera")
             frame_count = 0
             
             while not self.stop_event.is_set():
+                read_started = time.perf_counter()
                 ret, frame = self.video_capture.read()
+                self.metrics.observe("capture", time.perf_counter() - read_started)
                 if not ret:
                     print("Error reading frame")
                     continue
                 
                 frame_count += 1
+                self.metrics.inc("frames_captured")
                 process_frame = frame_count % 2 == 0
                 
                 if process_frame:
-                    # Your existing face recognition logic here
-                    enhanced_frame = self.enhance_low_light(frame)
-                    small_frame = cv2.resize(enhanced_frame, (0,0), fx=0.25, fy=0.25)
-                    rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+                    frame_started = time.perf_counter()
+                    # Downscale the detection area first, then enhance it only if the scene is dark;
+                    # boxes are mapped back to the whole frame
+                    with self.metrics.time("preprocess"):
+                        x0, y0, x1, y1 = roi_bounds(self.detection_roi, frame.shape)
+                        small_frame = self.enhancer.apply(cv2.resize(frame[y0:y1, x0:x1], (0,0), fx=0.25, fy=0.25))
+                        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+                        # Landmarks and encodings use the unenhanced frame, like the enrollment photos
+                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                     
-                    # Find faces and process recognition
-                    face_locations = face_recognition.face_locations(rgb_small_frame)
-                    face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+                    # Find faces and process recognition; distant passers-by are never encoded
+                    with self.metrics.time("detect"):
+                        face_locations = offset_boxes(self.face_detector.detect(rgb_small_frame), x0 // 4, y0 // 4)
+                    face_locations = filter_small_boxes(face_locations, self.min_face_size, scale=4)
+                    self.metrics.inc("faces_detected", len(face_locations))
+                    
+                    # One landmark pass per face at full resolution, shared by the encoder and blink detection
+                    with self.metrics.time("landmarks"):
+                        landmarks = self.face_landmarks(rgb_frame, face_locations)
+                    face_encodings = self.encode_faces(rgb_frame, landmarks)
+                    self.metrics.inc("faces_encoded", len(face_encodings))
+                    
+                    # Eye aspect ratio of every face in one vectorized pass
+                    with self.metrics.time("liveness"):
+                        ears = eye_aspect_ratios(shapes_to_array(landmarks)).mean(axis=1) if landmarks else []
                     
                     # ... your face recognition logic ...
                     face_names = []
                     confidences = []
                     blink_counts = []
                     
-                    # Process detected faces
-                    for face_encoding in face_encodings:
-                        # Compare with known faces
-                        matches = face_recognition.compare_faces(
-                            self.known_face_encodings, face_encoding, tolerance=0.6
-                        )
-                        face_distances = face_recognition.face_distance(
-                            self.known_face_encodings, face_encoding
-                        )
-                        
+                    # Match all detected faces against the gallery in one pass
+                    with self.metrics.time("match"):
+                        matches = self.gallery.match(face_encodings)
+                    for match, ear in zip(matches, ears):
                         name = "Unknown"
                         confidence = 0
                         blink_count = 0
                         
-                        if len(face_distances) > 0:
-                            best_match_index = np.argmin(face_distances)
-                            if matches[best_match_index]:
-                                name = self.known_face_names[best_match_index]
-                                confidence = 1 - face_distances[best_match_index]
-                                blink_count = self.person_blink_count.get(name, 0)
+                        if match.index >= 0:
+                            if match.distance <= 0.6:
+                                name = self.gallery.names[match.index]
+                                confidence = 1 - match.distance
+                                blink_count = self.blink_counters[name].blinks if name in self.blink_counters else 0
                                 
                                 # Process recognized face with good confidence
                                 if confidence > 0.4:
-                                    # Detect blinks for liveness
-                                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                                    rects = self.detector(gray, 0)
-                                    
-                                    for rect in rects:
-                                        shape = self.predictor(gray, rect)
-                                        shape = np.array([[p.x, p.y] for p in shape.parts()])
-                                        
-                                        # Check if person has blinked enough
-                                        if self.detect_blink(shape, name):
-                                            # Use thread-safe database access
-                                            employee_id = self.attendance_employee_ids.get(name)
-                                            if employee_id:
-                                                # Check current status to decide action
-                                                db = self.get_db_session()
-                                                try:
-                                                    current_date = datetime.now(KIGALI_TZ).date()
-                                                    record = db.query(AttendanceRecord).filter(
-                                                        AttendanceRecord.employee_id == employee_id,
-                                                        AttendanceRecord.date >= current_date,
-                                                        AttendanceRecord.date < current_date + timedelta(days=1)
-                                                    ).first()
-                                                    
-                                                    if record:
-                                                        if not record.arrival_time:
-                                                            self.update_attendance_record(name, "checkin")
-                                                        elif not record.departure_time:
-                                                            self.update_attendance_record(name, "checkout")
-                                                finally:
-                                                    db.close()
+                                    # Check if person has blinked enough
+                                    if self.detect_blink(name, float(ear)):
+                                        # Hand over to the dispatcher thread; faces already queued are ignored
+                                        employee_id = self.attendance_employee_ids.get(name)
+                                        if employee_id and self.dispatcher.publish(AttendanceEvent(name, employee_id)):
+                                            self.metrics.inc("faces_verified")
                         
+                        if name == "Unknown":
+                            self.metrics.inc("faces_unknown")
                         face_names.append(name)
                         confidences.append(confidence)
                         blink_counts.append(blink_count)
 
                     # Draw detection info on frame
-                    display_frame = self.draw_detection_info(
-                        frame.copy(), face_locations, face_names, confidences, blink_counts
-                    )
+                    with self.metrics.time("draw"):
+                        display_frame = self.draw_detection_info(
+                            frame.copy(), face_locations, face_names, confidences, blink_counts
+                        )
                     
                     # Save frame for streaming (thread-safe)
                     with self.frame_lock:
                         self.latest_frame = display_frame.copy()
+                    
+                    self.metrics.observe("frame", time.perf_counter() - frame_started)
+                    self.metrics.inc("frames_processed")
                 
                 time.sleep(0.03)
                 
         except Exception as e:
             print(f"Error in recognition loop: {e}")
         finally:
+            if self.dispatcher:
+                self.dispatcher.stop()
             if self.video_capture:
                 self.video_capture.release()
             print("Recognition loop stopped")
     
+    def handle_attendance_event(self, event: AttendanceEvent) -> bool:
+        """Check in or out a face that passed the blink check - runs on the dispatcher thread.
+        
+        The check-in/check-out decision is made by apply_attendance_event in
+        one row-locked transaction, shared with the /attendance/events endpoint
+        the recognition clients use.
+        """
+        db = self.get_db_session()
+        try:
+            result = apply_attendance_event(db, self.company, event.employee_id, self.get_current_time(),
+                                            self.camera_type, checkout_delay_minutes=self.CHECKOUT_DELAY_MINUTES)
+        except Exception as e:
+            print(f"Error updating attendance for {event.name}: {e}")
+            self.metrics.inc("attendance_failures")
+            db.rollback()
+            return False
+        finally:
+            db.close()
+        
+        if result is None:
+            print(f"No employee found for {event.name}")
+            return False
+        
+        action = result["action"]
+        self.last_detection_time[event.name] = self.get_current_time()
+        if action == "checkin":
+            self.metrics.inc("attendance_checkins")
+            print(f"✓ {event.name} checked in at {result['record']['arrival_time'].strftime('%H:%M:%S')}")
+        elif action == "checkout":
+            self.metrics.inc("attendance_checkouts")
+            print(f"✓ {event.name} checked out at {result['record']['departure_time'].strftime('%H:%M:%S')} - Hours: {result['record']['hours_worked']}")
+        elif action == "too_soon":
+            print(f"Too soon for checkout of {event.name}")
+        else:
+            print(f"Attendance of {event.name} already complete for today")
+        
+        if result["recorded"] and event.name in self.blink_counters:
+            # Liveness starts over for the next check-in or check-out
+            self.blink_counters[event.name].reset()
+        return result["recorded"]
+    
     def get_latest_frame(self):
         """Get the latest processed frame for streaming"""
         with self.frame_lock:
@@ -675,7 +668,11 @@ class RecognitionService:
             "company": self.company,
             "employees_loaded": len(self.known_face_names),
             "camera_source": self.camera_source,
-            "camera_type": self.camera_type
+            "camera_type": self.camera_type,
+            "face_detector": self.face_detector.describe(),
+            "attendance_dispatcher": self.dispatcher.get_stats() if self.dispatcher else None,
+            "shared_gallery_generation": self.gallery_publisher.generation if self.gallery_publisher else None,
+            "metrics": self.metrics.snapshot()
         }
 
 # Global instance
@@ -0,0 +1,62 @@
+# app/services/roi.py - copy of fras_local/roi.py; edit that file and run fras_local/sync_backend.py
+from typing import List, Optional, Sequence, Tuple
+
+# (x, y, width, height) as fractions of the frame, so one ROI fits every capture resolution
+Roi = Tuple[float, float, float, float]
+
+# (top, right, bottom, left) as returned by face_recognition.face_locations
+Box = Tuple[int, int, int, int]
+
+
+def parse_roi(value) -> Optional[Roi]:
+    """Parse an ROI stored as "x,y,width,height" fractions of the frame; empty means the whole frame"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+
+    parts = value.split(",") if isinstance(value, str) else list(value)
+    if len(parts) != 4:
+        raise ValueError(f"ROI must be 'x,y,width,height', got {value!r}")
+
+    x, y, width, height = (float(part) for part in parts)
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < width and 0 < height
+            and x + width <= 1 + 1e-6 and y + height <= 1 + 1e-6):
+        raise ValueError(f"ROI must be fractions of the frame inside 0..1, got {value!r}")
+
+    if (x, y, width, height) == (0, 0, 1, 1):
+        return None
+    return x, y, width, height
+
+
+def format_roi(roi: Optional[Roi]) -> Optional[str]:
+    return ",".join(f"{v:.4f}" for v in roi) if roi else None
+
+
+def roi_bounds(roi: Optional[Roi], frame_shape: Sequence[int], align: int = 4) -> Tuple[int, int, int, int]:
+    """Pixel bounds (x0, y0, x1, y1) of the ROI on a frame.
+
+    The origin is rounded down to a multiple of ``align`` (the detection
+    downscale factor) so boxes found on the downscaled crop map back to the
+    downscaled full frame exactly.
+    """
+    height, width = frame_shape[:2]
+    if roi is None:
+        return 0, 0, width, height
+
+    x0 = int(roi[0] * width) // align * align
+    y0 = int(roi[1] * height) // align * align
+    x1 = min(width, max(x0 + align, int(round((roi[0] + roi[2]) * width))))
+    y1 = min(height, max(y0 + align, int(round((roi[1] + roi[3]) * height))))
+    return x0, y0, x1, y1
+
+
+def offset_boxes(boxes: Sequence[Box], dx: int, dy: int) -> List[Box]:
+    """Move boxes found on a crop back into the coordinates of the whole frame"""
+    return [(top + dy, right + dx, bottom + dy, left + dx) for top, right, bottom, left in boxes]
+
+
+def filter_small_boxes(boxes: Sequence[Box], min_size: int, scale: int = 1) -> List[Box]:
+    """Drop faces whose smaller side is under ``min_size`` pixels at full resolution (boxes are 1/scale size)"""
+    if not min_size:
+        return list(boxes)
+    return [box for box in boxes
+            if min(box[2] - box[0], box[1] - box[3]) * scale >= min_size]
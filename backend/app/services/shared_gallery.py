@@ -0,0 +1,259 @@
+# app/services/shared_gallery.py - copy of fras_local/shared_gallery.py; edit that file and run fras_local/sync_backend.py
+import glob
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.services.face_gallery import FaceGallery
+from app.services.face_index import ENCODING_DIM, ExactIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FRASGAL1"
+# Generation file header: magic, generation, rows, names length (int64 each), padded so the matrix is 64-byte aligned
+HEADER_BYTES = 64
+CONTROL_FILE = "generation"
+
+
+def _layout(rows: int):
+    """Byte offsets of the vectors, squared norms, ids and names in a generation file"""
+    vectors = HEADER_BYTES
+    sq_norms = vectors + rows * ENCODING_DIM * 4
+    ids = sq_norms + rows * 4
+    ids += -ids % 8
+    names = ids + rows * 8
+    return vectors, sq_norms, ids, names
+
+
+def _generation_path(directory: str, generation: int) -> str:
+    return os.path.join(directory, f"gallery-{generation}.bin")
+
+
+class SharedGalleryPublisher:
+    """Publishes the gallery once as memory-mapped files for recognition worker processes.
+
+    Every publish writes a new read-only file ``gallery-<generation>.bin``
+    holding the (N, 128) float32 matrix, its squared norms, the row ids and the
+    names, and then bumps the counter in the small memory-mapped
+    ``generation`` file. Workers that see a new generation map the new file,
+    so an updated gallery is swapped in without restarting them. The OS page
+    cache backs every mapping of a file, so the gallery is in memory once no
+    matter how many workers attach; on Linux a directory under /dev/shm keeps
+    it off the disk entirely.
+    """
+
+    def __init__(self, directory: str, keep: int = 2):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self.files = deque()
+        os.makedirs(directory, exist_ok=True)
+
+        control_path = os.path.join(directory, CONTROL_FILE)
+        if not os.path.exists(control_path) or os.path.getsize(control_path) != 8:
+            with open(control_path, "wb") as f:
+                f.write(np.zeros(1, dtype=np.int64).tobytes())
+        # Keep counting from a previous publisher so workers never see a generation go backwards
+        self.counter = np.memmap(control_path, dtype=np.int64, mode="r+", shape=(1,))
+        self.generation = int(self.counter[0])
+
+    def publish(self, encodings, names: Sequence[Optional[str]], ids=None) -> int:
+        """Write a new gallery generation; returns its number.
+
+        ``ids`` are the gallery indexes (into ``names``) of the encodings,
+        0..N-1 by default.
+        """
+        matrix = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM))
+        if ids is None:
+            if len(matrix) != len(names):
+                raise ValueError(f"Got {len(matrix)} encodings but {len(names)} names")
+            ids = np.arange(len(matrix), dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if len(ids) != len(matrix):
+            raise ValueError(f"Got {len(matrix)} encodings but {len(ids)} ids")
+
+        rows = len(matrix)
+        names_blob = json.dumps(list(names)).encode("utf-8")
+        vectors_at, sq_norms_at, ids_at, names_at = _layout(rows)
+        generation = self.generation + 1
+        path = _generation_path(self.directory, generation)
+
+        header = np.zeros(HEADER_BYTES, dtype=np.uint8)
+        header[:8] = np.frombuffer(MAGIC, dtype=np.uint8)
+        header[8:32] = np.array([generation, rows, len(names_blob)], dtype=np.int64).view(np.uint8)
+        padding = ids_at - (sq_norms_at + rows * 4)
+
+        # Written under a temporary name, so a worker only ever maps a complete file
+        with open(path + ".tmp", "wb") as f:
+            f.write(header.tobytes())
+            f.write(matrix.tobytes())
+            f.write(np.einsum("ij,ij->i", matrix, matrix).astype(np.float32).tobytes())
+            f.write(b"\0" * padding)
+            f.write(ids.tobytes())
+            f.write(names_blob)
+        os.replace(path + ".tmp", path)
+
+        # One aligned 8-byte store publishes the new generation
+        self.counter[0] = generation
+        self.counter.flush()
+        self.generation = generation
+
+        self.files.append(path)
+        while len(self.files) > self.keep:
+            self._remove(self.files.popleft())
+
+        logger.info(f"Published gallery generation {generation}: {rows} faces, "
+                    f"{(names_at + len(names_blob)) / 1024:.0f} KB")
+        return generation
+
+    def publish_gallery(self, gallery: FaceGallery) -> int:
+        """Publish the encodings of a FaceGallery under their gallery indexes (removed faces are left out)"""
+        index = gallery.index
+        if not index.keep_vectors:
+            raise ValueError(f"A {index.kind} index does not keep its encodings")
+        return self.publish(index.vectors, gallery.names, ids=index.ids)
+
+    def _remove(self, path: str):
+        """Delete an old generation; workers that still map it keep their pages until they move on"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows refuses to delete a mapped file - it is cleaned up on the next close()
+            logger.debug(f"Could not remove {path}: {e}")
+
+    def close(self):
+        """Remove old generation files; the newest stays so workers can still attach"""
+        current = _generation_path(self.directory, self.generation)
+        for path in glob.glob(os.path.join(self.directory, "gallery-*.bin*")):
+            if path != current:
+                self._remove(path)
+        self.files.clear()
+        del self.counter
+
+
+class SharedGalleryReader:
+    """Zero-copy view of a published gallery inside a worker process.
+
+    ``refresh()`` is cheap (one 8-byte read from the mapped generation file)
+    and is meant to be called before each batch of matches; it maps the new
+    file when the generation changed. The matrix, norms and ids are read-only
+    views on the mapping, so matching uses the exact index without copying
+    the gallery. A mapping is released with the last gallery that uses it, so
+    matches that are still running finish on the old generation.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.counter = np.memmap(os.path.join(directory, CONTROL_FILE), dtype=np.int64, mode="r", shape=(1,))
+        self.generation = 0
+        self.gallery = FaceGallery()
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Map the newest generation if it changed; returns whether the gallery was swapped"""
+        generation = int(self.counter[0])
+        if generation == self.generation or generation == 0:
+            return False
+
+        try:
+            raw = np.memmap(_generation_path(self.directory, generation), dtype=np.uint8, mode="r")
+        except FileNotFoundError:
+            return False  # already replaced by a newer one; the next refresh picks that up
+
+        header = raw[8:32].view(np.int64)
+        if raw[:8].tobytes() != MAGIC or int(header[0]) != generation:
+            raise ValueError(f"{_generation_path(self.directory, generation)} is not gallery generation {generation}")
+
+        rows, names_length = int(header[1]), int(header[2])
+        vectors_at, sq_norms_at, ids_at, names_at = _layout(rows)
+
+        index = ExactIndex()
+        index.vectors = raw[vectors_at:sq_norms_at].view(np.float32).reshape(rows, ENCODING_DIM)
+        index.sq_norms = raw[sq_norms_at:sq_norms_at + rows * 4].view(np.float32)
+        index.ids = raw[ids_at:names_at].view(np.int64)
+
+        gallery = FaceGallery()
+        gallery.index = index
+        gallery.names = json.loads(raw[names_at:names_at + names_length].tobytes().decode("utf-8"))
+
+        # Swap in one assignment; matches already running finish on the old gallery
+        self.gallery, self.generation = gallery, generation
+        return True
+
+
+def _worker(directory: str, probes: np.ndarray, seconds: float, results):
+    """Benchmark worker: attach, then match continuously while following gallery updates"""
+    attach_started = time.perf_counter()
+    reader = SharedGalleryReader(directory)
+    attach_ms = (time.perf_counter() - attach_started) * 1000
+
+    matches, swaps = 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        swaps += int(reader.refresh())
+        reader.gallery.match(probes)
+        matches += 1
+    results.put((attach_ms, matches, swaps, reader.generation, len(reader.gallery)))
+
+
+def benchmark(directory: str, size: int = 10000, workers: int = 4, seconds: float = 3.0, updates: int = 3):
+    """Workers attach to one published gallery and keep matching while it is republished"""
+    import multiprocessing
+
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0, 0.1, (size, ENCODING_DIM)).astype(np.float32)
+    names = [str(i) for i in range(size)]
+    probes = encodings[:3] + rng.normal(0, 0.02, (3, ENCODING_DIM)).astype(np.float32)
+
+    publisher = SharedGalleryPublisher(directory)
+    try:
+        publisher.publish(encodings, names)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_worker, args=(directory, probes, seconds, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+
+        # Enroll a few more faces while the workers run
+        for update in range(updates):
+            time.sleep(seconds / (updates + 1))
+            extra = rng.normal(0, 0.1, (update + 1, ENCODING_DIM)).astype(np.float32)
+            encodings = np.concatenate((encodings, extra))
+            names = names + [f"new{update}-{i}" for i in range(len(extra))]
+            publisher.publish(encodings, names)
+
+        print(f"gallery: {size} faces, {encodings.nbytes / 1024:.0f} KB mapped once "
+              f"(a private copy per worker would be {workers * encodings.nbytes / 1024:.0f} KB)")
+        print(f"{'worker':>7} {'attach ms':>10} {'matches':>8} {'swaps':>6} {'generation':>11} {'faces':>7}")
+        for worker in range(workers):
+            attach_ms, matches, swaps, generation, faces = results.get()
+            print(f"{worker:>7} {attach_ms:>10.2f} {matches:>8} {swaps:>6} {generation:>11} {faces:>7}")
+        for process in processes:
+            process.join()
+    finally:
+        publisher.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Shared gallery benchmark")
+    parser.add_argument("--dir", default=None, help="Gallery directory (default: a temporary one)")
+    parser.add_argument("--size", type=int, default=10000, help="Gallery size")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--updates", type=int, default=3, help="Gallery republishes while the workers run")
+    args = parser.parse_args()
+
+    if args.dir:
+        benchmark(args.dir, args.size, args.workers, args.seconds, args.updates)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark(directory, args.size, args.workers, args.seconds, args.updates)
@@ -0,0 +1,160 @@
+# attendance_dispatcher.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceEvent:
+    """A recognized face that passed the liveness check and may need its attendance recorded"""
+
+    def __init__(self, name: str, employee_id: Optional[int] = None, camera=None, track=None):
+        self.name = name
+        self.employee_id = employee_id
+        self.camera = camera    # where the face was seen (CameraStream or camera type)
+        self.track = track      # face track whose liveness state is reset once attendance is recorded
+        self.published_at = time.perf_counter()
+
+
+class AttendanceDispatcher:
+    """Background thread that owns all attendance I/O, so recognition threads never wait on the server.
+
+    Recognition publishes events and moves on. Events are handled one at a
+    time, in order, by ``handler(event)``, which returns True when attendance
+    was recorded. Only one event per employee waits at a time - a face seen
+    again while its event is still queued adds nothing. When the queue runs
+    empty ``idle(force)`` is called, with force=True right after something was
+    recorded (used to refresh the attendance overview).
+    """
+
+    def __init__(self, handler: Callable[[AttendanceEvent], bool], idle: Optional[Callable[[bool], None]] = None,
+                 metrics=None, name: str = "attendance", poll_seconds: float = 0.5, max_pending: int = 1000):
+        self.handler = handler
+        self.idle = idle
+        self.metrics = metrics
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        self.events: "OrderedDict[str, AttendanceEvent]" = OrderedDict()
+        self.in_flight: Optional[str] = None
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        self.published = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.handled = 0
+        self.recorded = 0
+        self.failed = 0
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"{self.name}-dispatcher")
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop after the event being handled; events still queued are discarded"""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        self.thread = None
+        with self.condition:
+            if self.events:
+                logger.warning(f"{len(self.events)} attendance event(s) discarded at shutdown")
+                self.dropped += len(self.events)
+                self.events.clear()
+
+    def publish(self, event: AttendanceEvent) -> bool:
+        """Queue an event without blocking; False when the employee already has one waiting or the queue is full"""
+        with self.condition:
+            if event.name in self.events or event.name == self.in_flight:
+                self.duplicates += 1
+                return False
+            if len(self.events) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.events[event.name] = event
+            self.published += 1
+            self.condition.notify()
+            return True
+
+    def pending(self) -> int:
+        with self.condition:
+            return len(self.events) + (self.in_flight is not None)
+
+    def drain(self, timeout: float) -> bool:
+        """Wait until every queued event was handled; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.events or self.in_flight is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not (self.thread and self.thread.is_alive()):
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def _run(self):
+        recorded = False
+        while not self.stop_event.is_set():
+            with self.condition:
+                if not self.events and not recorded:
+                    self.condition.wait(self.poll_seconds)
+                if self.stop_event.is_set():
+                    break
+                event = None
+                if self.events:
+                    _, event = self.events.popitem(last=False)
+                    self.in_flight = event.name
+
+            if event is None:
+                if self.idle:
+                    self._call(self.idle, recorded)
+                recorded = False
+                continue
+
+            started = time.perf_counter()
+            if self.metrics:
+                self.metrics.observe("attendance_wait", started - event.published_at)
+            try:
+                result = self.handler(event)
+                recorded = recorded or bool(result)
+            except Exception as e:
+                result = None
+                logger.error(f"Error handling attendance event for {event.name}: {e}")
+            finally:
+                if self.metrics:
+                    self.metrics.observe("attendance", time.perf_counter() - started)
+                with self.condition:
+                    self.in_flight = None
+                    self.handled += 1
+                    self.recorded += int(bool(result))
+                    self.failed += int(result is None)
+                    self.condition.notify_all()
+
+    def _call(self, func: Callable, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            logger.error(f"Error in {self.name} dispatcher: {e}")
+            return None
+
+    def get_stats(self) -> Dict:
+        with self.condition:
+            return {
+                "running": bool(self.thread and self.thread.is_alive()),
+                "pending": len(self.events) + (self.in_flight is not None),
+                "published": self.published,
+                "duplicates": self.duplicates,
+                "dropped": self.dropped,
+                "handled": self.handled,
+                "recorded": self.recorded,
+                "failed": self.failed
+            }
@@ -0,0 +1,310 @@
+# attendance_outbox.py
+"""Durable local queue of attendance events, sent to the server in the background.
+
+Every attendance event (a face that passed the liveness check; the server
+decides between check-in and check-out) is written to a SQLite database (WAL
+journal) with a client-generated idempotency key before anything goes over the
+network, so an unreachable or slow server never loses an event and never
+slows recognition down. The replayer thread sends pending events oldest
+first; the server stores each key once, so an event that is sent again after
+a lost response is not recorded twice.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Server answers that will not change on a retry; anything else (no answer, 408, 429, 5xx) is retried
+PERMANENT_STATUS_CODES = {400, 401, 403, 404, 409, 422}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    company TEXT,
+    employee_name TEXT,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    sent_at REAL
+)
+"""
+
+
+def move_outbox(old_path: str, new_path: str) -> bool:
+    """Move an outbox database (with its WAL files) left at an earlier default location; returns whether it moved"""
+    if os.path.abspath(old_path) == os.path.abspath(new_path) or not os.path.exists(old_path) or os.path.exists(new_path):
+        return False
+    directory = os.path.dirname(new_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(old_path + suffix):
+            os.replace(old_path + suffix, new_path + suffix)
+    logger.info(f"Attendance outbox moved from {old_path} to {new_path}")
+    return True
+
+
+class OutboxEvent:
+    __slots__ = ("id", "key", "employee_name", "payload", "attempts")
+
+    def __init__(self, row):
+        self.id, self.key, self.employee_name, payload, self.attempts = row
+        self.payload = json.loads(payload)
+
+
+class AttendanceOutbox:
+    """SQLite outbox of attendance events; safe to use from several threads"""
+
+    def __init__(self, path: str, keep_sent_seconds: float = 7 * 24 * 3600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.keep_sent_seconds = keep_sent_seconds
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL: a write is one append to the log, and readers never block the writer
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS events_state ON events (state, id)")
+
+    def add(self, payload: Dict, company: Optional[str] = None, employee_name: Optional[str] = None) -> str:
+        """Persist an event; returns its idempotency key (also set in the payload)"""
+        key = payload.get("idempotency_key") or uuid.uuid4().hex
+        payload = dict(payload, idempotency_key=key)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO events (idempotency_key, company, employee_name, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, company, employee_name, json.dumps(payload), time.time())
+            )
+        return key
+
+    def pending(self, company: Optional[str] = None, limit: int = 50) -> List[OutboxEvent]:
+        """Oldest pending events (of one company, when given)"""
+        query = "SELECT id, idempotency_key, employee_name, payload, attempts FROM events WHERE state = 'pending'"
+        args: list = []
+        if company is not None:
+            query += " AND company = ?"
+            args.append(company)
+        query += " ORDER BY id LIMIT ?"
+        args.append(limit)
+        with self.lock:
+            return [OutboxEvent(row) for row in self.connection.execute(query, args).fetchall()]
+
+    def mark_sent(self, event_ids: List[int]):
+        if not event_ids:
+            return
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "UPDATE events SET state = 'sent', sent_at = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+                [(now, event_id) for event_id in event_ids]
+            )
+
+    def mark_failed(self, event_id: int, error: str, permanent: bool = False):
+        """Record a failed attempt; a permanent failure stops retries (the row stays for inspection)"""
+        with self.lock:
+            self.connection.execute(
+                "UPDATE events SET attempts = attempts + 1, last_error = ?, state = ? WHERE id = ?",
+                (error[:500], "rejected" if permanent else "pending", event_id)
+            )
+
+    def prune(self):
+        """Forget events sent longer ago than keep_sent_seconds"""
+        with self.lock:
+            self.connection.execute("DELETE FROM events WHERE state = 'sent' AND sent_at < ?",
+                                    (time.time() - self.keep_sent_seconds,))
+
+    def counts(self, company: Optional[str] = None) -> Dict[str, int]:
+        query, args = "SELECT state, COUNT(*) FROM events", ()
+        if company is not None:
+            query, args = query + " WHERE company = ?", (company,)
+        with self.lock:
+            rows = self.connection.execute(query + " GROUP BY state", args).fetchall()
+        counts = {"pending": 0, "sent": 0, "rejected": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class OutboxReplayer:
+    """Background thread that sends pending outbox events in batches, backing off exponentially while failing.
+
+    ``send(payload)`` returns ``(record, None)`` on success or ``(None,
+    (status_code, message))`` on failure, where status_code is None when the
+    server could not be reached. With ``send_batch(payloads)``, which returns
+    ``(outcomes, None)`` with one such pair per payload or ``(None, (status_code,
+    message))``, several pending events go out in one request; events queued
+    within ``coalesce_seconds`` of each other are sent together.
+    ``on_sent(event, record)`` is called for every event the server accepted.
+    """
+
+    def __init__(self, outbox: AttendanceOutbox, send: Callable, on_sent: Optional[Callable] = None,
+                 company: Optional[str] = None, batch_size: int = 50, base_backoff: float = 1.0,
+                 max_backoff: float = 300.0, idle_seconds: float = 30.0, send_batch: Optional[Callable] = None,
+                 coalesce_seconds: float = 0.0):
+        self.outbox = outbox
+        self.send = send
+        self.send_batch = send_batch
+        self.on_sent = on_sent
+        self.company = company
+        self.batch_size = batch_size
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_seconds = idle_seconds
+        self.coalesce_seconds = coalesce_seconds
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        self.failures = 0           # consecutive failed passes
+        self.retry_at = 0.0         # monotonic time of the next attempt while backing off
+        self.sent = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.outbox.prune()
+        self.wake_event.set()  # events left from an earlier run go out right away
+        self.thread = threading.Thread(target=self._run, daemon=True, name="attendance-outbox")
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+        self.thread = None
+
+    def wake(self):
+        """New event in the outbox - send it now unless backing off"""
+        self.wake_event.set()
+
+    def backoff_seconds(self) -> float:
+        """Exponential in the number of consecutive failures, with jitter so clients do not retry in step"""
+        delay = min(self.max_backoff, self.base_backoff * 2 ** max(0, self.failures - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            delay = self.retry_at - time.monotonic() if self.failures else self.idle_seconds
+            if delay > 0:
+                self.wake_event.wait(delay)
+            self.wake_event.clear()
+            if self.stop_event.is_set():
+                break
+            if self.failures and time.monotonic() < self.retry_at:
+                continue  # woken by a new event while backing off
+            if self.send_batch and self.coalesce_seconds > 0:
+                # Let the events of a burst (a queue of people at the door) gather into one request
+                self.stop_event.wait(self.coalesce_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error sending attendance outbox: {e}")
+
+    def flush(self) -> int:
+        """Send pending events until the outbox is empty or the server fails; returns how many were accepted"""
+        accepted = 0
+        while not self.stop_event.is_set():
+            events = self.outbox.pending(self.company, self.batch_size)
+            if not events:
+                if self.failures:
+                    logger.info(f"Attendance outbox caught up after {self.failures} failed attempt(s)")
+                self.failures = 0
+                return accepted
+
+            outcomes = None
+            if self.send_batch and len(events) > 1:
+                outcomes, error = self.send_batch([event.payload for event in events])
+                if error is not None:
+                    status_code, message = error
+                    if status_code not in PERMANENT_STATUS_CODES:
+                        self._back_off(events[0], message)
+                        return accepted
+                    # The batch as a whole was refused; a server without the batch endpoint gets single events from now on
+                    logger.warning(f"Attendance batch refused ({status_code}: {message}); sending events one by one")
+                    if status_code == 404:
+                        self.send_batch = None
+                    outcomes = None
+                else:
+                    self.batches += 1
+
+            sent_ids = []
+            retry = None
+            for i, event in enumerate(events):
+                record, error = outcomes[i] if outcomes else self.send(event.payload)
+                if error is None:
+                    sent_ids.append(event.id)
+                    if self.on_sent:
+                        self.on_sent(event, record)
+                    continue
+
+                status_code, message = error
+                if status_code in PERMANENT_STATUS_CODES:
+                    # The server will never accept this event; keep it out of the way of the rest
+                    logger.error(f"Attendance event for {event.employee_name} rejected by the server: {message}")
+                    self.outbox.mark_failed(event.id, f"{status_code}: {message}", permanent=True)
+                    self.rejected += 1
+                    continue
+
+                if outcomes:
+                    # The rest of the batch was applied already; only this event is tried again
+                    self.outbox.mark_failed(event.id, message)
+                    retry = retry or (event, message)
+                    continue
+                # Server unreachable or overloaded: keep the order, back off and try again later
+                retry = (event, message)
+                break
+
+            self.outbox.mark_sent(sent_ids)
+            self.sent += len(sent_ids)
+            accepted += len(sent_ids)
+            if retry:
+                event, message = retry
+                self._back_off(event, message, counted=bool(outcomes))
+                return accepted
+        return accepted
+
+    def _back_off(self, event: OutboxEvent, message: str, counted: bool = False):
+        """The server failed an event - wait before the next pass"""
+        if not counted:
+            self.outbox.mark_failed(event.id, message)
+        self.failures += 1
+        self.last_error = message
+        delay = self.backoff_seconds()
+        self.retry_at = time.monotonic() + delay
+        logger.warning(f"Attendance outbox: {message}; {self.outbox.counts(self.company)['pending']} event(s) waiting, "
+                       f"retrying in {delay:.0f}s")
+
+    def get_stats(self) -> Dict:
+        stats = self.outbox.counts(self.company)
+        stats.update({
+            "running": bool(self.thread and self.thread.is_alive()),
+            "sent_this_run": self.sent,
+            "rejected_this_run": self.rejected,
+            "batches_this_run": self.batches,
+            "consecutive_failures": self.failures,
+            "retry_in_seconds": round(max(0.0, self.retry_at - time.monotonic()), 1) if self.failures else None,
+            "last_error": self.last_error
+        })
+        return stats
@@ -0,0 +1,88 @@
+# attendance_state.py
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+
+class AttendanceState:
+    """Today's latest attendance record per employee name, kept locally instead of re-downloading the day.
+
+    Filled by one full load, then kept current from the records the server
+    returns for our own events and from occasional delta syncs of the records
+    created or changed since ``cursor`` (an opaque server timestamp) - which
+    includes check-ins and check-outs of other cameras, which update the
+    day's existing record, and edits made in the dashboard.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records: Dict[str, Dict] = {}
+        self.cursor: Optional[str] = None
+        self.day: Optional[date] = None
+        self.loaded_at = 0.0    # monotonic time of the last full load, 0 before the first
+        self.synced_at = 0.0    # monotonic time of the last full or delta sync
+        self.full_loads = 0
+        self.delta_syncs = 0
+
+    def load(self, records: Iterable[Dict], day: date, cursor: Optional[str] = None):
+        """Replace the table with a full download of the day"""
+        latest: Dict[str, Dict] = {}
+        for record in records:
+            name = record.get("name")
+            record_id = record.get("id") or 0
+            if name and record_id >= (latest.get(name, {}).get("id") or 0):
+                latest[name] = record
+        now = time.monotonic()
+        with self.lock:
+            self.records = latest
+            self.cursor = cursor
+            self.day = day
+            self.loaded_at = self.synced_at = now
+            self.full_loads += 1
+
+    def apply(self, records: Iterable[Dict], synced: bool = False, cursor: Optional[str] = None) -> int:
+        """Merge newer records (a delta sync, or the server's answer to a write); returns how many changed the table"""
+        changed = 0
+        with self.lock:
+            for record in records:
+                name = record.get("name")
+                record_id = record.get("id") or 0
+                current = self.records.get(name) or {}
+                if current.get("pending") and not record.get("arrival_time"):
+                    continue  # our check-in has not reached the server yet
+                if name and record_id >= (current.get("id") or 0):
+                    self.records[name] = record
+                    changed += 1
+            if cursor:
+                self.cursor = cursor
+            if synced:
+                self.synced_at = time.monotonic()
+                self.delta_syncs += 1
+        return changed
+
+    def set_local(self, name: str, record: Dict):
+        """One of our events the server has not stored yet; used until a record of the employee with an id arrives"""
+        with self.lock:
+            current_id = (self.records.get(name) or {}).get("id") or 0
+            self.records[name] = dict(record, name=name, id=current_id, pending=True)
+    
+    def get(self, name: str) -> Optional[Dict]:
+        """Latest record of an employee today, or None"""
+        return self.records.get(name)
+
+    def needs_full_load(self, today: date, max_age: float) -> bool:
+        """Never loaded, a new day, or the last full load is older than ``max_age`` seconds"""
+        return self.day != today or time.monotonic() - self.loaded_at >= max_age
+
+    def get_stats(self) -> Dict:
+        now = time.monotonic()
+        with self.lock:
+            return {
+                "employees": len(self.records),
+                "cursor": self.cursor,
+                "day": self.day.isoformat() if self.day else None,
+                "full_loads": self.full_loads,
+                "delta_syncs": self.delta_syncs,
+                "synced_seconds_ago": round(now - self.synced_at, 1) if self.synced_at else None
+            }
@@ -0,0 +1,9 @@
+# benchmarks/__init__.py
+"""Per-stage benchmarks of the recognition pipeline with regression baselines.
+
+Run from the fras_local folder:
+
+    python -m benchmarks --save-baseline          # record a baseline on this machine
+    python -m benchmarks                          # compare with it; exits 1 on regression
+    python -m benchmarks --frames recording.mp4   # recorded frames instead of synthetic ones
+"""
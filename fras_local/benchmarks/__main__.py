@@ -0,0 +1,82 @@
+# benchmarks/__main__.py
+import argparse
+import logging
+import os
+import sys
+
+from benchmarks.runner import compare, load_baseline, print_results, save_baseline, summarize, time_stage
+from benchmarks.stages import build_stages, recorded_frames, stage_settings, synthetic_frames
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Per-stage recognition pipeline benchmark with regression baselines")
+    parser.add_argument("--frames", default=None, help="Video file or folder of frames (default: synthetic frames)")
+    parser.add_argument("--count", type=int, default=10, help="Synthetic frames, or most recorded frames to use")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--detector", default="hog", help="Face detector spec, e.g. hog, haar, dnn, dlib_hog:1")
+    parser.add_argument("--model-dir", default=".", help="Folder with the dnn detector model files")
+    parser.add_argument("--stages", nargs="+", default=None,
+                        help="Only these stages: resize enhance detect landmarks encode ear match draw jpeg")
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the frames per stage")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--output", default=None, help="Also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.frames:
+        frames = recorded_frames(args.frames, args.count)
+        if not frames:
+            print(f"No frames could be read from {args.frames}")
+            return 2
+    else:
+        frames = synthetic_frames(args.count, args.width, args.height)
+    settings = stage_settings(frames, args.frames or "synthetic", args.gallery_sizes, args.detector)
+
+    results = {}
+    for name, func, inputs in build_stages(frames, args.gallery_sizes, args.detector, args.model_dir, args.stages):
+        results[name] = summarize(time_stage(func, inputs, args.repeats))
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        baseline = load_baseline(args.baseline)
+        if baseline.get("settings") != settings:
+            print(f"Baseline {args.baseline} was recorded with different settings; not comparing")
+            print(f"  baseline: {baseline.get('settings')}")
+            print(f"  this run: {settings}")
+            baseline = None
+
+    print(f"{settings['frame_count']} {settings['frames']} frames at {settings['resolution']}, "
+          f"{args.repeats} passes per stage")
+    print_results(results, baseline)
+
+    if args.output:
+        save_baseline(args.output, results, settings)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, settings)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"No comparable baseline at {args.baseline} - run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No stage regressed beyond {args.tolerance:.0%} of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+# benchmarks/runner.py
+import json
+import os
+import platform
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+# Stats compared against the baseline
+COMPARED_STATS = ("p50_ms", "p95_ms")
+
+
+def time_stage(func: Callable, inputs: Sequence, repeats: int = 3, warmup: int = 2) -> List[float]:
+    """Milliseconds per call of func over every input, ``repeats`` times, after ``warmup`` untimed calls"""
+    for item in list(inputs)[:warmup]:
+        func(item)
+
+    samples = []
+    for _ in range(repeats):
+        for item in inputs:
+            started = time.perf_counter()
+            func(item)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples: Sequence[float]) -> Dict:
+    values = np.asarray(samples, dtype=np.float64)
+    mean = float(values.mean())
+    return {
+        "samples": len(values),
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(float(np.percentile(values, 50)), 4),
+        "p95_ms": round(float(np.percentile(values, 95)), 4),
+        "p99_ms": round(float(np.percentile(values, 99)), 4),
+        "throughput_per_s": round(1000.0 / mean, 2) if mean > 0 else None
+    }
+
+
+def machine_info() -> Dict:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version()
+    }
+
+
+def save_baseline(path: str, results: Dict[str, Dict], settings: Dict):
+    baseline = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": machine_info(),
+        "settings": settings,
+        "stages": results
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Stages slower than the baseline by more than ``tolerance`` (a fraction) and ``min_delta_ms``.
+
+    The absolute floor keeps sub-millisecond stages from failing on timer noise.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous:
+            continue
+        for stat in COMPARED_STATS:
+            before, after = previous.get(stat), current.get(stat)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{name} {stat}: {before:.3f} -> {after:.3f} ms (+{(after / before - 1) * 100:.0f}%)"
+                                   if before > 0 else f"{name} {stat}: {before:.3f} -> {after:.3f} ms")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict], baseline: Dict = None):
+    print(f"{'stage':>14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>9} {'base p95':>9}")
+    for name, stats in results.items():
+        previous = (baseline or {}).get("stages", {}).get(name, {}).get("p95_ms")
+        previous = f"{previous:>9.3f}" if previous is not None else f"{'-':>9}"
+        print(f"{name:>14} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['p99_ms']:>9.3f} "
+              f"{stats['throughput_per_s'] or 0:>9.1f} {previous}")
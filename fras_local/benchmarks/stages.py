@@ -0,0 +1,158 @@
+# benchmarks/stages.py
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (name, function of one input, inputs)
+BenchStage = Tuple[str, Callable, Sequence]
+
+
+def synthetic_frames(count: int = 10, width: int = 1280, height: int = 720, seed: int = 0) -> List[np.ndarray]:
+    """BGR frames of textured noise with a few bright blobs - no faces, but realistic detector and codec work"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        frame = np.clip(rng.normal(110, 35, (height, width, 3)), 0, 255).astype(np.uint8)
+        for _ in range(3):
+            center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            cv2.circle(frame, center, int(rng.integers(40, 120)), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        frames.append(frame)
+    return frames
+
+
+def recorded_frames(source: str, limit: int = 50) -> List[np.ndarray]:
+    """Frames from a video file or a folder of images"""
+    from replay import ReplayCapture
+
+    capture = ReplayCapture(source, realtime=False)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = capture.read()
+        if not ret:
+            if capture.ended:
+                break
+            continue
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def _center_box(shape) -> Tuple[int, int, int, int]:
+    """A face-sized (top, right, bottom, left) box in the middle of a downscaled frame"""
+    height, width = shape[:2]
+    size = max(8, min(height, width) // 3)
+    top, left = (height - size) // 2, (width - size) // 2
+    return top, left + size, top + size, left
+
+
+def build_stages(frames: Sequence[np.ndarray], gallery_sizes: Sequence[int], detector_spec: str = "hog",
+                 model_dir: str = ".", stages: Optional[Sequence[str]] = None) -> List[BenchStage]:
+    """Every pipeline stage with inputs derived from the frames, in pipeline order.
+
+    Stages after detection use the boxes the detector found, or one box in the
+    middle of the frame when it found none (synthetic frames), so landmark,
+    encoding and drawing costs are always measured.
+    """
+    from detectors import create_detector
+    from face_gallery import FaceGallery
+    from face_index import ENCODING_DIM
+    from face_tracker import FaceTracker
+    from liveness import eye_aspect_ratios, shapes_to_array
+    from preprocess import LowLightEnhancer
+    from recognition_service import RecognitionService
+
+    wanted = set(stages) if stages else None
+    selected: List[BenchStage] = []
+
+    def add(name: str, func: Callable, inputs: Sequence):
+        if wanted is None or name in wanted or name.split("@")[0] in wanted:
+            selected.append((name, func, inputs))
+
+    service = RecognitionService()
+    predictor_path = service.config.FACE_LANDMARKS_MODEL
+    if os.path.exists(predictor_path):
+        import dlib
+        service.predictor = dlib.shape_predictor(predictor_path)
+    else:
+        logger.warning(f"{predictor_path} not found - landmarks, encode and ear stages are skipped")
+
+    # Downscale and color conversion before detection
+    def resize(frame):
+        return cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+    small_frames = [resize(frame) for frame in frames]
+    add("resize", lambda frame: cv2.cvtColor(resize(frame), cv2.COLOR_BGR2RGB), frames)
+
+    # CLAHE on the downscaled frame, forced on to measure its cost when the scene is dark
+    enhancer = LowLightEnhancer(dark_threshold=256)
+    add("enhance", enhancer.apply, small_frames)
+
+    small_rgb = [cv2.cvtColor(small, cv2.COLOR_BGR2RGB) for small in small_frames]
+    detector = create_detector(detector_spec, model_dir)
+    add(f"detect@{detector.describe()}", detector.detect, small_rgb)
+
+    boxes = [detector.detect(rgb) or [_center_box(rgb.shape)] for rgb in small_rgb]
+    full_rgb = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    located = list(zip(full_rgb, boxes))
+
+    encodings = []
+    if service.predictor is not None:
+        add("landmarks", lambda item: service.face_landmarks(item[0], item[1]), located)
+        shapes = [(rgb, service.face_landmarks(rgb, frame_boxes)) for rgb, frame_boxes in located]
+        add("encode", lambda item: service.encode_faces(item[0], item[1]), shapes)
+        add("ear", lambda item: eye_aspect_ratios(shapes_to_array(item[1])).mean(axis=1), shapes)
+        encodings = [service.encode_faces(rgb, frame_shapes) for rgb, frame_shapes in shapes]
+
+    # Gallery matching at every size; the probes are this run's encodings, or random ones without the predictor
+    rng = np.random.default_rng(0)
+    if not encodings:
+        encodings = [list(rng.normal(0, 0.1, (len(frame_boxes), ENCODING_DIM))) for frame_boxes in boxes]
+    index_type, index_params = gallery_index(service.config)
+    for size in gallery_sizes:
+        known = rng.normal(0, 0.1, (size, ENCODING_DIM)).astype(np.float32)
+        gallery = FaceGallery(known, [str(i) for i in range(size)], index_type=index_type, index_params=index_params)
+        add(f"match@{size}", gallery.match, encodings)
+
+    # Overlay and JPEG encoding of the display frame, as for the preview and streaming
+    trackers = []
+    for frame_boxes in boxes:
+        tracker = FaceTracker()
+        tracker.update(frame_boxes, time.monotonic())
+        for track in tracker.active_tracks():
+            tracker.set_identity(track, "Benchmark", 0.8, time.monotonic())
+        trackers.append(tracker.active_tracks())
+    drawn = list(zip(frames, trackers))
+    add("draw", lambda item: service.draw_detection_info(item[0].copy(), item[1]), drawn)
+
+    display_frames = [service.draw_detection_info(frame.copy(), tracks) for frame, tracks in drawn]
+    add("jpeg", lambda frame: cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85]), display_frames)
+    return selected
+
+
+def gallery_index(config) -> Tuple[str, Dict]:
+    """Face index type and parameters the recognition service would use with this config"""
+    if config.FACE_INDEX_TYPE == "exact":
+        return "exact", {}
+    return config.FACE_INDEX_TYPE, {"nprobe": config.FACE_INDEX_NPROBE}
+
+
+def stage_settings(frames: Sequence[np.ndarray], source: str, gallery_sizes: Sequence[int], detector_spec: str) -> Dict:
+    """What was measured, stored with the baseline so runs are only compared like for like"""
+    from config import Config
+
+    height, width = frames[0].shape[:2]
+    index_type, index_params = gallery_index(Config())
+    return {
+        "frames": source,
+        "frame_count": len(frames),
+        "resolution": f"{width}x{height}",
+        "gallery_sizes": list(gallery_sizes),
+        "detector": detector_spec,
+        "index_type": index_type,
+        "nprobe": index_params.get("nprobe")
+    }
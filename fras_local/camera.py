@@ -0,0 +1,287 @@
+# camera.py
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detectors import FaceDetector, HOGDetector, create_detector
+from face_tracker import FaceTracker
+from frame_rate import FrameRateController
+from motion import MotionGate
+from pipeline import StageStats
+from preprocess import LowLightEnhancer
+from replay import ReplayCapture, is_replay_source
+from roi import Roi, roi_bounds
+
+logger = logging.getLogger(__name__)
+
+
+def parse_camera_list(value: str) -> List[Tuple[str, str, Optional[str]]]:
+    """Parse "name=source|detector;..." into (name, source, detector) triples.
+
+    A bare source is named after its position; the detector is optional.
+    """
+    cameras = []
+    for position, entry in enumerate(part.strip() for part in (value or "").split(";")):
+        if not entry:
+            continue
+        entry, _, detector = entry.partition("|")
+        name, separator, source = entry.partition("=")
+        if not separator:
+            name, source = f"camera{position + 1}", entry
+        cameras.append((name.strip(), source.strip(), detector.strip() or None))
+    return cameras
+
+
+class CameraStream:
+    """One camera and the state that belongs to it: capture, face tracks, frame-rate control and stats.
+
+    The gallery, models and worker pools are shared by every camera and live
+    on the recognition service.
+    """
+
+    def __init__(self, name: str, source, camera_type: str, config, detection_roi: Optional[Roi] = None,
+                 min_face_size: int = 0, detector: Optional[str] = None):
+        self.name = name
+        self.source = int(source) if str(source).isdigit() else source
+        self.camera_type = camera_type
+        self.config = config
+        self.detection_roi = detection_roi
+        self.min_face_size = min_face_size
+
+        self.video_capture = None
+        self.capture_profile = None
+        self.capture_thread = None
+
+        # Tracks are only moved by the detect stage; the match stage sets identities under the lock
+        self.tracker = self.create_tracker()
+        self.track_lock = threading.Lock()
+        self.detector = self.create_detector(detector or config.FACE_DETECTION_MODEL)
+        self.enhancer = LowLightEnhancer(dark_threshold=config.LOW_LIGHT_THRESHOLD)
+        self.frame_rate = self.create_frame_rate_controller()
+        self.motion_gate = None
+
+        # Latest processed frame (or raw frame while detection is skipped) for the preview and streaming
+        self.frame_lock = threading.Lock()
+        self.latest_frame = None
+
+        # Stats
+        self.frame_latency = StageStats()
+        self.stale_frames = 0
+        self.frames_captured = 0
+        self.read_errors = 0
+        self.capture_fps = 0.0
+        self.window_started = None
+        self.window_frames = 0
+
+    def create_tracker(self) -> FaceTracker:
+        """Face tracker configured from Config"""
+        return FaceTracker(
+            detect_interval=self.config.TRACK_DETECT_INTERVAL,
+            drift_iou=self.config.TRACK_DRIFT_IOU,
+            reverify_seconds=self.config.TRACK_REVERIFY_SECONDS,
+            unknown_retry_seconds=self.config.TRACK_UNKNOWN_RETRY_SECONDS
+        )
+
+    def create_detector(self, spec: str) -> FaceDetector:
+        """Face detector of this camera, falling back to HOG when the chosen one cannot be loaded"""
+        try:
+            detector = create_detector(spec, self.config.DETECTOR_MODEL_DIR)
+        except Exception as e:
+            logger.error(f"Cannot use face detector {spec!r} on camera {self.name}, using hog: {e}")
+            detector = HOGDetector()
+        logger.info(f"Camera {self.name} face detector: {detector.describe()}")
+        return detector
+
+    def create_frame_rate_controller(self) -> FrameRateController:
+        return FrameRateController(
+            target_fps=self.config.TARGET_FPS,
+            idle_fps=self.config.IDLE_FPS,
+            cpu_budget=self.config.CPU_BUDGET,
+            capture_fps=self.config.CAPTURE_LOOP_FPS,
+            idle_seconds=self.config.IDLE_AFTER_SECONDS
+        )
+
+    def create_motion_gate(self) -> Optional[MotionGate]:
+        if not self.config.MOTION_GATE_ENABLED:
+            return None
+        return MotionGate(
+            width=self.config.MOTION_THUMBNAIL_WIDTH,
+            pixel_threshold=self.config.MOTION_PIXEL_THRESHOLD,
+            area_threshold=self.config.MOTION_AREA_THRESHOLD,
+            hold_seconds=self.config.MOTION_HOLD_SECONDS,
+            now=time.perf_counter()
+        )
+
+    def reset(self):
+        """Fresh tracks, rate control and stats for a new recognition session"""
+        self.tracker = self.create_tracker()
+        self.frame_rate = self.create_frame_rate_controller()
+        self.motion_gate = self.create_motion_gate()
+        self.frame_latency = StageStats()
+        self.stale_frames = 0
+        self.frames_captured = 0
+        self.read_errors = 0
+        with self.frame_lock:
+            self.latest_frame = None
+
+    def open(self) -> bool:
+        """Initialize camera capture"""
+        if is_replay_source(self.source):
+            return self.open_replay()
+        
+        try:
+            # Use DirectShow backend for Windows
+            self.video_capture = cv2.VideoCapture(self.source, cv2.CAP_DSHOW)
+
+            if not self.video_capture.isOpened():
+                logger.error(f"Cannot open camera {self.name}: {self.source}")
+                # Try without DirectShow backend as fallback
+                self.video_capture = cv2.VideoCapture(self.source)
+
+                if not self.video_capture.isOpened():
+                    logger.error(f"Cannot open camera {self.name} even without DirectShow: {self.source}")
+                    return False
+
+            # Set camera properties
+            self.capture_profile = None
+            self.apply_capture_profile("full")
+            self.video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+            # Test frame capture
+            ret, test_frame = self.video_capture.read()
+            if not ret:
+                logger.error(f"Cannot read test frame from camera {self.name}")
+                return False
+
+            logger.info(f"Camera {self.name} initialized successfully: {self.source}")
+            logger.info(f"Frame size: {test_frame.shape[1]}x{test_frame.shape[0]}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to initialize camera {self.name}: {e}")
+            return False
+
+    def open_replay(self) -> bool:
+        """Play a video file or folder of frames through the pipeline instead of a live camera"""
+        self.video_capture = ReplayCapture(self.source, realtime=self.config.REPLAY_REALTIME)
+        if not self.video_capture.isOpened():
+            logger.error(f"Cannot open replay source for camera {self.name}: {self.source}")
+            return False
+
+        ret, test_frame = self.video_capture.read()
+        if not ret:
+            logger.error(f"Cannot read test frame from replay source {self.source}")
+            return False
+        self.video_capture.rewind()
+
+        mode = "realtime" if self.video_capture.realtime else "fast"
+        logger.info(f"Camera {self.name} replaying {self.source} ({mode}): {self.video_capture.frame_count} frames "
+                    f"at {self.video_capture.fps:g} fps, {test_frame.shape[1]}x{test_frame.shape[0]}")
+        return True
+
+    @property
+    def is_replay(self) -> bool:
+        return isinstance(self.video_capture, ReplayCapture)
+
+    @property
+    def fast_replay(self) -> bool:
+        """Replaying every frame as fast as the pipeline allows"""
+        return self.is_replay and not self.video_capture.realtime
+
+    def replay_ended(self) -> bool:
+        return self.is_replay and self.video_capture.ended
+
+    def source_position(self) -> Optional[int]:
+        """Frame number of the last frame read, for replayed recordings"""
+        return self.video_capture.position if self.is_replay else None
+
+    def is_open(self) -> bool:
+        return self.video_capture is not None and self.video_capture.isOpened()
+
+    def release(self):
+        if self.video_capture:
+            self.video_capture.release()
+            self.video_capture = None
+
+    def apply_capture_profile(self, profile: str):
+        """Switch the camera between full quality and the low-resolution, low-FPS idle profile"""
+        if profile == self.capture_profile or not self.video_capture:
+            return
+
+        if profile == "idle":
+            width, height, fps = self.config.IDLE_CAMERA_WIDTH, self.config.IDLE_CAMERA_HEIGHT, self.config.IDLE_CAMERA_FPS
+        else:
+            width, height, fps = self.config.CAMERA_WIDTH, self.config.CAMERA_HEIGHT, self.config.CAMERA_FPS
+
+        self.video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self.video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.video_capture.set(cv2.CAP_PROP_FPS, fps)
+
+        if self.capture_profile is not None:
+            stats = self.motion_gate.get_stats() if self.motion_gate else {}
+            logger.info(f"Camera {self.name} capture profile {profile}: {width}x{height} @ {fps} fps "
+                        f"({stats.get('skipped_percent', 0.0)}% of frames skipped by the motion gate)")
+        self.capture_profile = profile
+
+    def update_motion_gate(self, frame: np.ndarray, now: float) -> bool:
+        """Run the motion check on a captured frame and switch capture profiles; returns whether the gate is open"""
+        if self.motion_gate is None:
+            return True
+
+        # Only motion inside the detection area counts
+        x0, y0, x1, y1 = roi_bounds(self.detection_roi, frame.shape)
+        was_moving = self.motion_gate.moving
+        moving = self.motion_gate.update(frame[y0:y1, x0:x1], now)
+        # A person standing still fades into the motion background, but while their face is tracked
+        # the resolution must not change under the tracker's boxes and the full-resolution face size limits
+        tracking = bool(self.tracker.tracks)
+        if (moving and not was_moving) or (tracking and self.capture_profile == "idle"):
+            # Someone is coming - full quality and rate from the next frame on
+            self.apply_capture_profile("full")
+            self.frame_rate.wake(now)
+        elif not moving and not tracking and self.motion_gate.still_seconds(now) >= self.config.IDLE_PROFILE_AFTER_SECONDS:
+            self.apply_capture_profile("idle")
+        return moving
+
+    def frame_captured(self, now: float):
+        """Count a captured frame towards the capture rate"""
+        self.frames_captured += 1
+        if self.window_started is None:
+            self.window_started = now
+        self.window_frames += 1
+        elapsed = now - self.window_started
+        if elapsed >= 1.0:
+            self.capture_fps = self.window_frames / elapsed
+            self.window_started = now
+            self.window_frames = 0
+
+    def set_latest_frame(self, frame: np.ndarray):
+        with self.frame_lock:
+            self.latest_frame = frame
+
+    def get_latest_frame(self) -> Optional[np.ndarray]:
+        with self.frame_lock:
+            return self.latest_frame
+
+    def get_stats(self) -> Dict:
+        now = time.perf_counter()
+        return {
+            "source": self.source,
+            "camera_type": self.camera_type,
+            "capture_fps": round(self.capture_fps, 2),
+            "frames_captured": self.frames_captured,
+            "read_errors": self.read_errors,
+            "stale_frames": self.stale_frames,
+            "end_to_end": self.frame_latency.snapshot(),
+            "frame_rate": self.frame_rate.get_stats(now),
+            "face_tracker": self.tracker.stats_line(),
+            "detector": self.detector.describe(),
+            "detection_roi": self.detection_roi,
+            "min_face_size": self.min_face_size,
+            "low_light": self.enhancer.get_stats(),
+            "motion_gate": dict(self.motion_gate.get_stats(), profile=self.capture_profile) if self.motion_gate else None
+        }
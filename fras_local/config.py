@@ -20,11 +20,79 @@ class Config:
         self.CAMERA_WIDTH = 1280
         self.CAMERA_HEIGHT = 720
         self.CAMERA_FPS = 30
+        # More cameras driven by this process next to the one in the server settings: "name=source;name=source|detector"
+        self.EXTRA_CAMERAS = os.getenv("FRAS_EXTRA_CAMERAS", "")
+        # A video file or folder of frames as camera source is replayed at its frame rate, or as fast as possible ("fast")
+        self.REPLAY_REALTIME = os.getenv("FRAS_REPLAY_MODE", "realtime") != "fast"
         
         # Recognition Configuration
         self.FACE_RECOGNITION_TOLERANCE = 0.6
-        self.FACE_DETECTION_MODEL = "hog"  # or "cnn" for better accuracy but slower
+        # hog, cnn, dlib_hog[:upsample], haar or dnn (see detectors.py); the server camera settings can override it
+        self.FACE_DETECTION_MODEL = os.getenv("FRAS_FACE_DETECTOR", "hog")
+        self.DETECTOR_MODEL_DIR = os.getenv("FRAS_DETECTOR_MODEL_DIR", ".")  # res10 SSD files for the dnn detector
         self.SCALE_FACTOR = 0.25  # Scale down for faster processing
+        self.LOW_LIGHT_THRESHOLD = float(os.getenv("FRAS_LOW_LIGHT_THRESHOLD", "80"))  # mean brightness (0-255) below which CLAHE is applied
+        
+        # Detection area - used when the camera settings on the server do not set one
+        self.DETECTION_ROI = os.getenv("FRAS_DETECTION_ROI", "")  # "x,y,width,height" as fractions of the frame
+        self.MIN_FACE_SIZE = int(os.getenv("FRAS_MIN_FACE_SIZE", "0"))  # pixels at full resolution; smaller faces are ignored
+        
+        # Face Tracking - faces keep a track id between frames so they are not re-encoded every frame
+        self.TRACK_DETECT_INTERVAL = 3  # run the face detector every N processed frames while faces are tracked
+        self.TRACK_REVERIFY_SECONDS = 3.0  # re-encode recognized faces this often
+        self.TRACK_UNKNOWN_RETRY_SECONDS = 0.5  # re-encode unknown faces this often
+        self.TRACK_DRIFT_IOU = 0.5  # re-encode when the box overlaps less than this with where it was encoded
+        
+        # Recognition Pipeline - capture -> detect -> match on separate threads; attendance is sent by its own dispatcher thread
+        self.PIPELINE_WORKERS = int(os.getenv("FRAS_PIPELINE_WORKERS", "0")) or os.cpu_count() or 2  # face encoding threads
+        self.PIPELINE_QUEUE_SIZE = 4  # frames waiting between stages before the oldest is dropped
+        self.PIPELINE_MAX_FRAME_AGE = 0.5  # seconds; older frames are skipped instead of processed late
+        self.ATTENDANCE_STATUS_REFRESH_SECONDS = 5  # how often attendance records changed since the last sync are fetched
+        self.ATTENDANCE_FULL_SYNC_SECONDS = 600  # how often the whole day is downloaded again (a safety net for the delta syncs)
+        self.METRICS_LOG_SECONDS = float(os.getenv("FRAS_METRICS_LOG_SECONDS", "60"))  # stage timings and counters log line; 0 disables
+        
+        # Frame Rate - how many frames are processed adapts to the scene and the measured cost per frame
+        self.TARGET_FPS = float(os.getenv("FRAS_TARGET_FPS", "15"))  # processed frames per second while faces are in view
+        self.IDLE_FPS = float(os.getenv("FRAS_IDLE_FPS", "2"))  # processed frames per second while the scene is empty
+        self.IDLE_AFTER_SECONDS = 2.0  # scene counts as empty after this long without a face
+        self.CPU_BUDGET = float(os.getenv("FRAS_CPU_BUDGET", "0.5"))  # share of wall time detection and matching may be busy
+        self.CAPTURE_LOOP_FPS = 30  # capture/preview loop rate while faces are in view or the preview is open
+        
+        # Motion Gate - detection is skipped while nothing moves in front of the camera
+        self.MOTION_GATE_ENABLED = os.getenv("FRAS_MOTION_GATE", "1") != "0"
+        self.MOTION_THUMBNAIL_WIDTH = 64  # width of the gray thumbnail compared between frames
+        self.MOTION_PIXEL_THRESHOLD = 12  # gray levels a thumbnail pixel must change by
+        self.MOTION_AREA_THRESHOLD = 0.01  # share of thumbnail pixels that must change to count as motion
+        self.MOTION_HOLD_SECONDS = 2.0  # keep detecting this long after the last motion
+        
+        # Idle capture profile - low resolution and frame rate after a long stretch without motion
+        self.IDLE_PROFILE_AFTER_SECONDS = 30
+        self.IDLE_CAMERA_WIDTH = 640
+        self.IDLE_CAMERA_HEIGHT = 360
+        self.IDLE_CAMERA_FPS = 10
+        
+        # Encoding Cache - face encodings are reused across restarts unless the photo changed
+        self.ENCODING_CACHE_DIR = os.getenv("FRAS_CACHE_DIR", ".fras_cache")
+        
+        # Attendance Outbox - check-ins and check-outs are stored locally first and sent in the background.
+        # Kept in a data directory of its own: unlike the encoding cache it must never be deleted while events are pending
+        self.DATA_DIR = os.getenv("FRAS_DATA_DIR", ".fras_data")
+        self.ATTENDANCE_OUTBOX_PATH = os.getenv("FRAS_OUTBOX_PATH") or os.path.join(self.DATA_DIR, "attendance_outbox.sqlite3")
+        self.LEGACY_OUTBOX_PATH = os.path.join(self.ENCODING_CACHE_DIR, "attendance_outbox.sqlite3")  # moved from here on start
+        self.OUTBOX_BATCH_SIZE = 50  # events read from the outbox per pass, sent in one request
+        self.OUTBOX_COALESCE_SECONDS = 0.5  # how long a new event waits for others to share its request
+        self.OUTBOX_MAX_BACKOFF_SECONDS = 300  # longest wait between retries while the server is unreachable
+        
+        # Enrollment - photos without a cached encoding are encoded in parallel worker processes
+        self.ENROLLMENT_WORKERS = int(os.getenv("FRAS_ENROLLMENT_WORKERS", "0")) or os.cpu_count() or 1
+        self.ENROLLMENT_CHUNK_SIZE = 0  # images per worker task; 0 picks a size from the roster
+        
+        # Face Index - "exact" (brute force), "ivf" (inverted lists) or "pq" (IVF + product quantization)
+        # Approximate indexes only pay off for galleries in the tens of thousands
+        self.FACE_INDEX_TYPE = os.getenv("FRAS_FACE_INDEX", "exact")
+        self.FACE_INDEX_NPROBE = int(os.getenv("FRAS_FACE_INDEX_NPROBE", "8"))  # lists scanned per query
+        # Directory the gallery is published to as memory-mapped files for recognition worker processes; empty disables it
+        self.SHARED_GALLERY_DIR = os.getenv("FRAS_SHARED_GALLERY_DIR", "")
         
         # Blink Detection Configuration
         self.EYE_AR_THRESHOLD = 0.25
@@ -1,7 +1,7 @@
 # database_client.py
 import requests
 import json
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 from datetime import datetime
 import logging
 
@@ -38,7 +38,7 @@ class DatabaseClient:
                 method=method,
                 url=url,
                 headers=headers,
-                timeout=30,
+                timeout=kwargs.pop("timeout", 30),
                 **kwargs
             )
             
@@ -51,7 +51,7 @@ class DatabaseClient:
                 except:
                     message = f"HTTP {response.status_code}"
                 
-                return {"success": False, "message": message}
+                return {"success": False, "message": message, "status_code": response.status_code}
                 
         except requests.exceptions.ConnectionError:
             return {"success": False, "message": "Cannot connect to server. Check your internet connection and API URL."}
@@ -207,14 +207,32 @@ class DatabaseClient:
             logger.error(f"Failed to get employees: {result['message']}")
             return None
     
-    def get_employee_images(self) -> Optional[List[Dict]]:
-        """Get all employee images with base64 data"""
-        result = self._make_request("GET", "admin/employees/images/all")
+    def get_employee_images(self, ids: Optional[Iterable[int]] = None, chunk_size: int = 200) -> Optional[List[Dict]]:
+        """Get employee images with base64 data - all of them, or only those of the given employee ids"""
+        if ids is None:
+            pages = [None]
+        else:
+            # A few hundred ids per request keeps the query string short
+            ids = sorted(ids)
+            pages = [{"ids": ids[start:start + chunk_size]} for start in range(0, len(ids), chunk_size)]
+        
+        employees = []
+        for params in pages:
+            result = self._make_request("GET", "admin/employees/images/all", params=params)
+            if not result["success"]:
+                logger.error(f"Failed to get employee images: {result['message']}")
+                return None
+            employees.extend(result["data"]["employees"])
+        return employees
+    
+    def get_employee_encodings(self) -> Optional[Dict]:
+        """Get precomputed float32 face encodings for all employees (much smaller than images)"""
+        result = self._make_request("GET", "admin/employees/encodings/all")
         
         if result["success"]:
-            return result["data"]["employees"]
+            return result["data"]
         else:
-            logger.error(f"Failed to get employee images: {result['message']}")
+            logger.warning(f"Failed to get employee encodings: {result['message']}")
             return None
     
     def get_camera_settings(self) -> Optional[Dict]:
@@ -227,9 +245,10 @@ class DatabaseClient:
             logger.error(f"Failed to get camera settings: {result['message']}")
             return None
     
-    def get_today_attendance(self) -> Optional[Dict]:
-        """Get today's attendance records"""
-        result = self._make_request("GET", "admin/attendance/today")
+    def get_today_attendance(self, updated_after: Optional[str] = None) -> Optional[Dict]:
+        """Get today's attendance records; with updated_after (an earlier answer's cursor) only those changed since"""
+        params = {"updated_after": updated_after} if updated_after is not None else None
+        result = self._make_request("GET", "admin/attendance/today", params=params)
         
         if result["success"]:
             return result["data"]
@@ -237,16 +256,68 @@ class DatabaseClient:
             logger.error(f"Failed to get today's attendance: {result['message']}")
             return None
     
-    def create_attendance_record(self, attendance_data: Dict) -> bool:
-        """Create attendance record"""
+    def initialize_attendance_day(self, day=None, camera_used: Optional[str] = None) -> Optional[Dict]:
+        """Create the missing absent records of every employee for a day; returns the day's latest record per employee"""
+        data = {"day": day.isoformat() if day else None, "camera_used": camera_used}
+        result = self._make_request("POST", "admin/attendance/initialize-day", json=data)
+        
+        if result["success"]:
+            return result["data"]
+        else:
+            logger.error(f"Failed to initialize attendance day: {result['message']}")
+            return None
+    
+    def create_attendance_record(self, attendance_data: Dict) -> Optional[Dict]:
+        """Create attendance record; returns the record as stored by the server, or None"""
         result = self._make_request("POST", "admin/attendance", json=attendance_data)
         
         if result["success"]:
             logger.info(f"Attendance record created: {result['data']}")
-            return True
+            return result["data"]
         else:
             logger.error(f"Failed to create attendance record: {result['message']}")
-            return False
+            return None
+    
+    def send_attendance_event(self, attendance_data: Dict, timeout: float = 10) -> Tuple[Optional[Dict], Optional[Tuple]]:
+        """Send an attendance event; the server checks the employee in or out (an idempotency key makes resending safe).
+        
+        Returns (result, None) with the action taken, the new state and the
+        record, or (None, (status_code, message)) with status_code None when the
+        server was not reached. Events queued by older versions carry the
+        record itself and go to the plain record endpoint.
+        """
+        endpoint = "admin/attendance/events" if "timestamp" in attendance_data else "admin/attendance"
+        result = self._make_request("POST", endpoint, json=attendance_data, timeout=timeout)
+        
+        if result["success"]:
+            return result["data"], None
+        return None, (result.get("status_code"), result["message"])
+    
+    def send_attendance_events(self, events: List[Dict], timeout: float = 15) -> Tuple[Optional[List[Tuple]], Optional[Tuple]]:
+        """Send many attendance events in one request; the server applies them in one transaction.
+        
+        Returns (outcomes, None) with one (result, error) pair per event, in
+        order and shaped like send_attendance_event's answer, or (None,
+        (status_code, message)) when the batch as a whole failed. Events
+        queued by older versions are sent one by one.
+        """
+        outcomes: List[Optional[Tuple]] = [None] * len(events)
+        batch = [i for i, event in enumerate(events) if "timestamp" in event]
+        if batch:
+            result = self._make_request("POST", "admin/attendance/batch",
+                                        json={"events": [events[i] for i in batch]}, timeout=timeout)
+            if not result["success"]:
+                return None, (result.get("status_code"), result["message"])
+            for i, item in zip(batch, result["data"]["results"]):
+                if item.get("ok"):
+                    outcomes[i] = (item, None)
+                else:
+                    outcomes[i] = (None, (item.get("status_code"), item.get("error")))
+        
+        for i, event in enumerate(events):
+            if outcomes[i] is None:
+                outcomes[i] = self.send_attendance_event(event, timeout=timeout)
+        return outcomes, None
     
     def is_authenticated(self) -> bool:
         """Check if client is authenticated"""
@@ -0,0 +1,180 @@
+# encoding_cache.py
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Must match FACE_ENCODING_MODEL on the backend for server-side encodings to be used
+FACE_ENCODING_MODEL = "dlib_face_recognition_resnet_model_v1+landmarks68"
+ENCODING_DIM = 128
+
+
+class EncodingCache:
+    """On-disk cache of employee face encodings keyed by employee id and image hash.
+
+    Encodings live in a single (N, 128) float32 ``.npy`` matrix that is opened
+    memory-mapped, next to a small JSON index mapping employee ids to rows.
+    """
+
+    INDEX_FILE = "index.json"
+    MATRIX_FILE = "encodings.npy"
+
+    def __init__(self, cache_dir: str, model_version: str = FACE_ENCODING_MODEL):
+        self.cache_dir = cache_dir
+        self.model_version = model_version
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        self.matrix_path = os.path.join(cache_dir, self.MATRIX_FILE)
+
+        # employee id (str) -> {"hash", "row", "encode_seconds"}; row is -1 when no face was found
+        self.entries: Dict[str, Dict] = {}
+        self.matrix = None
+
+        # Entries looked up or stored during this run; they replace the loaded ones on save
+        self.current: Dict[str, Dict] = {}
+        self.new_encodings: Dict[str, np.ndarray] = {}
+        self.dirty = False
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.seconds_spent = 0.0
+
+    @staticmethod
+    def hash_image(image_data: bytes) -> str:
+        """Content hash used to detect changed employee photos"""
+        return hashlib.sha1(image_data).hexdigest()
+
+    def load(self) -> bool:
+        """Load the index and memory-map the encoding matrix if a valid cache exists"""
+        if not os.path.exists(self.index_path) or not os.path.exists(self.matrix_path):
+            return False
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+
+            if index.get("model") != self.model_version or index.get("dim") != ENCODING_DIM:
+                logger.info("Encoding cache was built with a different model, ignoring it")
+                return False
+
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape[1] != ENCODING_DIM:
+                logger.warning(f"Encoding cache matrix has unexpected shape {matrix.shape}, ignoring it")
+                return False
+
+            self.entries = index.get("entries", {})
+            self.matrix = matrix
+            logger.info(f"Encoding cache loaded: {len(self.entries)} entries from {self.cache_dir}")
+            return True
+
+        except Exception as e:
+            logger.warning(f"Could not load encoding cache from {self.cache_dir}: {e}")
+            self.entries = {}
+            self.matrix = None
+            return False
+
+    def lookup(self, employee_id, image_hash: str) -> Tuple[bool, Optional[np.ndarray]]:
+        """Return (hit, encoding). A hit with encoding None means no face was found last time."""
+        key = str(employee_id)
+        entry = self.entries.get(key)
+
+        if not entry or entry.get("hash") != image_hash:
+            self.misses += 1
+            return False, None
+
+        row = entry.get("row", -1)
+        encoding = None
+        if row >= 0:
+            if self.matrix is None or row >= self.matrix.shape[0]:
+                self.misses += 1
+                return False, None
+            # Copy out of the memory map so the file can be replaced on save
+            encoding = np.array(self.matrix[row], dtype=np.float64)
+
+        self.hits += 1
+        self.seconds_saved += float(entry.get("encode_seconds", 0.0))
+        self.current[key] = entry
+        return True, encoding
+
+    def store(self, employee_id, image_hash: str, encoding: Optional[np.ndarray], encode_seconds: float):
+        """Record a freshly computed encoding (or None when the photo has no face)"""
+        key = str(employee_id)
+        self.current[key] = {
+            "hash": image_hash,
+            "row": -1,
+            "encode_seconds": round(float(encode_seconds), 4)
+        }
+        if encoding is not None:
+            self.new_encodings[key] = np.asarray(encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        self.seconds_spent += encode_seconds
+        self.dirty = True
+
+    def save(self, known_ids: Optional[Iterable] = None) -> bool:
+        """Write the cache back to disk: this run's entries merged into the loaded ones.
+
+        Entries of employees not seen this run are kept (a run may load only
+        some employees) unless ``known_ids``, every employee that still has
+        an image, is given and does not list them.
+        """
+        merged = dict(self.entries)
+        merged.update(self.current)
+        if known_ids is not None:
+            known = {str(employee_id) for employee_id in known_ids}
+            merged = {key: entry for key, entry in merged.items() if key in known}
+
+        if not self.dirty and set(merged) == set(self.entries):
+            return True
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            rows = []
+            entries = {}
+            for key, entry in merged.items():
+                entry = dict(entry)
+                if key in self.new_encodings:
+                    rows.append(self.new_encodings[key])
+                    entry["row"] = len(rows) - 1
+                elif entry.get("row", -1) >= 0 and self.matrix is not None:
+                    rows.append(np.array(self.matrix[entry["row"]], dtype=np.float32))
+                    entry["row"] = len(rows) - 1
+                else:
+                    entry["row"] = -1
+                entries[key] = entry
+
+            matrix = np.ascontiguousarray(np.vstack(rows) if rows else np.zeros((0, ENCODING_DIM)), dtype=np.float32)
+
+            # Release the memory map before replacing the file (required on Windows)
+            self.matrix = None
+
+            tmp_matrix = self.matrix_path + ".tmp"
+            with open(tmp_matrix, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_matrix, self.matrix_path)
+
+            tmp_index = self.index_path + ".tmp"
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_version, "dim": ENCODING_DIM, "entries": entries}, f)
+            os.replace(tmp_index, self.index_path)
+
+            self.entries = entries
+            self.current = dict(entries)
+            self.new_encodings = {}
+            self.dirty = False
+            self.matrix = np.load(self.matrix_path, mmap_mode="r")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to save encoding cache to {self.cache_dir}: {e}")
+            return False
+
+    def stats_line(self) -> str:
+        """One-line summary of cache effectiveness for this run"""
+        return (f"Encoding cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.seconds_saved:.1f}s saved, {self.seconds_spent:.1f}s spent encoding")
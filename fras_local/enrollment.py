@@ -0,0 +1,114 @@
+# enrollment.py
+"""Parallel face encoding of employee photos.
+
+Kept free of GUI and recognition imports so worker processes start quickly;
+dlib, OpenCV and PIL are imported inside the workers.
+"""
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (key, encoding or None when no face was found, seconds spent, error message or None)
+EncodeResult = Tuple[Hashable, Optional[np.ndarray], float, Optional[str]]
+
+
+def encode_image(image_data: bytes) -> Optional[np.ndarray]:
+    """Decode an employee photo and return its face encoding, or None if no face is found"""
+    import io
+
+    import cv2
+    import face_recognition
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    image_np = np.array(image)
+
+    # Convert to RGB if needed
+    if len(image_np.shape) == 3 and image_np.shape[2] == 3:
+        image_rgb = image_np
+    else:
+        image_rgb = cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB)
+
+    # Get face encodings (68-point alignment, same as the recognition loop)
+    encodings = face_recognition.face_encodings(image_rgb, model="large")
+    return encodings[0] if encodings else None
+
+
+def encode_chunk(items: Sequence[Tuple[Hashable, bytes]]) -> List[EncodeResult]:
+    """Encode a chunk of images in one worker; a bad image only fails its own entry"""
+    results = []
+    for key, image_data in items:
+        started = time.perf_counter()
+        try:
+            encoding = encode_image(image_data)
+            results.append((key, encoding, time.perf_counter() - started, None))
+        except Exception as e:
+            results.append((key, None, time.perf_counter() - started, str(e)))
+    return results
+
+
+def encode_images(items: Sequence[Tuple[Hashable, bytes]], workers: Optional[int] = None,
+                  chunk_size: int = 0, progress: Optional[Callable[[int, int], None]] = None) -> List[EncodeResult]:
+    """Encode (key, image bytes) pairs across a process pool; results come back in input order.
+
+    ``progress(done, total)`` is called from the calling thread as chunks finish.
+    Small rosters are encoded in-process since starting workers costs more than it saves.
+    """
+    total = len(items)
+    if total == 0:
+        return []
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, total)
+    if not chunk_size:
+        # A few chunks per worker keeps the pool busy without per-image IPC overhead
+        chunk_size = max(1, min(16, math.ceil(total / (workers * 4))))
+    chunks = [items[i:i + chunk_size] for i in range(0, total, chunk_size)]
+
+    results = {}
+    done = 0
+
+    def collect(chunk_results: Iterable[EncodeResult]):
+        nonlocal done
+        for result in chunk_results:
+            results[result[0]] = result
+            done += 1
+        if progress:
+            progress(done, total)
+
+    if workers <= 1 or total < 2 * workers:
+        for chunk in chunks:
+            collect(encode_chunk(chunk))
+        return [results[key] for key, _ in items]
+
+    remaining = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(encode_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                try:
+                    collect(future.result())
+                except BrokenProcessPool:
+                    remaining.append(futures[future])
+                except Exception as e:
+                    logger.error(f"Encoding chunk failed: {e}")
+                    remaining.append(futures[future])
+    except Exception as e:
+        logger.error(f"Encoding worker pool failed: {e}")
+        remaining = [chunk for chunk in chunks if any(key not in results for key, _ in chunk)]
+
+    # A crashed worker takes its chunk (and the pool) down with it - finish those images here
+    if remaining:
+        logger.warning(f"Encoding {sum(len(chunk) for chunk in remaining)} images in-process after worker failure")
+        for chunk in remaining:
+            collect(encode_chunk([item for item in chunk if item[0] not in results]))
+
+    return [results[key] for key, _ in items]
@@ -0,0 +1,162 @@
+# face_gallery.py
+import hashlib
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from face_index import ENCODING_DIM, FaceIndex, create_index
+
+logger = logging.getLogger(__name__)
+
+
+class MatchResult:
+    """Best gallery match for one probe face"""
+
+    __slots__ = ("index", "distance", "margin")
+
+    def __init__(self, index: int, distance: float, margin: float):
+        self.index = index          # row in the gallery, -1 when nothing is enrolled
+        self.distance = distance    # euclidean distance to the best match
+        self.margin = margin        # second-best distance minus best distance (inf with one entry)
+
+    def __repr__(self):
+        return f"MatchResult(index={self.index}, distance={self.distance:.4f}, margin={self.margin:.4f})"
+
+
+class FaceGallery:
+    """Known face encodings behind a pluggable nearest-neighbour index.
+
+    The default exact index holds one contiguous (N, 128) float32 matrix with
+    precomputed norms, so matching all faces of a frame is a single matrix
+    product instead of one compare_faces + face_distance pass per face. IVF
+    and product-quantized indexes (see face_index.py) trade a little recall
+    for speed on very large galleries.
+    """
+
+    def __init__(self, encodings: Optional[Sequence[np.ndarray]] = None, names: Optional[Sequence[str]] = None,
+                 index_type: str = "exact", index_params: Optional[Dict] = None, index_path: Optional[str] = None):
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.index = create_index(index_type, **self.index_params)
+        self.names: List[Optional[str]] = []
+        if encodings is not None:
+            self.build(encodings, names or [], index_path)
+
+    def build(self, encodings: Sequence[np.ndarray], names: Sequence[str], index_path: Optional[str] = None):
+        """Replace the gallery contents, reusing a persisted index at index_path when it matches"""
+        if len(encodings) != len(names):
+            raise ValueError(f"Got {len(encodings)} encodings but {len(names)} names")
+
+        if len(encodings):
+            matrix = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), ENCODING_DIM)
+        else:
+            matrix = np.zeros((0, ENCODING_DIM), dtype=np.float32)
+        self.names = list(names)
+
+        fingerprint = self.fingerprint(matrix)
+        if index_path and os.path.exists(index_path):
+            try:
+                index = FaceIndex.load(index_path)
+                if index.fingerprint == fingerprint:
+                    self.index = index
+                    return
+            except Exception as e:
+                logger.warning(f"Could not load face index from {index_path}: {e}")
+
+        self.index = create_index(self.index_type, **self.index_params)
+        self.index.build(matrix)
+        self.index.fingerprint = fingerprint
+
+        if index_path:
+            try:
+                self.index.save(index_path)
+            except Exception as e:
+                logger.warning(f"Could not save face index to {index_path}: {e}")
+
+    def fingerprint(self, matrix: np.ndarray) -> str:
+        """Identifies gallery contents and index settings so a persisted index is only reused when valid"""
+        digest = hashlib.sha1(np.ascontiguousarray(matrix).tobytes())
+        digest.update("\n".join(str(name) for name in self.names).encode("utf-8"))
+        digest.update(f"{self.index_type}:{sorted(self.index_params.items())}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def add(self, encoding: np.ndarray, name: str) -> int:
+        """Enroll one more face; returns its gallery index"""
+        index = len(self.names)
+        self.index.add(np.asarray(encoding, dtype=np.float32).reshape(1, ENCODING_DIM), [index])
+        self.names.append(name)
+        return index
+
+    def remove(self, index: int):
+        """Remove a face; other gallery indexes stay valid"""
+        if self.index.remove([index]):
+            self.names[index] = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def match(self, probes) -> List[MatchResult]:
+        """Best index, distance and margin for every probe encoding in one batched pass"""
+        count = len(probes)
+        if count == 0:
+            return []
+
+        distances, ids = self.index.search(probes, k=2)
+        with np.errstate(invalid="ignore"):
+            margins = np.where(ids[:, 1] >= 0, distances[:, 1] - distances[:, 0], np.inf)
+
+        return [
+            MatchResult(int(ids[i, 0]), float(distances[i, 0]), float(margins[i]))
+            for i in range(count)
+        ]
+
+
+def _legacy_match(known_face_encodings: list, face_encodings: list, tolerance: float = 0.6):
+    """The per-face compare_faces + face_distance pattern the gallery replaces (same math as face_recognition)"""
+    results = []
+    for face_encoding in face_encodings:
+        matches = list(np.linalg.norm(np.array(known_face_encodings) - face_encoding, axis=1) <= tolerance)
+        face_distances = np.linalg.norm(np.array(known_face_encodings) - face_encoding, axis=1)
+        best_match_index = np.argmin(face_distances)
+        results.append((best_match_index, matches[best_match_index]))
+    return results
+
+
+def benchmark(sizes=(10, 100, 1000, 10000, 50000), faces_per_frame: int = 3, repeats: int = 20,
+              index_type: str = "exact"):
+    """Compare per-frame matching latency of the gallery against the legacy per-face loop"""
+    rng = np.random.default_rng(0)
+    print(f"{'employees':>10} {'legacy ms':>10} {'gallery ms':>11} {'speedup':>8}")
+
+    for size in sizes:
+        known = [rng.normal(0, 0.1, ENCODING_DIM) for _ in range(size)]
+        probes = [known[i % size] + rng.normal(0, 0.02, ENCODING_DIM) for i in range(faces_per_frame)]
+        gallery = FaceGallery(known, [str(i) for i in range(size)], index_type=index_type)
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            _legacy_match(known, probes)
+        legacy_ms = (time.perf_counter() - started) * 1000 / repeats
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            gallery.match(probes)
+        gallery_ms = (time.perf_counter() - started) * 1000 / repeats
+
+        print(f"{size:>10} {legacy_ms:>10.3f} {gallery_ms:>11.3f} {legacy_ms / gallery_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face gallery matching microbenchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    parser.add_argument("--faces", type=int, default=3, help="Faces per frame")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--index", default="exact", help="Index type: exact, ivf or pq")
+    args = parser.parse_args()
+
+    benchmark(args.sizes, args.faces, args.repeats, args.index)
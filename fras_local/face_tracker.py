@@ -0,0 +1,212 @@
+# face_tracker.py
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from liveness import BlinkCounter
+
+# (top, right, bottom, left) as returned by face_recognition.face_locations
+Box = Tuple[int, int, int, int]
+
+
+def iou_matrix(boxes_a: Sequence[Box], boxes_b: Sequence[Box]) -> np.ndarray:
+    """Intersection over union of every box in boxes_a against every box in boxes_b"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+
+def associate(boxes_a: Sequence[Box], boxes_b: Sequence[Box], min_iou: float) -> List[Tuple[int, int]]:
+    """Greedy one-to-one matching of boxes by highest IoU; returns (index_a, index_b) pairs"""
+    if not len(boxes_a) or not len(boxes_b):
+        return []
+
+    overlaps = iou_matrix(boxes_a, boxes_b)
+    pairs = []
+    used_a, used_b = set(), set()
+    for flat in np.argsort(overlaps, axis=None)[::-1]:
+        i, j = divmod(int(flat), overlaps.shape[1])
+        if overlaps[i, j] < min_iou:
+            break
+        if i in used_a or j in used_b:
+            continue
+        pairs.append((i, j))
+        used_a.add(i)
+        used_b.add(j)
+    return pairs
+
+
+class Track:
+    """One face followed across frames"""
+
+    def __init__(self, track_id: int, box: Box, now: float):
+        self.track_id = track_id
+        self.box = box
+        self.detected_box = box                        # last box reported by the detector
+        self.velocity = np.zeros(4, dtype=np.float32)  # box change per processed frame
+        self.detected = True                           # box came from the detector on this frame
+
+        # Identity - None until the first encoding
+        self.name: Optional[str] = None
+        self.confidence = 0.0
+        self.encoded_box: Optional[Box] = None
+        self.encoded_at = 0.0
+        self.encode_requested_at = 0.0  # an encoding is in flight while this is newer than encoded_at
+
+        # Liveness - updated by the recognition service
+        self.blink = BlinkCounter()
+
+        self.hits = 1
+        self.missed = 0
+        self.frames_since_detection = 0
+        self.created_at = now
+
+    @property
+    def is_known(self) -> bool:
+        return self.name is not None and self.name != "Unknown"
+
+    def __repr__(self):
+        return f"Track(id={self.track_id}, name={self.name}, box={self.box}, missed={self.missed})"
+
+
+class FaceTracker:
+    """IoU tracker that keeps a stable id per face between detector runs.
+
+    The detector runs every ``detect_interval`` processed frames while faces
+    are tracked (every frame when nothing is), and boxes are extrapolated with
+    a constant-velocity model in between. A track is re-encoded only when it is
+    new, when its box has drifted away from where it was last encoded, or when
+    its identity is older than the re-verification interval.
+    """
+
+    def __init__(self, detect_interval: int = 3, min_iou: float = 0.3, max_missed: int = 2,
+                 drift_iou: float = 0.5, reverify_seconds: float = 3.0, unknown_retry_seconds: float = 0.5,
+                 pending_timeout: float = 1.0):
+        self.detect_interval = max(1, detect_interval)
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.drift_iou = drift_iou
+        self.reverify_seconds = reverify_seconds
+        self.unknown_retry_seconds = unknown_retry_seconds
+        self.pending_timeout = pending_timeout
+
+        self.tracks: Dict[int, Track] = {}
+        self._ids = itertools.count(1)
+        self._frames_since_detection = 0
+
+        # Stats
+        self.frames = 0
+        self.detection_frames = 0
+        self.encodings = 0
+
+    def reset(self):
+        self.tracks = {}
+        self._frames_since_detection = 0
+
+    def should_detect(self) -> bool:
+        """Whether the detector should run on the next processed frame"""
+        return not self.tracks or self._frames_since_detection + 1 >= self.detect_interval
+
+    def predict(self):
+        """Advance every track one frame without running the detector"""
+        self.frames += 1
+        self._frames_since_detection += 1
+        for track in self.tracks.values():
+            box = np.asarray(track.box, dtype=np.float32) + track.velocity
+            track.box = tuple(int(round(v)) for v in box)
+            track.detected = False
+            track.frames_since_detection += 1
+
+    def update(self, boxes: Sequence[Box], now: float) -> List[int]:
+        """Associate detector boxes with tracks. Returns ids of tracks that were dropped."""
+        self.frames += 1
+        self.detection_frames += 1
+        self._frames_since_detection = 0
+
+        tracks = list(self.tracks.values())
+        # Compare detections against where each track should be on this frame
+        predicted = [np.asarray(track.box, dtype=np.float32) + track.velocity for track in tracks]
+
+        matched_tracks, matched_boxes = set(), set()
+        for i, j in associate(predicted, boxes, self.min_iou):
+            track = tracks[i]
+            box = tuple(int(v) for v in boxes[j])
+            steps = track.frames_since_detection + 1
+            track.velocity = (np.asarray(box, dtype=np.float32) - np.asarray(track.detected_box, dtype=np.float32)) / steps
+            track.box = box
+            track.detected_box = box
+            track.detected = True
+            track.hits += 1
+            track.missed = 0
+            track.frames_since_detection = 0
+            matched_tracks.add(track.track_id)
+            matched_boxes.add(j)
+
+        dropped = []
+        for track in tracks:
+            if track.track_id in matched_tracks:
+                continue
+            track.missed += 1
+            track.box = tuple(int(round(v)) for v in np.asarray(track.box, dtype=np.float32) + track.velocity)
+            track.detected = False
+            track.frames_since_detection += 1
+            if track.missed > self.max_missed:
+                del self.tracks[track.track_id]
+                dropped.append(track.track_id)
+
+        for j, box in enumerate(boxes):
+            if j not in matched_boxes:
+                track = Track(next(self._ids), tuple(int(v) for v in box), now)
+                self.tracks[track.track_id] = track
+
+        return dropped
+
+    def active_tracks(self) -> List[Track]:
+        return sorted(self.tracks.values(), key=lambda track: track.track_id)
+
+    def needs_encoding(self, track: Track, now: float) -> bool:
+        """New, drifted or stale tracks get a fresh encoding; only on frames where the detector saw them"""
+        if not track.detected:
+            return False
+        if track.encode_requested_at > track.encoded_at and now - track.encode_requested_at < self.pending_timeout:
+            # Result not back yet (it may have been dropped under load, hence the timeout)
+            return False
+        if track.name is None:
+            return True
+
+        interval = self.reverify_seconds if track.is_known else self.unknown_retry_seconds
+        if now - track.encoded_at >= interval:
+            return True
+
+        return iou_matrix([track.box], [track.encoded_box])[0, 0] < self.drift_iou
+
+    def request_encoding(self, track: Track, now: float):
+        """Mark an encoding as in flight so the track is not queued again before the result arrives"""
+        track.encode_requested_at = now
+
+    def set_identity(self, track: Track, name: str, confidence: float, now: float) -> bool:
+        """Record the result of an encoding. Returns True if the track changed identity."""
+        changed = track.name is not None and track.name != name
+        track.name = name
+        track.confidence = confidence
+        track.encoded_box = track.box
+        track.encoded_at = now
+        self.encodings += 1
+        return changed
+
+    def stats_line(self) -> str:
+        """Summary of how much detection and encoding work tracking avoided"""
+        return (f"{len(self.tracks)} tracks, detector on {self.detection_frames}/{self.frames} frames, "
+                f"{self.encodings} encodings")
@@ -0,0 +1,109 @@
+# frame_rate.py
+import threading
+from typing import Dict
+
+
+class FrameRateController:
+    """Paces the capture loop and picks which captured frames are processed.
+
+    The processing rate is ``target_fps`` while faces are in view and
+    ``idle_fps`` once the scene has been empty for ``idle_seconds``, capped so
+    detection and matching stay within ``cpu_budget`` (busy seconds per second
+    of wall time, measured from frames coming back out of the pipeline). The
+    capture loop runs at ``capture_fps`` while faces are in view or the preview
+    is shown, and slows to the processing rate otherwise; the stride is how
+    many captured frames go by per processed one.
+    """
+
+    def __init__(self, target_fps: float = 15.0, idle_fps: float = 2.0, cpu_budget: float = 0.5,
+                 capture_fps: float = 30.0, idle_seconds: float = 2.0, min_fps: float = 1.0):
+        self.target_fps = target_fps
+        self.idle_fps = min(idle_fps, target_fps)
+        self.cpu_budget = cpu_budget
+        self.capture_fps = capture_fps
+        self.idle_seconds = idle_seconds
+        self.min_fps = min(min_fps, self.idle_fps)
+
+        self.lock = threading.Lock()
+        self.avg_cost = 0.0             # seconds of processing per frame (exponential moving average)
+        self.last_face_at = float("-inf")
+        self.stride = 1
+        self.since_processed = 0
+        self.process_next = False
+
+        # Achieved rate, measured over windows of about a second
+        self.window_started = None
+        self.window_frames = 0
+        self.achieved_fps = 0.0
+        self.captured = 0
+        self.processed = 0
+
+    def is_active(self, now: float) -> bool:
+        """Whether faces were in view recently"""
+        return now - self.last_face_at < self.idle_seconds
+
+    def processing_fps(self, now: float) -> float:
+        """Frames per second to process right now"""
+        fps = self.target_fps if self.is_active(now) else self.idle_fps
+        if self.avg_cost > 0:
+            fps = min(fps, self.cpu_budget / self.avg_cost)
+        return max(fps, self.min_fps)
+
+    def loop_fps(self, now: float, preview: bool) -> float:
+        """Capture loop rate: full speed when someone is in view or watching, otherwise just what processing needs"""
+        if preview or self.is_active(now):
+            return self.capture_fps
+        return min(self.capture_fps, self.processing_fps(now))
+
+    def should_process(self, now: float, preview: bool) -> bool:
+        """Called for every captured frame; True when it should go into the pipeline"""
+        with self.lock:
+            self.captured += 1
+            self.stride = max(1, int(round(self.loop_fps(now, preview) / self.processing_fps(now))))
+            self.since_processed += 1
+            if self.since_processed < self.stride and not self.process_next:
+                return False
+            self.since_processed = 0
+            self.process_next = False
+            return True
+
+    def wake(self, now: float):
+        """Go to the active rate right away and process the next frame (e.g. motion at an empty entrance)"""
+        with self.lock:
+            self.last_face_at = max(self.last_face_at, now)
+            self.process_next = True
+
+    def sleep_seconds(self, loop_seconds: float, now: float, preview: bool) -> float:
+        """Time left in this capture period after ``loop_seconds`` of work"""
+        with self.lock:
+            return max(0.0, 1.0 / self.loop_fps(now, preview) - loop_seconds)
+
+    def frame_processed(self, seconds: float, faces: int, now: float):
+        """Record the processing cost of a frame that came out of the pipeline and whether it had faces"""
+        with self.lock:
+            self.processed += 1
+            self.avg_cost = seconds if self.processed == 1 else 0.9 * self.avg_cost + 0.1 * seconds
+            if faces:
+                self.last_face_at = now
+
+            if self.window_started is None:
+                self.window_started = now
+            self.window_frames += 1
+            elapsed = now - self.window_started
+            if elapsed >= 1.0:
+                self.achieved_fps = self.window_frames / elapsed
+                self.window_started = now
+                self.window_frames = 0
+
+    def get_stats(self, now: float) -> Dict:
+        with self.lock:
+            return {
+                "mode": "active" if self.is_active(now) else "idle",
+                "target_fps": round(self.processing_fps(now), 2),
+                "achieved_fps": round(self.achieved_fps, 2),
+                "stride": self.stride,
+                "avg_cost_ms": round(self.avg_cost * 1000, 2),
+                "cpu_load": round(self.avg_cost * self.achieved_fps, 2),
+                "captured": self.captured,
+                "processed": self.processed
+            }
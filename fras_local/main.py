@@ -34,6 +34,7 @@ class LocalRecognitionApp:
         self.config = Config()
         self.db_client = DatabaseClient(self.config)
         self.recognition_service = recognition_service  # Use global singleton
+        self.recognition_service.progress_callback = self.show_progress
         self.is_running = False
         self.current_token = None
         self.current_company = None
@@ -142,6 +143,16 @@ class LocalRecognitionApp:
         self.log_text.see(tk.END)
         self.root.update_idletasks()
     
+    def show_progress(self, message: str):
+        """Show progress of a long-running step in the status area"""
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, self.show_progress, message)
+            return
+        
+        if self.status_label:
+            self.status_label.config(text=f"Status: {message}")
+            self.root.update_idletasks()
+    
     def update_status_display(self):
         """Update the status display with current recognition service status"""
         status = self.recognition_service.get_status()
@@ -382,5 +393,9 @@ class LocalRecognitionApp:
         self.root.mainloop()
 
 if __name__ == "__main__":
+    # Enrollment uses worker processes; needed when frozen into a Windows executable
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
     app = LocalRecognitionApp()
     app.run()
\ No newline at end of file
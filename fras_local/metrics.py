@@ -0,0 +1,213 @@
+# metrics.py
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds of the stage timing buckets, in seconds (0.5 ms to 5 s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram - constant memory however long the service runs.
+
+    Not locked on its own; ``Metrics`` serializes access.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.bounds: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        # A value equal to a bound belongs to that bucket, as Prometheus' "le" label says
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimated q-quantile in seconds, interpolated linearly inside the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - cumulative) / count, self.max)
+            cumulative += count
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class StageTimer:
+    """Context manager timing one stage with the monotonic performance counter"""
+
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics: "Metrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Per-stage timing histograms and event counters of the recognition loop.
+
+    Recording is a bisect and a few additions under one lock, about a
+    microsecond; percentiles, Prometheus text and log lines are only computed
+    when someone asks for them. Counters only ever go up, for the lifetime of
+    the process.
+    """
+
+    def __init__(self, prefix: str = "fras", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.started_at = time.monotonic()
+        # Counter values at the last log line, for per-interval rates
+        self.logged_at = self.started_at
+        self.logged_counters: Dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def time(self, stage: str) -> StageTimer:
+        """``with metrics.time("detect"): ...`` records the block's duration under the stage"""
+        return StageTimer(self, stage)
+
+    def inc(self, counter: str, amount: int = 1):
+        if amount:
+            with self.lock:
+                self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.snapshot() for stage, histogram in self.stages.items()}
+            }
+
+    def prometheus_text(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        base = ",".join(f'{key}="{_escape(value)}"' for key, value in (labels or {}).items())
+
+        def label_set(*pairs: str) -> str:
+            parts = [part for part in (base, *pairs) if part]
+            return "{" + ",".join(parts) + "}" if parts else ""
+
+        name = f"{self.prefix}_stage_seconds"
+        lines = [
+            f"# HELP {self.prefix}_uptime_seconds Seconds since the metrics were created",
+            f"# TYPE {self.prefix}_uptime_seconds gauge",
+            f"{self.prefix}_uptime_seconds{label_set()} {time.monotonic() - self.started_at:.3f}",
+            f"# HELP {name} Time spent in each recognition stage",
+            f"# TYPE {name} histogram"
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.stages.items()):
+                stage_label = f'stage="{_escape(stage)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{name}_bucket{label_set(stage_label, le)} {cumulative}")
+                lines.append(f"{name}_sum{label_set(stage_label)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{label_set(stage_label)} {histogram.count}")
+
+            for counter, value in sorted(self.counters.items()):
+                metric = f"{self.prefix}_{counter}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{label_set()} {value}")
+        return "\n".join(lines) + "\n"
+
+    def log_line(self) -> str:
+        """One line for the periodic log: counters with their rate since the last line, then stage p50/p95"""
+        now = time.monotonic()
+        with self.lock:
+            elapsed = max(now - self.logged_at, 1e-9)
+            counters = []
+            for counter, value in sorted(self.counters.items()):
+                delta = value - self.logged_counters.get(counter, 0)
+                counters.append(f"{counter}={value} ({delta / elapsed:.1f}/s)")
+            stages = [f"{stage} {histogram.quantile(0.5) * 1000:.1f}/{histogram.quantile(0.95) * 1000:.1f}ms"
+                      for stage, histogram in self.stages.items()]
+            self.logged_at = now
+            self.logged_counters = dict(self.counters)
+        return f"metrics: {', '.join(counters) or 'no events'} | p50/p95: {', '.join(stages) or 'no stages timed'}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def benchmark(repeats: int = 200000, frame_ms: float = 66.0, timers_per_frame: int = 12):
+    """Cost of recording, and its share of a frame with a typical number of timed stages and counters"""
+    metrics = Metrics()
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        metrics.observe("detect", 0.012)
+    observe_us = (time.perf_counter() - started) / repeats * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        with metrics.time("match"):
+            pass
+    timer_us = (time.perf_counter() - started) / repeats * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        metrics.inc("frames_processed")
+    inc_us = (time.perf_counter() - started) / repeats * 1e6
+
+    per_frame_us = timers_per_frame * (timer_us + inc_us)
+    print(f"observe {observe_us:.2f} us, timed block {timer_us:.2f} us, counter {inc_us:.2f} us")
+    print(f"{timers_per_frame} timed stages and counters per frame: {per_frame_us:.1f} us "
+          f"= {per_frame_us / (frame_ms * 1000) * 100:.3f}% of a {frame_ms:.0f} ms frame")
+
+    started = time.perf_counter()
+    text = metrics.prometheus_text()
+    print(f"prometheus text: {len(text)} bytes in {(time.perf_counter() - started) * 1000:.2f} ms")
+    print(metrics.log_line())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Overhead of recognition metrics recording")
+    parser.add_argument("--repeats", type=int, default=200000)
+    parser.add_argument("--frame-ms", type=float, default=66.0, help="Processing time of one frame")
+    parser.add_argument("--timers-per-frame", type=int, default=12)
+    args = parser.parse_args()
+
+    benchmark(args.repeats, args.frame_ms, args.timers_per_frame)
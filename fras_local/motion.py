@@ -0,0 +1,77 @@
+# motion.py
+from typing import Dict
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap motion check on a tiny gray thumbnail, used to skip face detection on an empty scene.
+
+    Each frame is shrunk to ``width`` pixels across and compared with a
+    running-average background; it counts as motion when more than
+    ``area_threshold`` of the pixels changed by over ``pixel_threshold`` gray
+    levels. The gate stays open for ``hold_seconds`` after the last motion so a
+    person who stops in front of the camera is still processed.
+    """
+
+    def __init__(self, width: int = 64, pixel_threshold: float = 12, area_threshold: float = 0.01,
+                 hold_seconds: float = 2.0, learning_rate: float = 0.05, now: float = 0.0):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.area_threshold = area_threshold
+        self.hold_seconds = hold_seconds
+        self.learning_rate = learning_rate
+
+        self.background = None
+        self.last_motion_at = now   # start open so the first frames are processed
+        self.moving = True
+        self.motion_level = 0.0     # fraction of thumbnail pixels that changed on the last frame
+
+        # Stats
+        self.checked = 0
+        self.skipped = 0
+
+    def thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(round(height * self.width / width))))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def update(self, frame: np.ndarray, now: float) -> bool:
+        """Compare a frame with the background; returns whether the gate is open"""
+        gray = self.thumbnail(frame)
+        if self.background is None or self.background.shape != gray.shape:
+            # First frame, or the capture resolution changed - start a new background
+            self.background = gray
+            self.motion_level = 0.0
+        else:
+            diff = np.abs(gray - self.background)
+            self.motion_level = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            # Slow changes such as daylight fade into the background
+            self.background += self.learning_rate * (gray - self.background)
+
+        if self.motion_level >= self.area_threshold:
+            self.last_motion_at = now
+        self.moving = now - self.last_motion_at < self.hold_seconds
+        return self.moving
+
+    def still_seconds(self, now: float) -> float:
+        """How long nothing has moved"""
+        return now - self.last_motion_at
+
+    def record(self, skipped: bool):
+        """Count a frame that would otherwise have been processed"""
+        self.checked += 1
+        self.skipped += int(skipped)
+
+    def get_stats(self) -> Dict:
+        return {
+            "moving": self.moving,
+            "motion_level": round(self.motion_level, 4),
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skipped_percent": round(100.0 * self.skipped / self.checked, 1) if self.checked else 0.0
+        }
@@ -0,0 +1,333 @@
+# pipeline.py
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StageQueue:
+    """Bounded queue between pipeline stages.
+
+    Producers never block: when the queue is full the oldest item is dropped,
+    so consumers always work on the freshest data under overload.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.dropped = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float):
+        """Next item, or raises queue.Empty after timeout"""
+        return self.queue.get(timeout=timeout)
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def clear(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class FairQueue:
+    """Per-source lanes in front of one stage, served so every source gets a fair share of the stage's time.
+
+    Each lane keeps only its newest ``lane_size`` items. ``get`` hands out the
+    next item of the waiting lane that has used the least stage time recently,
+    and a lane is not served again until ``done`` is called for its previous
+    item, so one source's items stay in order even with several workers.
+    """
+
+    def __init__(self, name: str, lane_size: int = 1, decay: float = 0.9):
+        self.name = name
+        self.lane_size = max(1, lane_size)
+        self.decay = decay
+        self.condition = threading.Condition()
+        self.lanes: Dict[Hashable, deque] = {}
+        self.usage: Dict[Hashable, float] = {}       # decayed stage seconds per lane
+        self.served_at: Dict[Hashable, int] = {}     # breaks ties round-robin
+        self.lane_dropped: Dict[Hashable, int] = {}
+        self.busy = set()
+        self.dropped = 0
+        self._turns = itertools.count()
+
+    def add_lane(self, key: Hashable):
+        with self.condition:
+            self.lanes.setdefault(key, deque())
+            self.usage.setdefault(key, 0.0)
+            self.served_at.setdefault(key, -1)
+            self.lane_dropped.setdefault(key, 0)
+
+    def put(self, key: Hashable, item):
+        self.add_lane(key)
+        with self.condition:
+            lane = self.lanes[key]
+            if len(lane) >= self.lane_size:
+                lane.popleft()
+                self.dropped += 1
+                self.lane_dropped[key] += 1
+            lane.append(item)
+            self.condition.notify()
+
+    def get(self, timeout: float):
+        """Next item of the least-served waiting lane, or raises queue.Empty after timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                ready = [key for key, lane in self.lanes.items() if lane and key not in self.busy]
+                if ready:
+                    key = min(ready, key=lambda k: (self.usage[k], self.served_at[k]))
+                    self.busy.add(key)
+                    self.served_at[key] = next(self._turns)
+                    return self.lanes[key].popleft()
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Empty
+                self.condition.wait(remaining)
+
+    def done(self, key: Hashable, seconds: float = 0.0):
+        """Release a lane after its item was handled, charging it the time spent"""
+        with self.condition:
+            self.busy.discard(key)
+            self.charge(key, seconds)
+            self.condition.notify()
+
+    def charge(self, key: Hashable, seconds: float):
+        """Add stage time to a lane (e.g. from a later stage); all lanes decay so old usage fades"""
+        with self.condition:
+            for lane_key in self.usage:
+                self.usage[lane_key] *= self.decay
+            self.usage[key] = self.usage.get(key, 0.0) + seconds
+
+    def wait_idle(self, key: Hashable, timeout: float) -> bool:
+        """Wait until a lane has nothing waiting or in flight; returns False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.lanes.get(key) or key in self.busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def depth(self) -> int:
+        with self.condition:
+            return sum(len(lane) for lane in self.lanes.values())
+
+    def clear(self):
+        with self.condition:
+            for lane in self.lanes.values():
+                lane.clear()
+            self.busy.clear()
+
+    def lane_stats(self, key: Hashable) -> Dict:
+        with self.condition:
+            return {
+                "depth": len(self.lanes.get(key, ())),
+                "dropped": self.lane_dropped.get(key, 0),
+                "usage_ms": round(self.usage.get(key, 0.0) * 1000, 2)
+            }
+
+
+class FramePacket:
+    """One camera frame and everything computed for it on its way through the pipeline"""
+
+    def __init__(self, frame, index: int, camera=None):
+        self.frame = frame
+        self.index = index
+        self.camera = camera    # CameraStream the frame came from
+        self.position = None    # frame number in a replayed recording
+        self.captured_at = time.perf_counter()
+
+        self.tracks = []        # face tracks on this frame
+        self.boxes = []         # their boxes on this frame (tracks keep moving while later stages run)
+        self.encode_jobs = []   # (track, future) for tracks that are being re-identified
+        self.verified = []      # tracks that passed the blink check on this frame
+        self.display_frame = None
+        self.processing_seconds = 0.0  # time spent in the detect and match stages
+
+
+class StageStats:
+    """Throughput and latency of one pipeline stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.forwarded = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+        self.avg_seconds = 0.0  # exponential moving average
+
+    def record(self, seconds: float, forwarded: bool = True):
+        with self.lock:
+            self.processed += 1
+            self.forwarded += int(forwarded)
+            self.total_seconds += seconds
+            self.last_seconds = seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self.avg_seconds = seconds if self.processed == 1 else 0.9 * self.avg_seconds + 0.1 * seconds
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                "processed": self.processed,
+                "forwarded": self.forwarded,
+                "avg_ms": round(self.avg_seconds * 1000, 2),
+                "last_ms": round(self.last_seconds * 1000, 2),
+                "max_ms": round(self.max_seconds * 1000, 2)
+            }
+
+
+class Stage:
+    """A named step run by one or more threads, reading from an input queue and writing to an output queue"""
+
+    def __init__(self, name: str, func: Callable, input_queue: Optional[StageQueue] = None,
+                 output_queue: Optional[StageQueue] = None, workers: int = 1, idle: Optional[Callable] = None):
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.workers = max(1, workers)
+        self.idle = idle
+        self.stats = StageStats()
+
+
+class Pipeline:
+    """Threads connected by bounded queues.
+
+    A stage without an input queue is a source and its function is called in
+    a loop. Stage functions return the item for the next stage, or None to
+    pass nothing on (dropped, filtered or finished).
+    """
+
+    def __init__(self, name: str = "pipeline", poll_seconds: float = 0.1):
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self.stages: List[Stage] = []
+        self.queues: List[StageQueue] = []
+        self.threads: List[threading.Thread] = []
+        self.stop_event = threading.Event()
+        self.active_lock = threading.Lock()
+        self.active = 0  # stage calls running right now
+
+    def queue(self, name: str, maxsize: int) -> StageQueue:
+        stage_queue = StageQueue(name, maxsize)
+        self.queues.append(stage_queue)
+        return stage_queue
+
+    def fair_queue(self, name: str, lane_size: int = 1) -> FairQueue:
+        fair_queue = FairQueue(name, lane_size)
+        self.queues.append(fair_queue)
+        return fair_queue
+
+    def add_stage(self, name: str, func: Callable, input_queue: Optional[StageQueue] = None,
+                  output_queue: Optional[StageQueue] = None, workers: int = 1,
+                  idle: Optional[Callable] = None) -> Stage:
+        stage = Stage(name, func, input_queue, output_queue, workers, idle)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        self.stop_event.clear()
+        for stage in self.stages:
+            for index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_stage, args=(stage,), daemon=True,
+                    name=f"{self.name}-{stage.name}-{index}"
+                )
+                self.threads.append(thread)
+                thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=max(0.0, deadline - time.time()))
+        self.threads = []
+        for stage_queue in self.queues:
+            stage_queue.clear()
+
+    def is_running(self) -> bool:
+        return any(thread.is_alive() for thread in self.threads)
+
+    def drain(self, timeout: float) -> bool:
+        """Wait until every queue is empty and no stage is working, e.g. after a replay source ended"""
+        deadline = time.monotonic() + timeout
+        idle_polls = 0
+        # Two idle polls in a row, so an item just taken off a queue is not missed
+        while idle_polls < 2:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(self.poll_seconds)
+            idle = self.active == 0 and all(stage_queue.depth() == 0 for stage_queue in self.queues)
+            idle_polls = idle_polls + 1 if idle else 0
+        return True
+
+    def _run_stage(self, stage: Stage):
+        while not self.stop_event.is_set():
+            if stage.input_queue is not None:
+                try:
+                    item = stage.input_queue.get(timeout=self.poll_seconds)
+                except queue.Empty:
+                    if stage.idle:
+                        self._call(stage, stage.idle)
+                    continue
+                args = (item,)
+            else:
+                args = ()
+
+            with self.active_lock:
+                self.active += 1
+            try:
+                started = time.perf_counter()
+                result = self._call(stage, stage.func, *args)
+                stage.stats.record(time.perf_counter() - started, result is not None)
+
+                if result is not None and stage.output_queue is not None:
+                    stage.output_queue.put(result)
+            finally:
+                with self.active_lock:
+                    self.active -= 1
+
+    def _call(self, stage: Stage, func: Callable, *args):
+        try:
+            return func(*args)
+        except Exception as e:
+            logger.error(f"Error in {stage.name} stage: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+
+    def get_stats(self) -> Dict:
+        """Per-stage input queue depth, drops and latency"""
+        stats = {}
+        for stage in self.stages:
+            entry = stage.stats.snapshot()
+            if stage.input_queue is not None:
+                entry["queue_depth"] = stage.input_queue.depth()
+                entry["queue_dropped"] = stage.input_queue.dropped
+            stats[stage.name] = entry
+        return stats
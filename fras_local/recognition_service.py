@@ -10,15 +10,30 @@ import numpy as np
 import cv2
 import face_recognition
 import dlib
-from scipy.spatial import distance as dist
 import requests
 import base64
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import io
 from PIL import Image
 import logging
 
+from attendance_dispatcher import AttendanceDispatcher, AttendanceEvent
+from attendance_outbox import AttendanceOutbox, OutboxReplayer, move_outbox
+from attendance_state import AttendanceState
+from camera import CameraStream, parse_camera_list
+from config import Config
+from detectors import parse_detector_spec
+from encoding_cache import EncodingCache, FACE_ENCODING_MODEL
+from enrollment import encode_images
+from face_gallery import FaceGallery
+from liveness import eye_aspect_ratios, shapes_to_array
+from metrics import Metrics
+from pipeline import FramePacket, Pipeline
+from roi import filter_small_boxes, offset_boxes, parse_roi, roi_bounds
+from shared_gallery import SharedGalleryPublisher
+
 logger = logging.getLogger(__name__)
 
 KIGALI_TZ = zoneinfo.ZoneInfo("Africa/Kigali")
@@ -43,23 +58,24 @@ class RecognitionService:
         self.recognition_thread = None
         self.stop_event = threading.Event()
         
-        # Database client and authentication
+        # Configuration and database client
+        self.config = Config()
         self.db_client = None
         self.token = None
         self.company = None
         
-        # Facial recognition setup
-        self.detector = None
+        # Facial recognition setup - faces are found by face_recognition, landmarks by the 68-point predictor
         self.predictor = None
         
         # Face data
         self.known_face_encodings = []
         self.known_face_names = []
         self.employee_data = {}
+        self.encoding_cache = None
+        self.gallery = FaceGallery()
+        self.gallery_publisher = None
         
-        # Tracking variables
-        self.person_blink_count = {}
-        self.eye_closed_frames = {}
+        # Tracking variables - face tracks and their blink state are kept per camera
         self.last_detection_time = {}
         self.last_processing_time = {}  # Add throttling for processing
         # Store employee IDs instead of database objects
@@ -71,22 +87,47 @@ class RecognitionService:
         self.CHECKOUT_DELAY_MINUTES = 0.3
         self.face_tolerance = 0.6
         
-        # Camera
-        self.video_capture = None
+        # Cameras - the one from the server settings first, then any extra local cameras
+        self.cameras: List[CameraStream] = []
         self.camera_source = "0"
         self.camera_type = "Webcam"
         
+        # Detection area and smallest face worth encoding, from the camera settings
+        self.detection_roi = None
+        self.min_face_size = 0
+        self.face_detector = self.config.FACE_DETECTION_MODEL
+        
         # Preview window control
         self.show_preview = True
+        
+        # Optional callable(message) for progress of long steps such as enrollment, set by the GUI
+        self.progress_callback = None
 
         # streaming
-        self.frame_lock = threading.Lock()
-        self.latest_frame = None
         self.streaming_clients = set()
+        
+        # Recognition pipeline: capture (one thread per camera) -> detect -> match, which publishes verified faces
+        # to the attendance dispatcher - the only thread that talks to the server while recognition runs
+        self.pipeline = None
+        self.capture_queue = None
+        self.match_queue = None
+        self.dispatcher = None
+        self.outbox = None              # durable check-in/check-out events, sent by the outbox replayer
+        self.outbox_replayer = None
+        self.frame_recorder = None  # replay.FrameRecorder for offline runs
+        
+        # Today's latest attendance record per employee name for the overlay and decisions, updated from our
+        # own writes and synced in the background by the attendance dispatcher
+        self.attendance_state = AttendanceState()
+        self.attendance_status_at = 0.0  # monotonic time of the last sync attempt
+        
+        # Per-stage timings and frame, face and attendance counters for get_status() and the periodic log line
+        self.metrics = Metrics()
     
     def set_database_client(self, db_client):
         """Set the database client for API communication"""
         self.db_client = db_client
+        self.config = db_client.config
     
     def authenticate(self, email: str, password: str) -> dict:
         """Authenticate with the server"""
@@ -121,8 +162,6 @@ class RecognitionService:
                 return False
             
             # Initialize dlib components
-            self.detector = dlib.get_frontal_face_detector()
-            
             try:
                 self.predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
             except Exception as e:
@@ -139,12 +178,14 @@ class RecognitionService:
                 self.camera_type = settings.get("camera_type", "Webcam")
                 logger.info(f"Loaded camera settings: source={self.camera_source}, blink_threshold={self.BLINK_THRESHOLD}")
             
+            self.load_detection_area(settings or {})
+            
             # Load employee data and images
             if not self.load_employee_data():
                 return False
             
-            # Initialize camera
-            if not self.initialize_camera():
+            # Open every camera, each with fresh tracks
+            if not self.initialize_cameras():
                 return False
             
             # Create initial attendance records
@@ -157,17 +198,108 @@ class RecognitionService:
             logger.error(f"Error initializing recognition: {e}")
             return False
 
+    def load_detection_area(self, settings: Dict):
+        """Detection ROI, minimum face size and detector from the camera settings, falling back to the local config"""
+        try:
+            self.detection_roi = parse_roi(settings.get("detection_roi") or self.config.DETECTION_ROI)
+        except ValueError as e:
+            logger.warning(f"Ignoring invalid detection ROI: {e}")
+            self.detection_roi = None
+        self.min_face_size = settings.get("min_face_size") or self.config.MIN_FACE_SIZE
+        
+        if self.detection_roi or self.min_face_size:
+            logger.info(f"Detection area: roi={self.detection_roi or 'whole frame'}, min face size={self.min_face_size}px")
+        
+        self.face_detector = settings.get("face_detector") or self.config.FACE_DETECTION_MODEL
+        try:
+            parse_detector_spec(self.face_detector)
+        except ValueError as e:
+            logger.warning(f"Ignoring face detector from the camera settings: {e}")
+            self.face_detector = self.config.FACE_DETECTION_MODEL
+    
     def load_employee_data(self) -> bool:
         """Load employee data and face encodings from server"""
         try:
-            employee_images = self.db_client.get_employee_images()
+            self.known_face_encodings = []
+            self.known_face_names = []
+            self.employee_data = {}
+            
+            # Prefer encodings computed by the server at upload time - no images to download or encode
+            server_encodings = self.load_server_encodings()
+            pending_ids, known_ids = server_encodings if server_encodings else (None, None)
+            
+            # Fall back to images for everything (older server) or for employees the server could not encode
+            if pending_ids is None or pending_ids:
+                self.load_employee_images(pending_ids, known_ids)
+            
+            # Nearest-neighbour index used for batched matching in the recognition loop
+            self.gallery = self.build_gallery()
+            self.publish_gallery()
+            
+            logger.info(f"Loaded {len(self.known_face_names)} employee face encodings")
+            return len(self.known_face_names) > 0
+            
+        except Exception as e:
+            logger.error(f"Failed to load employee data: {e}")
+            return False
+    
+    def load_server_encodings(self) -> Optional[Tuple[set, set]]:
+        """Load float32 encodings from the server.
+        
+        Returns (ids still needing images, ids of every employee with an image), or None if unavailable.
+        """
+        encodings_data = self.db_client.get_employee_encodings()
+        if not encodings_data:
+            return None
+        
+        if encodings_data.get("model") != FACE_ENCODING_MODEL:
+            logger.warning(f"Server encodings use model {encodings_data.get('model')}, expected {FACE_ENCODING_MODEL}")
+            return None
+        
+        for emp_data in encodings_data.get("employees", []):
+            try:
+                encoding = np.frombuffer(base64.b64decode(emp_data["encoding"]), dtype="<f4").astype(np.float64)
+                self.add_known_face(emp_data["employee_name"], emp_data["employee_id"], encoding)
+            except Exception as e:
+                logger.error(f"Error loading encoding for {emp_data.get('employee_name', 'Unknown')}: {e}")
+        
+        for employee_id in encodings_data.get("no_face", []):
+            logger.warning(f"No face found in image for employee ID {employee_id}")
+        
+        logger.info(f"Loaded {len(self.known_face_names)} encodings from server")
+        pending = set(encodings_data.get("pending", []))
+        known = {emp_data["employee_id"] for emp_data in encodings_data.get("employees", [])}
+        known.update(encodings_data.get("no_face", []), pending)
+        return pending, known
+    
+    def add_known_face(self, name: str, employee_id: int, encoding: np.ndarray):
+        """Register an employee face encoding for matching"""
+        self.known_face_encodings.append(encoding)
+        self.known_face_names.append(name)
+        self.employee_data[name] = {
+            'id': employee_id,
+            'name': name
+        }
+        logger.info(f"Loaded face encoding for {name} (ID: {employee_id})")
+    
+    def load_employee_images(self, only_ids: Optional[set] = None, known_ids: Optional[set] = None) -> bool:
+        """Download employee images and encode them locally, optionally only for the given employee ids.
+        
+        known_ids - every employee that still has an image - lets the encoding
+        cache forget the others; without it, a full download tells.
+        """
+        try:
+            employee_images = self.db_client.get_employee_images(only_ids)
             if not employee_images:
                 logger.error("No employee images found")
                 return False
             
-            self.known_face_encodings = []
-            self.known_face_names = []
-            self.employee_data = {}
+            # Reuse encodings from previous runs for photos that have not changed
+            self.encoding_cache = EncodingCache(self.get_encoding_cache_dir())
+            self.encoding_cache.load()
+            
+            roster = []     # (employee_id, name, image_hash, cached, encoding) in server order
+            to_encode = []  # (employee_id, image bytes) for new or changed photos
             
             for emp_data in employee_images:
                 try:
@@ -175,130 +307,158 @@ class RecognitionService:
                     employee_id = emp_data["employee_id"]
                     image_base64 = emp_data["image_base64"]
                     
+                    if only_ids is not None and employee_id not in only_ids:
+                        continue
+                    
                     if not image_base64:
                         logger.warning(f"No image data for {name}")
                         continue
                     
                     # Decode base64 image
                     image_data = base64.b64decode(image_base64)
-                    image = Image.open(io.BytesIO(image_data))
-                    image_np = np.array(image)
+                    image_hash = self.encoding_cache.hash_image(image_data)
+                    cached, encoding = self.encoding_cache.lookup(employee_id, image_hash)
                     
-                    # Convert to RGB if needed
-                    if len(image_np.shape) == 3 and image_np.shape[2] == 3:
-                        image_rgb = image_np
-                    else:
-                        image_rgb = cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB)
-                    
-                    # Get face encodings
-                    encodings = face_recognition.face_encodings(image_rgb)
-                    
-                    if encodings:
-                        self.known_face_encodings.append(encodings[0])
-                        self.known_face_names.append(name)
-                        self.employee_data[name] = {
-                            'id': employee_id,
-                            'name': name
-                        }
-                        logger.info(f"Loaded face encoding for {name} (ID: {employee_id})")
-                    else:
-                        logger.warning(f"No face found in image for {name}")
+                    roster.append((employee_id, name, image_hash, cached, encoding))
+                    if not cached:
+                        to_encode.append((employee_id, image_data))
                         
                 except Exception as e:
                     logger.error(f"Error processing employee {emp_data.get('employee_name', 'Unknown')}: {e}")
                     continue
             
-            logger.info(f"Loaded {len(self.known_face_names)} employee face encodings")
-            return len(self.known_face_names) > 0
-            
-        except Exception as e:
-            logger.error(f"Failed to load employee data: {e}")
-            return False
-
-    def initialize_camera(self) -> bool:
-        """Initialize camera capture"""
-        try:
-            # Use DirectShow backend for Windows
-            if isinstance(self.camera_source, int):
-                self.video_capture = cv2.VideoCapture(self.camera_source, cv2.CAP_DSHOW)
-            else:
-                if str(self.camera_source).isdigit():
-                    self.video_capture = cv2.VideoCapture(int(self.camera_source), cv2.CAP_DSHOW)
-                else:
-                    self.video_capture = cv2.VideoCapture(self.camera_source, cv2.CAP_DSHOW)
+            # Encode new and changed photos across all cores
+            encoded = {}
+            if to_encode:
+                workers = self.config.ENROLLMENT_WORKERS
+                logger.info(f"Encoding {len(to_encode)} employee photos with up to {workers} worker processes")
+                started = time.perf_counter()
+                
+                for employee_id, encoding, seconds, error in encode_images(
+                    to_encode, workers, self.config.ENROLLMENT_CHUNK_SIZE, self.report_enrollment_progress
+                ):
+                    encoded[employee_id] = (encoding, seconds, error)
+                
+                logger.info(f"Encoded {len(to_encode)} employee photos in {time.perf_counter() - started:.1f}s")
             
-            if not self.video_capture.isOpened():
-                logger.error(f"Cannot open camera: {self.camera_source}")
-                # Try without DirectShow backend as fallback
-                if isinstance(self.camera_source, int):
-                    self.video_capture = cv2.VideoCapture(self.camera_source)
-                else:
-                    self.video_capture = cv2.VideoCapture(int(self.camera_source) if str(self.camera_source).isdigit() else self.camera_source)
+            for employee_id, name, image_hash, cached, encoding in roster:
+                if not cached:
+                    encoding, seconds, error = encoded[employee_id]
+                    if error:
+                        # Not cached, so the next start tries this photo again
+                        logger.error(f"Error processing employee {name}: {error}")
+                        continue
+                    self.encoding_cache.store(employee_id, image_hash, encoding, seconds)
                 
-                if not self.video_capture.isOpened():
-                    logger.error(f"Cannot open camera even without DirectShow: {self.camera_source}")
-                    return False
-            
-            # Set camera properties
-            self.video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-            self.video_capture.set(cv2.CAP_PROP_FPS, 30)
-            self.video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            
-            # Test frame capture
-            ret, test_frame = self.video_capture.read()
-            if not ret:
-                logger.error("Cannot read test frame from camera")
-                return False
+                if encoding is not None:
+                    self.add_known_face(name, employee_id, encoding)
+                else:
+                    logger.warning(f"No face found in image for {name}")
             
-            logger.info(f"Camera initialized successfully: {self.camera_source}")
-            logger.info(f"Frame size: {test_frame.shape[1]}x{test_frame.shape[0]}")
+            if known_ids is None and only_ids is None:
+                known_ids = {emp_data["employee_id"] for emp_data in employee_images}
+            self.encoding_cache.save(known_ids)
+            logger.info(self.encoding_cache.stats_line())
             return True
             
         except Exception as e:
-            logger.error(f"Failed to initialize camera: {e}")
+            logger.error(f"Failed to load employee images: {e}")
             return False
+    
+    def report_enrollment_progress(self, done: int, total: int):
+        """Progress of photo encoding: every step to the GUI, every 10% to the log"""
+        message = f"Encoding employee photos: {done}/{total}"
+        if done == total or done * 10 // total != (done - 1) * 10 // total:
+            logger.info(message)
+        
+        if self.progress_callback:
+            try:
+                self.progress_callback(message)
+            except Exception as e:
+                logger.debug(f"Progress callback failed: {e}")
 
+    def build_gallery(self) -> FaceGallery:
+        """Index the loaded encodings; approximate indexes are persisted next to the encoding cache"""
+        index_type = self.config.FACE_INDEX_TYPE
+        index_params = {}
+        index_path = None
+        
+        if index_type != "exact":
+            index_params = {"nprobe": self.config.FACE_INDEX_NPROBE}
+            index_path = os.path.join(self.get_encoding_cache_dir(), f"face_index_{index_type}.npz")
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        
+        started = time.time()
+        gallery = FaceGallery(self.known_face_encodings, self.known_face_names,
+                              index_type=index_type, index_params=index_params, index_path=index_path)
+        logger.info(f"Face index ready: {index_type}, {len(gallery)} faces, "
+                    f"{gallery.index.memory_bytes() / 1024:.0f} KB in {time.time() - started:.2f}s")
+        return gallery
+    
+    def publish_gallery(self):
+        """Publish the gallery for recognition worker processes, which pick up each new generation without a restart"""
+        if not self.config.SHARED_GALLERY_DIR:
+            return
+        
+        try:
+            if self.gallery_publisher is None:
+                self.gallery_publisher = SharedGalleryPublisher(self.config.SHARED_GALLERY_DIR)
+            self.gallery_publisher.publish_gallery(self.gallery)
+        except Exception as e:
+            logger.warning(f"Could not publish the shared gallery: {e}")
+    
+    def get_encoding_cache_dir(self) -> str:
+        """Per-company directory for the on-disk encoding cache"""
+        company_dir = "".join(c if c.isalnum() else "_" for c in str(self.company or "default"))
+        return os.path.join(self.config.ENCODING_CACHE_DIR, company_dir)
+    
+    def initialize_cameras(self) -> bool:
+        """Open the camera from the server settings and any extra local cameras; fails only if none opens"""
+        self.release_cameras()
+        
+        cameras = [CameraStream("main", self.camera_source, self.camera_type, self.config,
+                                self.detection_roi, self.min_face_size, self.face_detector)]
+        
+        # Extra cameras use the local detection area settings and their own detector, if given
+        try:
+            local_roi = parse_roi(self.config.DETECTION_ROI)
+        except ValueError:
+            local_roi = None
+        for name, source, detector in parse_camera_list(self.config.EXTRA_CAMERAS):
+            cameras.append(CameraStream(name, source, name, self.config, local_roi, self.config.MIN_FACE_SIZE, detector))
+        
+        self.cameras = [camera for camera in cameras if camera.open()]
+        if not self.cameras:
+            logger.error("No camera could be opened")
+            return False
+        
+        logger.info(f"{len(self.cameras)} camera(s) ready: {', '.join(camera.name for camera in self.cameras)}")
+        return True
+    
+    def release_cameras(self):
+        for camera in self.cameras:
+            camera.release()
+    
     def create_initial_attendance_records(self):
         """Create attendance records for all employees with status 'absent'"""
         try:
-            current_date = datetime.now(KIGALI_TZ).date()
+            current_date = self.get_current_time().date()
             logger.info(f"Creating attendance records for date: {current_date}")
-            logger.info(f"Employee data available: {list(self.employee_data.keys())}")
             
+            # One request creates every missing absent record and returns the day's state for the local table
+            self.open_outbox()
+            self.attendance_state = AttendanceState()
+            day = self.db_client.initialize_attendance_day(current_date, self.camera_type)
+            if day is not None:
+                self.load_attendance_state(day.get("records", []), current_date, day.get("cursor"))
+                logger.info(f"Created {day.get('created', 0)} new attendance records")
+            else:
+                logger.error("Could not initialize today's attendance records; loading the existing ones")
+                self.refresh_attendance_status(force=True)
+            
+            # Store employee IDs instead of database objects
             for employee_name, employee_info in self.employee_data.items():
-                try:
-                    # Check if record already exists for today via API
-                    today_data = self.db_client.get_today_attendance()
-                    existing_record = None
-                    
-                    if today_data and "records" in today_data:
-                        for record in today_data["records"]:
-                            if record.get("name") == employee_name:
-                                existing_record = record
-                                break
-                    
-                    if not existing_record:
-                        # Create new attendance record with only basic info
-                        attendance_data = {
-                            "employee_id": employee_info['id'],
-                            "status": "absent",
-                            "camera_used": self.camera_type
-                        }
-                        
-                        if self.db_client.create_attendance_record(attendance_data):
-                            # Store employee ID instead of database object
-                            self.attendance_employee_ids[employee_name] = employee_info['id']
-                            logger.info(f"Created new attendance record for {employee_name}")
-                        else:
-                            logger.error(f"Failed to create attendance record for {employee_name}")
-                    else:
-                        self.attendance_employee_ids[employee_name] = employee_info['id']
-                        logger.info(f"Found existing attendance record for {employee_name} - Status: {existing_record.get('status', 'unknown')}")
-                        
-                except Exception as e:
-                    logger.error(f"Error creating record for {employee_name}: {e}")
-                    continue
+                self.attendance_employee_ids[employee_name] = employee_info['id']
             
             logger.info(f"Successfully created/loaded attendance records for {len(self.attendance_employee_ids)} employees")
                 
@@ -328,185 +488,368 @@ class RecognitionService:
         except Exception as e:
             logger.error(f"Error in debug: {e}")
         
-        logger.info(f"Blink counts: {self.person_blink_count}")
+        logger.info(f"Blink counts: { {(camera.name, track.track_id): (track.name, track.blink.blinks) for camera in self.cameras for track in camera.tracker.active_tracks()} }")
         logger.info(f"Last detection times: {self.last_detection_time}")
         logger.info("=== END DEBUG INFO ===")
     
-    def eye_aspect_ratio(self, eye):
-        """Calculate eye aspect ratio for blink detection"""
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        C = dist.euclidean(eye[0], eye[3])
-        ear = (A + B) / (2.0 * C)
-        return ear
-    
-    def detect_blink(self, shape, name):
-        """Detect blink for liveness verification"""
-        left_eye = shape[36:42]
-        right_eye = shape[42:48]
-        
-        left_ear = self.eye_aspect_ratio(left_eye)
-        right_ear = self.eye_aspect_ratio(right_eye)
-        ear = (left_ear + right_ear) / 2.0
-        
-        if name not in self.eye_closed_frames:
-            self.eye_closed_frames[name] = 0
-        
-        if ear < 0.25:  # Eyes closed
-            self.eye_closed_frames[name] += 1
-        else:  # Eyes open
-            if 1 <= self.eye_closed_frames[name] <= self.BLINK_DURATION_THRESHOLD:
-                self.person_blink_count[name] = self.person_blink_count.get(name, 0) + 1
-            self.eye_closed_frames[name] = 0
-        
-        return self.person_blink_count.get(name, 0) >= self.BLINK_THRESHOLD
-    
-    def update_attendance_record(self, employee_name: str, action: str) -> bool:
-        """Update attendance record via API - Updated logic for automatic check-in/check-out"""
-        try:
-            logger.info(f"Attempting to update attendance: {employee_name} - {action}")
+    def face_landmarks(self, image, face_locations, scale: int = 4) -> list:
+        """68-point landmarks on the full resolution image for face locations found on the downscaled frame"""
+        return [
+            self.predictor(image, dlib.rectangle(left * scale, top * scale, right * scale, bottom * scale))
+            for top, right, bottom, left in face_locations
+        ]
+    
+    def encode_faces(self, image, landmarks) -> list:
+        """Face encodings from precomputed landmarks - same result as face_recognition.face_encodings(model="large")"""
+        with self.metrics.time("encode"):
+            return [
+                np.array(face_recognition.api.face_encoder.compute_face_descriptor(image, shape, 1))
+                for shape in landmarks
+            ]
+    
+    def detect_blink(self, track, ear: float) -> bool:
+        """Detect blink for liveness verification from this frame's eye aspect ratio"""
+        blinks = track.blink.update(ear, self.config.EYE_AR_THRESHOLD, self.BLINK_DURATION_THRESHOLD)
+        return blinks >= self.BLINK_THRESHOLD
+    
+    def analyze_frame(self, packet: FramePacket, encoder: Optional[ThreadPoolExecutor] = None) -> FramePacket:
+        """Detect stage: track faces, compute landmarks and liveness, and start encodings where needed.
+        
+        The detector and encoder only run when the tracker asks for them, so a
+        person standing in front of the camera is not re-encoded every frame.
+        Runs on one thread because track association depends on frame order;
+        encodings go to ``encoder`` (computed inline without one).
+        """
+        camera = packet.camera
+        frame = packet.frame
+        now = time.monotonic()
+        
+        # Only this stage moves tracks, so the detector runs outside the lock
+        face_locations = None
+        if camera.tracker.should_detect():
+            # Downscale the detection area first, then enhance it only if the scene is dark
+            with self.metrics.time("preprocess"):
+                x0, y0, x1, y1 = roi_bounds(camera.detection_roi, frame.shape)
+                small_frame = camera.enhancer.apply(cv2.resize(frame[y0:y1, x0:x1], (0, 0), fx=0.25, fy=0.25))
+                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+            # Map boxes back to the (downscaled) whole frame
+            with self.metrics.time("detect"):
+                face_locations = offset_boxes(camera.detector.detect(rgb_small_frame), x0 // 4, y0 // 4)
+            # Distant passers-by are never tracked or encoded
+            face_locations = filter_small_boxes(face_locations, camera.min_face_size, scale=4)
+            self.metrics.inc("faces_detected", len(face_locations))
+        
+        with camera.track_lock:
+            if face_locations is not None:
+                camera.tracker.update(face_locations, now)
+            else:
+                camera.tracker.predict()
+            
+            tracks = camera.tracker.active_tracks()
             
+            # Encode only new, drifted or stale tracks; blink detection needs recognized faces with good confidence
+            to_encode = [track for track in tracks if camera.tracker.needs_encoding(track, now)]
+            for track in to_encode:
+                camera.tracker.request_encoding(track, now)
+            
+            encode_ids = {track.track_id for track in to_encode}
+            candidates = [track for track in tracks
+                          if track.track_id in encode_ids or (track.is_known and track.confidence > 0.4)]
+            live_tracks = [track for track in candidates if track.is_known and track.confidence > 0.4]
+        
+        packet.tracks = tracks
+        packet.boxes = [track.box for track in tracks]
+        
+        # One landmark pass per face at full resolution, shared by the encoder and blink detection.
+        # They use the unenhanced frame, like the enrollment photos.
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if candidates else None
+        landmarks = {}
+        if candidates:
+            with self.metrics.time("landmarks"):
+                landmarks = dict(zip(
+                    (track.track_id for track in candidates),
+                    self.face_landmarks(rgb_frame, [track.box for track in candidates])
+                ))
+        
+        for track in to_encode:
+            shapes = [landmarks[track.track_id]]
+            if encoder is not None:
+                job = encoder.submit(self.encode_faces, rgb_frame, shapes)
+            else:
+                job = Future()
+                job.set_result(self.encode_faces(rgb_frame, shapes))
+            packet.encode_jobs.append((track, job))
+        
+        # Liveness for recognized faces with good confidence - eye aspect ratios of all faces in one pass
+        if live_tracks:
+            with self.metrics.time("liveness"):
+                ears = eye_aspect_ratios(shapes_to_array([landmarks[track.track_id] for track in live_tracks])).mean(axis=1)
+            for track, ear in zip(live_tracks, ears):
+                # Check if person has blinked enough for liveness verification
+                if self.detect_blink(track, float(ear)):
+                    packet.verified.append(track)
+        
+        return packet
+    
+    def match_faces(self, packet: FramePacket) -> FramePacket:
+        """Match stage: collect encodings in frame order, match them in one pass and draw the overlay"""
+        camera = packet.camera
+        encoded, face_encodings = [], []
+        for track, job in packet.encode_jobs:
+            try:
+                face_encodings.append(job.result()[0])
+                encoded.append(track)
+            except Exception as e:
+                logger.error(f"Face encoding failed for track {track.track_id}: {e}")
+        
+        if encoded:
+            now = time.monotonic()
+            with self.metrics.time("match"):
+                matches = self.gallery.match(face_encodings)
+            
+            unknown = 0
+            with camera.track_lock:
+                for track, match in zip(encoded, matches):
+                    name = "Unknown"
+                    confidence = 0
+                    if match.index >= 0 and match.distance <= self.face_tolerance:
+                        name = self.gallery.names[match.index]
+                        confidence = 1 - match.distance
+                    else:
+                        unknown += 1
+                    
+                    if camera.tracker.set_identity(track, name, confidence, now):
+                        # Someone else now - liveness starts over
+                        track.blink.reset()
+            
+            self.metrics.inc("faces_encoded", len(encoded))
+            self.metrics.inc("faces_unknown", unknown)
+        
+        # Draw detection info on frame
+        with self.metrics.time("draw"):
+            packet.display_frame = self.draw_detection_info(packet.frame.copy(), packet.tracks, packet.boxes, camera)
+        
+        # Store frame for the preview and streaming (thread-safe)
+        camera.set_latest_frame(packet.display_frame)
+        
+        return packet
+    
+    def detect_stage(self, packet: FramePacket, encoder: ThreadPoolExecutor) -> Optional[FramePacket]:
+        camera = packet.camera
+        started = time.perf_counter()
+        try:
+            # Under overload, skip frames that waited too long rather than fall further behind
+            if started - packet.captured_at > self.config.PIPELINE_MAX_FRAME_AGE:
+                camera.stale_frames += 1
+                if self.frame_recorder:
+                    self.frame_recorder.skip(camera, packet.index, packet.position, "stale")
+                return None
+            packet = self.analyze_frame(packet, encoder)
+            packet.processing_seconds += time.perf_counter() - started
+            return packet
+        finally:
+            # Let this camera's next frame in, charged with the time this one took
+            self.capture_queue.done(camera.name, time.perf_counter() - started)
+    
+    def match_stage(self, packet: FramePacket) -> None:
+        camera = packet.camera
+        started = time.perf_counter()
+        packet = self.match_faces(packet)
+        now = time.perf_counter()
+        packet.processing_seconds += now - started
+        self.capture_queue.charge(camera.name, now - started)
+        camera.frame_latency.record(now - packet.captured_at)
+        self.metrics.observe("frame", packet.processing_seconds)
+        self.metrics.observe("end_to_end", now - packet.captured_at)
+        self.metrics.inc("frames_processed")
+        camera.frame_rate.frame_processed(packet.processing_seconds, len(packet.tracks), now)
+        if self.frame_recorder:
+            self.frame_recorder.record(packet, now)
+        
+        # Publish verified faces and move on; the dispatcher does the network calls and ignores faces already queued
+        if self.dispatcher:
+            for track in packet.verified:
+                if self.dispatcher.publish(AttendanceEvent(track.name, self.attendance_employee_ids.get(track.name),
+                                                           camera, track)):
+                    self.metrics.inc("faces_verified")
+    
+    def handle_attendance_event(self, event: AttendanceEvent) -> bool:
+        """Attendance dispatcher handler - runs on the dispatcher thread, never on a frame path"""
+        return self.process_verified_face(event.track, event.camera)
+    
+    def refresh_attendance_status(self, force: bool = False):
+        """Sync the attendance table when it is older than the refresh interval.
+        
+        Fetches only records created or changed since the last sync; the
+        whole day is downloaded again on the first sync, after midnight and
+        every ATTENDANCE_FULL_SYNC_SECONDS to correct any drift.
+        """
+        if not force and time.monotonic() - self.attendance_status_at < self.config.ATTENDANCE_STATUS_REFRESH_SECONDS:
+            return
+        if not self.db_client:
+            return  # offline replay
+        
+        self.attendance_status_at = time.monotonic()
+        state = self.attendance_state
+        today = self.get_current_time().date()
+        if state.needs_full_load(today, self.config.ATTENDANCE_FULL_SYNC_SECONDS):
+            with self.metrics.time("attendance_full_sync"):
+                today_data = self.db_client.get_today_attendance()
+            if today_data and "records" in today_data:
+                self.load_attendance_state(today_data["records"], today, today_data.get("cursor"))
+        else:
+            with self.metrics.time("attendance_delta_sync"):
+                today_data = self.db_client.get_today_attendance(updated_after=state.cursor)
+            if today_data and "records" in today_data:
+                state.apply(today_data["records"], synced=True, cursor=today_data.get("cursor"))
+    
+    def load_attendance_state(self, records: List[Dict], day, cursor: Optional[str] = None):
+        """Fill the attendance table with the whole day, then our events still waiting in the outbox"""
+        self.attendance_state.load(records, day, cursor)
+        if self.outbox:
+            for event in self.outbox.pending(self.company, limit=10000):
+                self.expect_attendance(event.employee_name, event.payload)
+    
+    def open_outbox(self) -> AttendanceOutbox:
+        if self.outbox is None:
+            move_outbox(self.config.LEGACY_OUTBOX_PATH, self.config.ATTENDANCE_OUTBOX_PATH)
+            self.outbox = AttendanceOutbox(self.config.ATTENDANCE_OUTBOX_PATH)
+        return self.outbox
+    
+    def start_outbox(self):
+        """Start sending the outbox's events, including any left from an earlier run"""
+        self.open_outbox()
+        self.outbox_replayer = OutboxReplayer(
+            self.outbox, self.db_client.send_attendance_event, on_sent=self.attendance_event_sent,
+            company=self.company, batch_size=self.config.OUTBOX_BATCH_SIZE,
+            max_backoff=self.config.OUTBOX_MAX_BACKOFF_SECONDS,
+            send_batch=self.db_client.send_attendance_events,
+            coalesce_seconds=self.config.OUTBOX_COALESCE_SECONDS
+        )
+        self.outbox_replayer.start()
+    
+    def stop_outbox(self):
+        if self.outbox_replayer:
+            self.outbox_replayer.stop()
+            self.outbox_replayer = None
+    
+    def record_attendance_event(self, employee_name: str, event_data: Dict) -> bool:
+        """Store an attendance event in the outbox and show its likely outcome locally; the replayer sends it to the server.
+        
+        Without the recognition loop the event is sent directly, and True means the server checked the employee in or out.
+        """
+        if self.outbox_replayer is None:
+            # Not running the recognition loop - send it directly
+            result, error = self.db_client.send_attendance_event(event_data)
+            if error is not None:
+                return False
+            self.attendance_event_sent(None, result)
+            return bool(result and result.get("recorded"))
+        
+        key = self.outbox.add(event_data, self.company, employee_name)
+        self.expect_attendance(employee_name, dict(event_data, idempotency_key=key))
+        self.outbox_replayer.wake()
+        return True
+    
+    def expect_attendance(self, employee_name: str, event_data: Dict):
+        """Show an event the server has not answered yet: an employee not checked in will be.
+        
+        Whether a sighting checks out depends on the arrival time the server
+        has, so a check-out only shows once the server has answered.
+        """
+        if "timestamp" not in event_data:
+            # Queued before the server decided transitions - the event is the record itself
+            self.attendance_state.set_local(employee_name, event_data)
+            return
+        record = self.attendance_state.get(employee_name) or {}
+        if not record.get("arrival_time") or record.get("status") == "absent":
+            self.attendance_state.set_local(employee_name, {
+                "employee_id": event_data["employee_id"],
+                "arrival_time": event_data["timestamp"],
+                "status": "present",
+                "camera_used": event_data.get("camera_used")
+            })
+    
+    def attendance_event_sent(self, event, result: Optional[Dict]):
+        """Outbox replayer callback: the server applied an event - its record replaces the local one"""
+        if not result:
+            return
+        if "action" not in result:
+            # Answer of the plain record endpoint to an event queued before the server decided transitions
+            self.attendance_state.apply([result])
+            return
+        
+        record = result["record"]
+        action = result["action"]
+        if action == "checkin":
+            logger.info(f"✓ {record.get('name')} automatically checked in at {record.get('arrival_time')}")
+            self.metrics.inc("attendance_checkins")
+        elif action == "checkout":
+            logger.info(f"✓ {record.get('name')} automatically checked out at {record.get('departure_time')} - Hours: {record.get('hours_worked')}")
+            self.metrics.inc("attendance_checkouts")
+        else:
+            logger.debug(f"Attendance event for {record.get('name')}: {action}")
+        self.attendance_state.apply([record])
+    
+    def create_pipeline(self, encoder: ThreadPoolExecutor) -> Pipeline:
+        """Stages behind the capture thread, connected by bounded queues that drop stale items"""
+        pipeline = Pipeline("recognition")
+        # Only each camera's newest frame waits for detection; cameras are served by least recent CPU time
+        self.capture_queue = pipeline.fair_queue("capture")
+        for camera in self.cameras:
+            self.capture_queue.add_lane(camera.name)
+        self.match_queue = match_queue = pipeline.queue("match", self.config.PIPELINE_QUEUE_SIZE)
+        
+        # One detect worker per camera at most - a camera's frames are detected in order
+        detect_workers = min(len(self.cameras), os.cpu_count() or 1)
+        pipeline.add_stage("detect", lambda packet: self.detect_stage(packet, encoder), self.capture_queue, match_queue,
+                           workers=detect_workers)
+        pipeline.add_stage("match", self.match_stage, match_queue)
+        return pipeline
+    
+    def get_pipeline_stats(self) -> Optional[dict]:
+        """Per-stage queue depth and latency (per-camera latency is in the camera stats)"""
+        if not self.pipeline:
+            return None
+        
+        stats = self.pipeline.get_stats()
+        stats["stale_frames"] = sum(camera.stale_frames for camera in self.cameras)
+        return stats
+    
+    def get_camera_stats(self) -> Dict:
+        """Capture and processing rate, latency and queue metrics of every camera"""
+        stats = {}
+        for camera in self.cameras:
+            entry = camera.get_stats()
+            if self.capture_queue is not None:
+                entry["queue"] = self.capture_queue.lane_stats(camera.name)
+            stats[camera.name] = entry
+        return stats
+    
+    def update_attendance_record(self, employee_name: str, camera_used: Optional[str] = None) -> bool:
+        """Send an attendance event for an employee seen live; the server decides between check-in and check-out"""
+        try:
             employee_id = self.attendance_employee_ids.get(employee_name)
             if not employee_id:
                 logger.error(f"No employee ID found for {employee_name}")
                 return False
             
-            # Use timezone-aware current time
+            # Use timezone-aware current time - the time the face was seen, however late the event reaches the server
             current_time = self.get_current_time()
-            logger.info(f"Current time: {current_time}")
-            
-            # Get fresh record from API - force refresh
-            today_data = self.db_client.get_today_attendance()
-            record = None
+            event_data = {
+                "employee_id": employee_id,
+                "timestamp": current_time.isoformat(),
+                "camera_used": camera_used or self.camera_type,
+                "checkout_delay_minutes": self.CHECKOUT_DELAY_MINUTES
+            }
             
-            if today_data and "records" in today_data:
-                # Sort records by ID to get the most recent one for this employee
-                employee_records = [r for r in today_data["records"] if r.get("name") == employee_name]
-                if employee_records:
-                    # Get the most recent record (highest ID)
-                    record = max(employee_records, key=lambda x: x.get('id', 0))
-            
-            if not record:
-                logger.error(f"No attendance record found for {employee_name}")
-                return False
+            if self.record_attendance_event(employee_name, event_data):
+                self.last_detection_time[employee_name] = current_time
+                return True
             
-            logger.info(f"Record current state - ID: {record.get('id')}, Arrival: {record.get('arrival_time')}, Departure: {record.get('departure_time')}, Status: {record.get('status')}")
-            
-            # Check if employee is not checked in yet (no arrival time or status is absent)
-            if not record.get("arrival_time") or record.get("status") == "absent":
-                # First detection - Check in
-                attendance_data = {
-                    "employee_id": employee_id,
-                    "arrival_time": current_time.isoformat(),
-                    "status": "present",
-                    "camera_used": self.camera_type
-                }
-                
-                if self.db_client.create_attendance_record(attendance_data):
-                    self.last_detection_time[employee_name] = current_time
-                    logger.info(f"✓ {employee_name} checked in at {current_time.strftime('%H:%M:%S')}")
-                    
-                    # Add a small delay to allow database to update
-                    time.sleep(0.5)
-                    return True
-                else:
-                    logger.error(f"Failed to create check-in record for {employee_name}")
-                    return False
-                    
-            elif record.get("arrival_time") and not record.get("departure_time") and record.get("status") == "present":
-                # Employee is checked in but not checked out yet
-                # Check if 2 minutes have passed since last detection OR since arrival
-                last_time = self.last_detection_time.get(employee_name)
-                
-                # If no last detection time, use arrival time
-                if not last_time:
-                    arrival_time_str = record.get("arrival_time")
-                    if arrival_time_str:
-                        try:
-                            # Parse arrival time - handle both ISO format with and without timezone
-                            if arrival_time_str.endswith('Z'):
-                                arrival_time = datetime.fromisoformat(arrival_time_str.replace('Z', '+00:00'))
-                            elif '+' in arrival_time_str[-6:] or arrival_time_str.endswith('+00:00'):
-                                arrival_time = datetime.fromisoformat(arrival_time_str)
-                            else:
-                                # Assume it's in Kigali timezone if no timezone info
-                                arrival_time = datetime.fromisoformat(arrival_time_str)
-                                arrival_time = self.make_timezone_aware(arrival_time)
-                            
-                            last_time = arrival_time
-                        except Exception as e:
-                            logger.error(f"Error parsing arrival time {arrival_time_str}: {e}")
-                            last_time = current_time - timedelta(minutes=3)  # Force checkout
-                
-                logger.info(f"Last detection/arrival time for {employee_name}: {last_time}")
-                
-                if last_time:
-                    # Ensure both times are timezone-aware for comparison
-                    last_time_aware = self.make_timezone_aware(last_time)
-                    time_diff = (current_time - last_time_aware).total_seconds()
-                    
-                    logger.info(f"Time difference: {int(time_diff)} seconds ({time_diff/60:.1f} minutes)")
-                    
-                    if time_diff >= self.CHECKOUT_DELAY_MINUTES * 60:
-                        # Enough time has passed, proceed with checkout
-                        
-                        # Calculate hours worked with timezone-aware times
-                        arrival_time_str = record.get("arrival_time")
-                        if arrival_time_str:
-                            try:
-                                # Parse the arrival time from ISO format
-                                if arrival_time_str.endswith('Z'):
-                                    arrival_time = datetime.fromisoformat(arrival_time_str.replace('Z', '+00:00'))
-                                elif '+' in arrival_time_str[-6:] or arrival_time_str.endswith('+00:00'):
-                                    arrival_time = datetime.fromisoformat(arrival_time_str)
-                                else:
-                                    arrival_time = datetime.fromisoformat(arrival_time_str)
-                                    arrival_time = self.make_timezone_aware(arrival_time)
-                                
-                                arrival_time_aware = self.make_timezone_aware(arrival_time)
-                                hours_worked = (current_time - arrival_time_aware).total_seconds() / 3600
-                                
-                                # Create checkout record
-                                attendance_data = {
-                                    "employee_id": employee_id,
-                                    "arrival_time": arrival_time_str,
-                                    "departure_time": current_time.isoformat(),
-                                    "hours_worked": round(hours_worked, 2),
-                                    "status": "present",
-                                    "camera_used": self.camera_type
-                                }
-                                
-                                if self.db_client.create_attendance_record(attendance_data):
-                                    logger.info(f"✓ {employee_name} checked out at {current_time.strftime('%H:%M:%S')} - Hours: {round(hours_worked, 2)}")
-                                    # Reset blink count after successful checkout
-                                    self.person_blink_count[employee_name] = 0
-                                    
-                                    # Add a small delay to allow database to update
-                                    time.sleep(0.5)
-                                    return True
-                                else:
-                                    logger.error(f"Failed to create check-out record for {employee_name}")
-                                    return False
-                                    
-                            except Exception as e:
-                                logger.error(f"Error processing checkout for {employee_name}: {e}")
-                                return False
-                    else:
-                        logger.info(f"Not enough time passed for checkout. Need {self.CHECKOUT_DELAY_MINUTES} minutes, only {int(time_diff)} seconds passed")
-                        # Update last detection time for next check
-                        self.last_detection_time[employee_name] = current_time
-                        return False
-                else:
-                    logger.error(f"No reference time found for {employee_name}")
-                    return False
-            
-            else:
-                if record.get("departure_time"):
-                    logger.info(f"Employee {employee_name} already checked out at: {record.get('departure_time')}")
-                else:
-                    logger.info(f"Unexpected state for {employee_name} - Status: {record.get('status')}")
-                
-                return False
+            logger.error(f"Failed to send attendance event for {employee_name}")
+            self.metrics.inc("attendance_failures")
+            return False
                     
         except Exception as e:
             logger.error(f"Error updating attendance for {employee_name}: {e}")
@@ -514,43 +857,30 @@ class RecognitionService:
             traceback.print_exc()
             return False
 
-    def enhance_low_light(self, frame):
-        """Enhance frame for low-light conditions"""
-        lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-        cl = clahe.apply(l)
-        enhanced_lab = cv2.merge((cl,a,b))
-        enhanced_bgr = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
-        return enhanced_bgr
-    
-    def draw_detection_info(self, frame, face_locations, face_names, confidences, blink_counts):
-        """Draw detection information on frame"""
+    def draw_detection_info(self, frame, tracks, boxes=None, camera=None):
+        """Draw detection information for every face track on frame"""
+        boxes = boxes if boxes is not None else [track.box for track in tracks]
+        detection_roi = camera.detection_roi if camera else self.detection_roi
         try:
-            # Get current attendance status
-            today_data = self.db_client.get_today_attendance()
-            attendance_status = {}
+            # Current attendance status from the local table (no network call here)
+            attendance_state = self.attendance_state
             
-            if today_data and "records" in today_data:
-                for record in today_data["records"]:
-                    name = record.get("name")
-                    if name:
-                        attendance_status[name] = record
+            if detection_roi:
+                x0, y0, x1, y1 = roi_bounds(detection_roi, frame.shape)
+                cv2.rectangle(frame, (x0, y0), (x1, y1), (128, 128, 128), 1)
             
             # Draw face detection boxes and info
-            for (top, right, bottom, left), name, confidence, blink_count in zip(
-                face_locations, face_names, confidences, blink_counts
-            ):
+            for track, box in zip(tracks, boxes):
                 # Scale back up face locations (since we processed on smaller frame)
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
+                top, right, bottom, left = (v * 4 for v in box)
+                name = track.name or "Unknown"
+                confidence = track.confidence
+                blink_count = track.blink.blinks
                 
                 # Determine colors and status based on recognition
                 if name != "Unknown":
                     color = (0, 255, 0)  # Green for recognized faces
-                    record = attendance_status.get(name, {})
+                    record = attendance_state.get(name) or {}
                     
                     if record.get("arrival_time") and not record.get("departure_time"):
                         status = "Checked In"
@@ -575,7 +905,7 @@ class RecognitionService:
                 
                 # Draw name with better font size
                 font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(frame, name, (left + 6, bottom - 45), font, 0.7, (255, 255, 255), 2)
+                cv2.putText(frame, f"{name} #{track.track_id}", (left + 6, bottom - 45), font, 0.7, (255, 255, 255), 2)
                 
                 # Draw confidence and status
                 if name != "Unknown":
@@ -587,13 +917,9 @@ class RecognitionService:
         except Exception as e:
             logger.error(f"Error getting attendance status for display: {e}")
             # Still draw face boxes even if we can't get attendance status
-            for (top, right, bottom, left), name, confidence, blink_count in zip(
-                face_locations, face_names, confidences, blink_counts
-            ):
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
+            for track, box in zip(tracks, boxes):
+                top, right, bottom, left = (v * 4 for v in box)
+                name = track.name or "Unknown"
                 
                 color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
                 cv2.rectangle(frame, (left, top), (right, bottom), color, 3)
@@ -606,7 +932,7 @@ class RecognitionService:
         info_text = [
             f"Company: {self.company}",
             f"Employees Loaded: {len(self.known_face_names)}",
-            f"Camera: {self.camera_type} ({self.camera_source})",
+            f"Camera: {camera.camera_type} ({camera.source})" if camera else f"Camera: {self.camera_type} ({self.camera_source})",
             f"Blink Threshold: {self.BLINK_THRESHOLD}",
             f"Time: {self.get_current_time().strftime('%H:%M:%S')}",
             "Press 'q' in camera window to stop"
@@ -623,165 +949,106 @@ class RecognitionService:
         
         return frame
     
+    def process_verified_face(self, track, camera=None) -> bool:
+        """Automatic check-in/check-out for a recognized face that passed the blink check. Returns True if recorded."""
+        name = track.name
+        
+        # Add throttling to prevent too frequent processing
+        current_time = self.get_current_time()
+        last_processed = self.last_processing_time.get(name)
+        
+        # Only process if at least 10 seconds have passed since last processing
+        if last_processed and (current_time - last_processed).total_seconds() < 10:
+            time_since_last = (current_time - last_processed).total_seconds()
+            logger.debug(f"Throttling processing for {name} - only {int(time_since_last)} seconds since last processing")
+            return False
+        
+        camera_used = camera.camera_type if camera else None
+        
+        # Automatic attendance processing
+        employee_id = self.attendance_employee_ids.get(name)
+        if not employee_id:
+            return False
+        
+        # Process attendance automatically - the server checks in or out (or waits out the checkout delay)
+        try:
+            # Most recent record for this employee, from the local attendance table
+            record = self.attendance_state.get(name) or {}
+            
+            if record.get("departure_time"):
+                # Employee already completed for the day
+                logger.info(f"{name} already has complete attendance record for today")
+            elif self.update_attendance_record(name, camera_used):
+                # Reset blink count after the event was sent
+                track.blink.reset()
+                self.last_processing_time[name] = current_time
+                return True
+                
+        except Exception as e:
+            logger.error(f"Error processing attendance for {name}: {e}")
+        
+        return False
+    
     def recognition_loop(self):
-        """Main recognition loop with automatic attendance detection"""
+        """Runs the pipeline, one capture thread per camera, and the preview windows"""
+        encoder = None
         try:
-            logger.info("Starting recognition loop with automatic attendance detection...")
-            frame_count = 0
+            logger.info(f"Starting recognition loop with automatic attendance detection on {len(self.cameras)} camera(s)...")
+            
+            # Per-face encodings of every camera fan out to one pool sized to the cores
+            encoder = ThreadPoolExecutor(max_workers=self.config.PIPELINE_WORKERS, thread_name_prefix="encode")
+            # Our own writes are already in the attendance table, so the idle sync keeps its interval
+            if self.db_client:
+                self.start_outbox()
+            self.dispatcher = AttendanceDispatcher(self.handle_attendance_event,
+                                                   idle=lambda recorded: self.refresh_attendance_status(),
+                                                   metrics=self.metrics)
+            self.dispatcher.start()
+            for camera in self.cameras:
+                camera.reset()
+            self.pipeline = self.create_pipeline(encoder)
+            self.pipeline.start()
+            
+            for camera in self.cameras:
+                camera.capture_thread = threading.Thread(
+                    target=self.capture_loop, args=(camera,), daemon=True, name=f"capture-{camera.name}"
+                )
+                camera.capture_thread.start()
             
+            # HighGUI windows are only touched from this thread
+            next_metrics_log = time.monotonic() + self.config.METRICS_LOG_SECONDS
             while not self.stop_event.is_set():
-                ret, frame = self.video_capture.read()
-                if not ret:
-                    logger.error("Error reading frame from camera")
-                    continue
+                if self.config.METRICS_LOG_SECONDS and time.monotonic() >= next_metrics_log:
+                    logger.info(self.metrics.log_line())
+                    next_metrics_log = time.monotonic() + self.config.METRICS_LOG_SECONDS
                 
-                frame_count += 1
-                # Process every other frame for performance
-                process_frame = frame_count % 2 == 0
-                display_frame = frame.copy()
+                if self.replay_finished():
+                    # Let the last replayed frames through the pipeline and the dispatcher before stopping
+                    self.pipeline.drain(timeout=30)
+                    self.dispatcher.drain(timeout=30)
+                    logger.info("Replay finished")
+                    break
                 
-                if process_frame:
-                    try:
-                        # Enhance frame for better recognition
-                        enhanced_frame = self.enhance_low_light(frame)
-                        
-                        # Resize for faster processing
-                        small_frame = cv2.resize(enhanced_frame, (0, 0), fx=0.25, fy=0.25)
-                        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                        
-                        # Find faces and process recognition
-                        face_locations = face_recognition.face_locations(rgb_small_frame)
-                        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-                        
-                        face_names = []
-                        confidences = []
-                        blink_counts = []
-                        
-                        # Process detected faces
-                        for face_encoding in face_encodings:
-                            # Compare with known faces
-                            matches = face_recognition.compare_faces(
-                                self.known_face_encodings, face_encoding, tolerance=self.face_tolerance
-                            )
-                            face_distances = face_recognition.face_distance(
-                                self.known_face_encodings, face_encoding
-                            )
-                            
-                            name = "Unknown"
-                            confidence = 0
-                            blink_count = 0
-                            
-                            if len(face_distances) > 0:
-                                best_match_index = np.argmin(face_distances)
-                                if matches[best_match_index]:
-                                    name = self.known_face_names[best_match_index]
-                                    confidence = 1 - face_distances[best_match_index]
-                                    blink_count = self.person_blink_count.get(name, 0)
-                                    
-                                    # Process recognized face with good confidence
-                                    if confidence > 0.4:
-                                        # Detect blinks for liveness using original frame
-                                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                                        rects = self.detector(gray, 0)
-                                        
-                                        for rect in rects:
-                                            shape = self.predictor(gray, rect)
-                                            shape = np.array([[p.x, p.y] for p in shape.parts()])
-                                            
-                                            # Check if person has blinked enough for liveness verification
-                                            if self.detect_blink(shape, name):
-                                                # Add throttling to prevent too frequent processing
-                                                current_time = self.get_current_time()
-                                                last_processed = self.last_processing_time.get(name)
-                                                
-                                                # Only process if at least 10 seconds have passed since last processing
-                                                if not last_processed or (current_time - last_processed).total_seconds() >= 10:
-                                                    # Automatic attendance processing
-                                                    employee_id = self.attendance_employee_ids.get(name)
-                                                    if employee_id:
-                                                        # Process attendance automatically based on current status
-                                                        try:
-                                                            today_data = self.db_client.get_today_attendance()
-                                                            
-                                                            # Find the most recent record for this employee
-                                                            employee_records = []
-                                                            if today_data and "records" in today_data:
-                                                                employee_records = [r for r in today_data["records"] if r.get("name") == name]
-                                                            
-                                                            if employee_records:
-                                                                # Get the most recent record (highest ID)
-                                                                record = max(employee_records, key=lambda x: x.get('id', 0))
-                                                                
-                                                                if not record.get("arrival_time") or record.get("status") == "absent":
-                                                                    # Employee not checked in yet - check in
-                                                                    if self.update_attendance_record(name, "checkin"):
-                                                                        logger.info(f"✓ {name} automatically checked in")
-                                                                        # Reset blink count after successful check-in
-                                                                        self.person_blink_count[name] = 0
-                                                                        self.last_processing_time[name] = current_time
-                                                                elif record.get("arrival_time") and not record.get("departure_time") and record.get("status") == "present":
-                                                                    # Employee is checked in - try to check out (will check 2-minute rule)
-                                                                    if self.update_attendance_record(name, "checkout"):
-                                                                        logger.info(f"✓ {name} automatically checked out")
-                                                                        # Reset blink count after successful check-out
-                                                                        self.person_blink_count[name] = 0
-                                                                        self.last_processing_time[name] = current_time
-                                                                else:
-                                                                    # Employee already completed for the day
-                                                                    logger.info(f"{name} already has complete attendance record for today")
-                                                            else:
-                                                                logger.warning(f"No attendance records found for {name}")
-                                                                
-                                                        except Exception as e:
-                                                            logger.error(f"Error processing attendance for {name}: {e}")
-                                                else:
-                                                    time_since_last = (current_time - last_processed).total_seconds()
-                                                    logger.debug(f"Throttling processing for {name} - only {int(time_since_last)} seconds since last processing")
-                            
-                            face_names.append(name)
-                            confidences.append(confidence)
-                            blink_counts.append(blink_count)
-
-                        # Draw detection info on frame
-                        display_frame = self.draw_detection_info(
-                            frame.copy(), face_locations, face_names, confidences, blink_counts
-                        )
-                        
-                        # Store frame for other uses (thread-safe)
-                        with self.frame_lock:
-                            self.latest_frame = display_frame.copy()
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing frame: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        # Use original frame if processing fails
-                        with self.frame_lock:
-                            self.latest_frame = frame.copy()
-                else:
-                    # For non-processed frames, use latest processed frame or raw frame
-                    with self.frame_lock:
-                        if self.latest_frame is not None:
-                            display_frame = self.latest_frame.copy()
-                        else:
-                            display_frame = frame.copy()
+                if not self.show_preview:
+                    self.stop_event.wait(0.5)
+                    continue
                 
-                # Show camera preview locally
-                if self.show_preview:
-                    try:
-                        cv2.imshow('Face Recognition - Automatic Attendance', display_frame)
-                        
-                        # Check for 'q' key press to stop
-                        key = cv2.waitKey(1) & 0xFF
-                        if key == ord('q'):
-                            logger.info("Stop requested by user (pressed 'q')")
-                            self.stop_event.set()
-                            break
-                    except Exception as e:
-                        logger.error(f"Error showing preview: {e}")
+                try:
+                    for camera in self.cameras:
+                        display_frame = camera.get_latest_frame()
+                        if display_frame is not None:
+                            cv2.imshow(self.preview_window_name(camera), display_frame)
+                    
+                    # Check for 'q' key press to stop
+                    key = cv2.waitKey(1) & 0xFF
+                    if key == ord('q'):
+                        logger.info("Stop requested by user (pressed 'q')")
+                        self.stop_event.set()
+                        break
+                except Exception as e:
+                    logger.error(f"Error showing preview: {e}")
                 
-                # Small delay to prevent excessive CPU usage
-                time.sleep(0.03)
+                time.sleep(1.0 / self.config.CAPTURE_LOOP_FPS)
                 
         except Exception as e:
             logger.error(f"Error in recognition loop: {e}")
@@ -789,121 +1056,154 @@ class RecognitionService:
             traceback.print_exc()
         finally:
             # Cleanup
-            if self.video_capture:
-                self.video_capture.release()
+            self.stop_event.set()
+            for camera in self.cameras:
+                if camera.capture_thread:
+                    camera.capture_thread.join(timeout=2)
+                    camera.capture_thread = None
+            if self.pipeline:
+                self.pipeline.stop()
+            if self.dispatcher:
+                self.dispatcher.stop()
+            self.stop_outbox()
+            if encoder:
+                encoder.shutdown(wait=False)
+            self.release_cameras()
             cv2.destroyAllWindows()
             logger.info("Recognition loop stopped and cleanup completed")
     
+    def capture_loop(self, camera: CameraStream):
+        """Capture thread of one camera; the motion gate and frame-rate controller decide which frames are processed"""
+        mode = None
+        try:
+            while not self.stop_event.is_set():
+                loop_started = time.perf_counter()
+                ret, frame = camera.video_capture.read()
+                self.metrics.observe("capture", time.perf_counter() - loop_started)
+                if not ret:
+                    if camera.replay_ended():
+                        logger.info(f"Camera {camera.name} replay ended after {camera.frames_captured} frames")
+                        break
+                    camera.read_errors += 1
+                    logger.error(f"Error reading frame from camera {camera.name}")
+                    # Do not spin on a dead camera at the other cameras' expense
+                    time.sleep(0.1)
+                    continue
+                
+                camera.frame_captured(loop_started)
+                self.metrics.inc("frames_captured")
+                moving = camera.update_motion_gate(frame, loop_started)
+                
+                # The controller picks the stride from the scene and measured cost; a newer frame replaces one still waiting.
+                # A fast replay processes every frame instead.
+                if camera.fast_replay or camera.frame_rate.should_process(loop_started, self.show_preview):
+                    # Nothing moving and nobody tracked: skip enhancement, detection and encoding
+                    skip = camera.motion_gate is not None and not moving and not camera.tracker.tracks
+                    if camera.motion_gate is not None:
+                        camera.motion_gate.record(skip)
+                    
+                    if skip:
+                        camera.set_latest_frame(frame)
+                        if self.frame_recorder:
+                            self.frame_recorder.skip(camera, camera.frames_captured, camera.source_position(), "still")
+                    else:
+                        if camera.fast_replay:
+                            self.wait_for_pipeline(camera)
+                        packet = FramePacket(frame, camera.frames_captured, camera)
+                        packet.position = camera.source_position()
+                        self.capture_queue.put(camera.name, packet)
+                elif camera.get_latest_frame() is None:
+                    camera.set_latest_frame(frame)
+                
+                stats = camera.frame_rate.get_stats(loop_started)
+                if stats["mode"] != mode:
+                    mode = stats["mode"]
+                    logger.info(f"Camera {camera.name} frame rate {mode}: processing up to {stats['target_fps']} fps "
+                                f"(achieved {stats['achieved_fps']} fps, {stats['avg_cost_ms']} ms per frame)")
+                
+                if camera.fast_replay:
+                    continue
+                
+                # Sleep out the rest of this capture period: short while faces are in view, long when idle
+                now = time.perf_counter()
+                time.sleep(camera.frame_rate.sleep_seconds(now - loop_started, now, self.show_preview))
+                
+        except Exception as e:
+            logger.error(f"Error in capture loop of camera {camera.name}: {e}")
+            import traceback
+            traceback.print_exc()
+    
+    def wait_for_pipeline(self, camera: CameraStream):
+        """Fast replay: hold the next frame until the previous one is detected and the match queue has room"""
+        while not self.stop_event.is_set():
+            if (self.capture_queue.wait_idle(camera.name, 0.1)
+                    and self.match_queue.depth() < self.config.PIPELINE_QUEUE_SIZE):
+                return
+            time.sleep(0.001)
+    
+    def replay_finished(self) -> bool:
+        """Every camera is a replay that has played to the end"""
+        return bool(self.cameras) and all(
+            camera.is_replay and not (camera.capture_thread and camera.capture_thread.is_alive())
+            for camera in self.cameras
+        )
+    
+    def preview_window_name(self, camera: CameraStream) -> str:
+        if len(self.cameras) == 1:
+            return 'Face Recognition - Automatic Attendance'
+        return f'Face Recognition - Automatic Attendance ({camera.name})'
+    
     def process_frame(self) -> Tuple[Optional[np.ndarray], List[str]]:
-        """Process single frame and return frame with detections and detection messages"""
-        if not self.video_capture or not self.video_capture.isOpened():
+        """Process single frame of the main camera and return frame with detections and detection messages"""
+        camera = self.cameras[0] if self.cameras else None
+        if not camera or not camera.is_open():
             return None, []
         
-        ret, frame = self.video_capture.read()
+        ret, frame = camera.video_capture.read()
         if not ret:
             return None, ["Error: Could not read frame from camera"]
         
         detections = []
         
         try:
-            # Enhance frame for better recognition
-            enhanced_frame = self.enhance_low_light(frame)
-            
-            # Resize for faster processing
-            small_frame = cv2.resize(enhanced_frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-            
-            # Find faces
-            face_locations = face_recognition.face_locations(rgb_small_frame)
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-            
-            face_names = []
-            confidences = []
-            blink_counts = []
-            
-            # Process each detected face
-            for face_encoding in face_encodings:
-                # Compare with known faces
-                matches = face_recognition.compare_faces(
-                    self.known_face_encodings, face_encoding, tolerance=self.face_tolerance
-                )
-                face_distances = face_recognition.face_distance(
-                    self.known_face_encodings, face_encoding
-                )
-                
-                name = "Unknown"
-                confidence = 0
-                blink_count = 0
-                
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = self.known_face_names[best_match_index]
-                        confidence = 1 - face_distances[best_match_index]
-                        blink_count = self.person_blink_count.get(name, 0)
-                        
-                        # Process recognized face with good confidence
-                        if confidence > 0.4:
-                            # Detect blinks for liveness
-                            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                            rects = self.detector(gray, 0)
-                            
-                            for rect in rects:
-                                shape = self.predictor(gray, rect)
-                                shape = np.array([[p.x, p.y] for p in shape.parts()])
-                                
-                                # Check if person has blinked enough
-                                if self.detect_blink(shape, name):
-                                    # Automatic attendance processing
-                                    employee_id = self.attendance_employee_ids.get(name)
-                                    if employee_id:
-                                        # Get current attendance status
-                                        today_data = self.db_client.get_today_attendance()
-                                        record = None
-                                        
-                                        if today_data and "records" in today_data:
-                                            for r in today_data["records"]:
-                                                if r.get("name") == name:
-                                                    record = r
-                                                    break
-                                        
-                                        if record:
-                                            if not record.get("arrival_time"):
-                                                if self.update_attendance_record(name, "checkin"):
-                                                    detections.append(f"✓ {name} automatically checked in")
-                                                    # Reset blink count after successful check-in
-                                                    self.person_blink_count[name] = 0
-                                            elif record.get("arrival_time") and not record.get("departure_time"):
-                                                if self.update_attendance_record(name, "checkout"):
-                                                    detections.append(f"✓ {name} automatically checked out")
-                                                    # Reset blink count after successful check-out
-                                                    self.person_blink_count[name] = 0
-                
-                face_names.append(name)
-                confidences.append(confidence)
-                blink_counts.append(blink_count)
-            
-            # Draw detection info on frame
-            display_frame = self.draw_detection_info(
-                frame.copy(), face_locations, face_names, confidences, blink_counts
-            )
+            # Same detect and match stages as the pipeline, run inline
+            self.refresh_attendance_status()
+            packet = self.match_faces(self.analyze_frame(FramePacket(frame, 0, camera)))
             
-            # Store frame for display
-            with self.frame_lock:
-                self.latest_frame = display_frame.copy()
+            for track in packet.verified:
+                # Automatic attendance processing
+                name = track.name
+                employee_id = self.attendance_employee_ids.get(name)
+                if employee_id:
+                    # Get current attendance status
+                    record = self.attendance_state.get(name) or {}
+                    
+                    if not record.get("departure_time") and self.update_attendance_record(name, camera.camera_type):
+                        record = self.attendance_state.get(name) or {}
+                        action = "checked out" if record.get("departure_time") else "checked in"
+                        detections.append(f"✓ {name} automatically {action}")
+                        # Reset blink count after successful check-in or check-out
+                        track.blink.reset()
             
-            return display_frame, detections
+            return packet.display_frame, detections
             
         except Exception as e:
             logger.error(f"Error processing frame: {e}")
             return frame, [f"Error: {str(e)}"]
     
     def get_latest_frame(self):
-        """Get the latest processed frame for streaming"""
-        with self.frame_lock:
-            if self.latest_frame is not None:
-                return self.latest_frame.copy()
-        return None
+        """Get the latest processed frame for streaming; with several cameras, their frames side by side"""
+        frames = [frame for frame in (camera.get_latest_frame() for camera in self.cameras) if frame is not None]
+        if not frames:
+            return None
+        if len(frames) == 1:
+            return frames[0].copy()
+        
+        height = min(frame.shape[0] for frame in frames)
+        return np.hstack([
+            cv2.resize(frame, (int(frame.shape[1] * height / frame.shape[0]), height)) if frame.shape[0] != height else frame
+            for frame in frames
+        ])
     
     def start_recognition(self, show_preview: bool = True):
         """Start the recognition system with automatic attendance detection"""
@@ -924,11 +1224,11 @@ class RecognitionService:
                 return {"error": "Failed to initialize recognition system"}
             
             # Verify camera is initialized
-            if not self.video_capture or not self.video_capture.isOpened():
+            if not self.cameras or not self.cameras[0].is_open():
                 return {"error": "Camera not initialized or not opened"}
             
             # Test camera by reading a frame
-            ret, test_frame = self.video_capture.read()
+            ret, test_frame = self.cameras[0].video_capture.read()
             if not ret:
                 return {"error": "Cannot read from camera"}
             logger.info(f"Camera test successful - Frame size: {test_frame.shape}")
@@ -979,9 +1279,7 @@ class RecognitionService:
                 self.recognition_thread.join(timeout=5)
             
             # Close video capture
-            if self.video_capture:
-                self.video_capture.release()
-                self.video_capture = None
+            self.release_cameras()
             
             # Close any OpenCV windows
             cv2.destroyAllWindows()
@@ -1008,6 +1306,15 @@ class RecognitionService:
             "blink_threshold": self.BLINK_THRESHOLD,
             "face_tolerance": self.face_tolerance,
             "checkout_delay_minutes": self.CHECKOUT_DELAY_MINUTES,
+            "encoding_cache": self.encoding_cache.stats_line() if self.encoding_cache else None,
+            "face_index": f"{self.gallery.index_type} ({len(self.gallery)} faces)",
+            "shared_gallery_generation": self.gallery_publisher.generation if self.gallery_publisher else None,
+            "cameras": self.get_camera_stats(),
+            "pipeline": self.get_pipeline_stats(),
+            "attendance_dispatcher": self.dispatcher.get_stats() if self.dispatcher else None,
+            "attendance_state": self.attendance_state.get_stats(),
+            "attendance_outbox": self.outbox_replayer.get_stats() if self.outbox_replayer else None,
+            "metrics": self.metrics.snapshot(),
             "authenticated": bool(self.token and self.company)
         }
 
@@ -0,0 +1,279 @@
+# replay.py
+"""Offline recognition runs on a recorded video or a folder of frames.
+
+A replay source stands in for the camera, so frames go through the same
+pipeline as a live feed. In realtime mode it plays at the recording's frame
+rate and skips frames the pipeline is too slow for, like a live camera. In
+fast mode every frame is processed as soon as the pipeline has room.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def is_replay_source(source) -> bool:
+    """A camera source that is a video file or a folder of frames rather than a device or stream URL"""
+    return isinstance(source, str) and "://" not in source and (os.path.isdir(source) or os.path.isfile(source))
+
+
+class ReplayCapture:
+    """cv2.VideoCapture look-alike that plays a video file or a folder of frames (in file name order)"""
+
+    def __init__(self, path: str, realtime: bool = True, fps: float = 0.0):
+        self.path = path
+        self.realtime = realtime
+        self.video = None
+        self.files: List[str] = []
+
+        if os.path.isdir(path):
+            self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.frame_count = len(self.files)
+            self.fps = fps or 30.0
+        else:
+            self.video = cv2.VideoCapture(path)
+            self.frame_count = int(self.video.get(cv2.CAP_PROP_FRAME_COUNT))
+            self.fps = fps or self.video.get(cv2.CAP_PROP_FPS) or 30.0
+
+        self.next_index = 0         # frame number the next read returns (before realtime skipping)
+        self.position = -1          # frame number of the last frame returned
+        self.started_at = None
+        self.ended = False
+
+    def isOpened(self) -> bool:
+        return bool(self.files) if self.video is None else self.video.isOpened()
+
+    def rewind(self):
+        """Start over from the first frame (after the test read in CameraStream.open)"""
+        if self.video is not None:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.next_index = 0
+        self.position = -1
+        self.started_at = None
+        self.ended = False
+
+    def _due_index(self) -> int:
+        """In realtime mode, the frame that should be showing now; waits when reading ahead of the clock"""
+        now = time.perf_counter()
+        if self.started_at is None:
+            self.started_at = now - self.next_index / self.fps
+        due = int((now - self.started_at) * self.fps)
+        if due < self.next_index:
+            time.sleep((self.next_index - due) / self.fps)
+            return self.next_index
+        return due
+
+    def read(self):
+        index = self._due_index() if self.realtime else self.next_index
+        if self.frame_count and index >= self.frame_count:
+            self.ended = True
+            return False, None
+
+        if self.video is not None:
+            # Frames the pipeline was too slow for are skipped, like on a live camera
+            while self.next_index < index:
+                if not self.video.grab():
+                    self.ended = True
+                    return False, None
+                self.next_index += 1
+            ret, frame = self.video.read()
+            if not ret:
+                self.ended = True
+                return False, None
+        else:
+            frame = cv2.imread(self.files[index])
+            if frame is None:
+                logger.warning(f"Cannot read replay frame {self.files[index]}")
+
+        self.position = index
+        self.next_index = index + 1
+        return frame is not None, frame
+
+    def get(self, prop) -> float:
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frame_count)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.next_index)
+        return self.video.get(prop) if self.video is not None else 0.0
+
+    def set(self, prop, value) -> bool:
+        # Resolution and frame rate come from the recording
+        return False
+
+    def release(self):
+        if self.video is not None:
+            self.video.release()
+
+
+class FrameRecorder:
+    """Writes one JSON line per frame: timings, faces and verified names, or why the frame was skipped"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.latencies: List[float] = []
+        self.processing: List[float] = []
+        self.verified: Dict[str, int] = {}
+
+    def _write(self, entry: Dict):
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+
+    def record(self, packet, now: float):
+        """A frame that came out of the match stage"""
+        latency = now - packet.captured_at
+        entry = {
+            "camera": packet.camera.name if packet.camera else None,
+            "frame": packet.index,
+            "position": packet.position,
+            "latency_ms": round(latency * 1000, 2),
+            "processing_ms": round(packet.processing_seconds * 1000, 2),
+            "faces": [
+                {
+                    "track": track.track_id,
+                    "name": track.name,
+                    "confidence": round(float(track.confidence), 4),
+                    "box": [int(v) for v in box]
+                }
+                for track, box in zip(packet.tracks, packet.boxes)
+            ],
+            "verified": [track.name for track in packet.verified]
+        }
+        with self.lock:
+            self.frames += 1
+            self.latencies.append(latency)
+            self.processing.append(packet.processing_seconds)
+            for track in packet.verified:
+                self.verified[track.name] = self.verified.get(track.name, 0) + 1
+        self._write(entry)
+
+    def skip(self, camera, index: int, position: Optional[int], reason: str):
+        """A captured frame that never reached the match stage (still scene, stale, ...)"""
+        with self.lock:
+            self.skipped += 1
+        self._write({"camera": camera.name if camera else None, "frame": index, "position": position,
+                     "skipped": reason})
+
+    def summary(self) -> Dict:
+        with self.lock:
+            latencies = np.array(self.latencies or [0.0]) * 1000
+            processing = np.array(self.processing or [0.0]) * 1000
+            return {
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+                "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+                "processing_avg_ms": round(float(processing.mean()), 2),
+                "verified": dict(self.verified)
+            }
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def load_gallery_folder(service, folder: str) -> int:
+    """Enroll every photo in folder under its file name (without extension); returns how many were enrolled"""
+    from enrollment import encode_images
+
+    items, names = [], {}
+    for employee_id, filename in enumerate(sorted(os.listdir(folder)), start=1):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with open(os.path.join(folder, filename), "rb") as f:
+            items.append((employee_id, f.read()))
+        names[employee_id] = os.path.splitext(filename)[0]
+
+    config = service.config
+    for employee_id, encoding, seconds, error in encode_images(items, config.ENROLLMENT_WORKERS,
+                                                               config.ENROLLMENT_CHUNK_SIZE):
+        if error or encoding is None:
+            logger.warning(f"No face enrolled for {names[employee_id]}: {error or 'no face found'}")
+            continue
+        service.add_known_face(names[employee_id], employee_id, encoding)
+
+    service.gallery = service.build_gallery()
+    return len(service.known_face_names)
+
+
+def run_replay(sources: List[str], employees: str, record: str, realtime: bool = False, headless: bool = True,
+               detector: Optional[str] = None) -> Dict:
+    """Run the recognition pipeline over recorded sources without a server; returns the recorder summary"""
+    import dlib
+
+    from camera import CameraStream
+    from recognition_service import RecognitionService
+
+    service = RecognitionService()
+    config = service.config
+    config.REPLAY_REALTIME = realtime
+
+    service.predictor = dlib.shape_predictor(config.FACE_LANDMARKS_MODEL)
+    if not load_gallery_folder(service, employees):
+        raise ValueError(f"No faces enrolled from {employees}")
+
+    cameras = []
+    for position, source in enumerate(sources):
+        name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0] or f"replay{position + 1}"
+        camera = CameraStream(name, source, "Replay", config, detector=detector)
+        if camera.open():
+            cameras.append(camera)
+    if not cameras:
+        raise ValueError("No replay source could be opened")
+    service.cameras = cameras
+
+    # No server: verified faces are recorded, not sent as attendance
+    service.db_client = None
+    service.frame_recorder = FrameRecorder(record)
+    service.show_preview = not headless
+    service.stop_event.clear()
+
+    started = time.perf_counter()
+    try:
+        service.recognition_loop()
+    finally:
+        service.frame_recorder.close()
+
+    summary = service.frame_recorder.summary()
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    summary["fps"] = round(summary["frames"] / summary["seconds"], 2) if summary["seconds"] else 0.0
+    summary["cameras"] = {camera.name: camera.get_stats() for camera in cameras}
+    service.frame_recorder = None
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Run recognition on recorded video or frame folders, without a camera")
+    parser.add_argument("sources", nargs="+", help="Video files or folders of frames (one camera each)")
+    parser.add_argument("--employees", required=True, help="Folder of employee photos named after the employee")
+    parser.add_argument("--record", default="replay.jsonl", help="Per-frame timings and results (JSON lines)")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Play at the recording's frame rate and skip frames like a live camera "
+                             "(default: process every frame as fast as possible)")
+    parser.add_argument("--preview", action="store_true", help="Show the preview windows (default: headless)")
+    parser.add_argument("--detector", default=None, help="Face detector, e.g. hog, haar, dnn, dlib_hog:1")
+    args = parser.parse_args()
+
+    result = run_replay(args.sources, args.employees, args.record, args.realtime, not args.preview, args.detector)
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,84 @@
+# sync_backend.py
+"""Keep the backend's copies of the shared recognition modules in step with fras_local.
+
+The modules below are plain NumPy/OpenCV code used by both trees. fras_local
+holds the canonical copy; backend/app/services carries the same file with a
+header naming it and package imports. Edit the fras_local copy, then
+run ``python sync_backend.py`` to rewrite the backend copies, or
+``python sync_backend.py --check`` to exit with an error when any has drifted.
+"""
+import os
+import re
+import sys
+from typing import List
+
+SHARED_MODULES = (
+    "attendance_dispatcher",
+    "detectors",
+    "face_gallery",
+    "face_index",
+    "liveness",
+    "metrics",
+    "preprocess",
+    "roi",
+    "shared_gallery",
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_SERVICES = os.path.join(HERE, os.pardir, "backend", "app", "services")
+
+_IMPORT = re.compile(r"^from ({}) import ".format("|".join(SHARED_MODULES)), re.MULTILINE)
+
+
+def backend_source(name: str) -> str:
+    """The backend copy of a shared module, derived from its fras_local source"""
+    with open(os.path.join(HERE, f"{name}.py"), encoding="utf-8", newline="") as f:
+        source = f.read()
+    header = f"# {name}.py"
+    if not source.startswith(header):
+        raise ValueError(f"{name}.py must start with the line '{header}'")
+    source = f"# app/services/{name}.py - copy of fras_local/{name}.py; edit that file and run fras_local/sync_backend.py" + source[len(header):]
+    return _IMPORT.sub(r"from app.services.\1 import ", source)
+
+
+def drifted_modules() -> List[str]:
+    """Shared modules whose backend copy differs from the fras_local one"""
+    drifted = []
+    for name in SHARED_MODULES:
+        path = os.path.join(BACKEND_SERVICES, f"{name}.py")
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != backend_source(name):
+            drifted.append(name)
+    return drifted
+
+
+def sync() -> List[str]:
+    """Rewrite the backend copies that drifted; returns their names"""
+    drifted = drifted_modules()
+    for name in drifted:
+        with open(os.path.join(BACKEND_SERVICES, f"{name}.py"), "w", encoding="utf-8", newline="") as f:
+            f.write(backend_source(name))
+    return drifted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Copy the shared recognition modules from fras_local to the backend")
+    parser.add_argument("--check", action="store_true", help="Only report backend copies that differ; exit 1 if any do")
+    args = parser.parse_args()
+
+    if args.check:
+        drifted = drifted_modules()
+        for name in drifted:
+            print(f"backend/app/services/{name}.py differs from fras_local/{name}.py")
+        if drifted:
+            print("Run 'python sync_backend.py' in fras_local to update the backend copies")
+        sys.exit(1 if drifted else 0)
+
+    updated = sync()
+    print(f"Updated {', '.join(updated)}" if updated else "Backend copies are up to date")